@@ -0,0 +1,174 @@
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from metrics import Counter, Family, Gauge, Histogram, LATENCY_BUCKETS
+
+# Métriques par groupe d'endpoints (label route)
+admitted_total = Family(Counter, "diabete_admission_admitted_total", ["route"], "Requêtes admises")
+queued_total = Family(Counter, "diabete_admission_queued_total", ["route"],
+                      "Requêtes admises après attente en file")
+shed_total = Family(Counter, "diabete_admission_shed_total", ["route", "reason"],
+                    "Requêtes refusées (503) : file pleine ou attente estimée au-delà du SLO")
+in_flight_gauge = Family(Gauge, "diabete_admission_in_flight", ["route"], "Requêtes en cours de traitement")
+queue_depth_gauge = Family(Gauge, "diabete_admission_queue_depth", ["route"], "Requêtes en file d'attente")
+queue_wait = Family(Histogram, "diabete_admission_queue_wait_seconds", ["route"],
+                    "Attente en file avant admission", buckets=LATENCY_BUCKETS)
+
+
+class OverloadedError(RuntimeError):
+    """Requête refusée par le contrôle d'admission ; retry_after en secondes"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Contrôle d'admission d'un groupe d'endpoints : au plus max_in_flight requêtes
+    traitées à la fois, au plus max_queue en attente (ordre d'arrivée).
+
+    Une requête est refusée immédiatement (OverloadedError) si la file est pleine ou
+    si son attente estimée dépasse slo_seconds. L'attente est estimée à partir de la
+    durée moyenne de traitement (moyenne mobile exponentielle) : position dans la file
+    × durée moyenne / max_in_flight. max_in_flight = 0 désactive le contrôle.
+
+    À utiliser depuis la boucle asyncio uniquement (pas de verrou) :
+
+        async with controller.admit():
+            ...
+    """
+
+    def __init__(self, route: str, max_in_flight: int = 0, max_queue: int = 64,
+                 slo_seconds: float = 0.0, ewma_alpha: float = 0.2):
+
+        self.route = route
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.slo_seconds = slo_seconds
+        self.ewma_alpha = ewma_alpha
+
+        self.in_flight = 0
+        self.service_seconds = 0.0  # durée moyenne de traitement (0 tant qu'aucune mesure)
+        self._waiters: deque = deque()
+
+        self._admitted = admitted_total.labels(route)
+        self._queued = queued_total.labels(route)
+        self._in_flight_gauge = in_flight_gauge.labels(route)
+        self._queue_depth_gauge = queue_depth_gauge.labels(route)
+        self._queue_wait = queue_wait.labels(route)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self, position: int) -> float:
+        """Attente estimée (s) de la requête en position position de la file (à partir de 1)"""
+        return position * self.service_seconds / self.max_in_flight
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Réserve une place de traitement, en attendant dans la file si besoin.
+
+        Raises:
+            OverloadedError: file pleine ou attente estimée au-delà du SLO
+        """
+        if not self.enabled:
+            yield
+            return
+
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+        else:
+            await self._wait_in_queue()
+        self._admitted.inc()
+        self._update_gauges()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe_service(time.perf_counter() - start)
+            self._release()
+
+    async def _wait_in_queue(self):
+        position = len(self._waiters) + 1
+        if position > self.max_queue:
+            self._shed("queue_full", position)
+        if self.slo_seconds and self.estimated_wait(position) > self.slo_seconds:
+            self._shed("slo", position)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._queued.inc()
+        self._update_gauges()
+        start = time.perf_counter()
+        try:
+            # La place est transmise par _release (in_flight déjà compté)
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            self._update_gauges()
+            raise
+        self._queue_wait.observe(time.perf_counter() - start)
+
+    def _shed(self, reason: str, position: int):
+        shed_total.labels(self.route, reason).inc()
+        retry_after = max(1, math.ceil(self.estimated_wait(position)))
+        if reason == "queue_full":
+            message = f"File d'attente pleine ({self.max_queue} requêtes)"
+        else:
+            message = (f"Attente estimée {self.estimated_wait(position) * 1000:.0f} ms au-delà du SLO "
+                       f"de {self.slo_seconds * 1000:.0f} ms")
+        raise OverloadedError(message, retry_after)
+
+    def _release(self):
+        """Transmet la place à la première requête en file, sinon la libère"""
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._update_gauges()
+                return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    def _observe_service(self, seconds: float):
+        if self.service_seconds == 0.0:
+            self.service_seconds = seconds
+        else:
+            self.service_seconds += self.ewma_alpha * (seconds - self.service_seconds)
+
+    def _update_gauges(self):
+        self._in_flight_gauge.set(self.in_flight)
+        self._queue_depth_gauge.set(len(self._waiters))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "slo_ms": self.slo_seconds * 1000,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "service_ms": round(self.service_seconds * 1000, 3),
+        }
+
+
+def collect() -> List[Any]:
+    """Métriques d'admission exposées sur /metrics"""
+    return (admitted_total.collect() + queued_total.collect() + shed_total.collect()
+            + in_flight_gauge.collect() + queue_depth_gauge.collect() + queue_wait.collect())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Artefact binaire natif du modèle : forêt aplatie + schéma d'entrée dans un seul fichier.
+
+Le fichier se charge en quelques millisecondes sans scikit-learn, joblib ni pandas :
+un en-tête JSON décrit le format, le modèle d'origine, les colonnes et les encodages,
+puis les tableaux de la forêt suivent, alignés sur 64 octets, et sont ouverts en
+memory-map (pages partagées entre les workers).
+
+Format (version ARTIFACT_FORMAT_VERSION) :
+    8 octets   ARTIFACT_MAGIC
+    8 octets   longueur de l'en-tête JSON (uint64 little-endian)
+    n octets   en-tête JSON (utf-8), complété jusqu'au multiple de 64 suivant
+    ...        tableaux bruts, positions relatives au début de cette section
+
+Usage :
+    python artifact.py export [--model Model_diabetes_RF.pkl] [--output Model_diabetes_RF.forest]
+    python artifact.py info Model_diabetes_RF.forest
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from forest import FOREST_ARRAYS, FlatForest
+
+ARTIFACT_MAGIC = b"DIABRF\x00\x00"
+ARTIFACT_FORMAT_VERSION = 1
+ALIGNMENT = 64
+DEFAULT_ARTIFACT_SUFFIX = ".forest"
+
+_PREFIX = struct.Struct("<8sQ")
+
+
+def default_artifact_path(model_path: str) -> str:
+    """Model_diabetes_RF.pkl -> Model_diabetes_RF.forest"""
+    return os.path.splitext(model_path)[0] + DEFAULT_ARTIFACT_SUFFIX
+
+
+def is_artifact(path: str) -> bool:
+    """Vérifie la signature du fichier (indépendamment de son extension)"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(ARTIFACT_MAGIC)) == ARTIFACT_MAGIC
+    except OSError:
+        return False
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def export_artifact(model, output_path: str) -> Dict[str, Any]:
+    """
+    Écrit l'artefact d'un modèle chargé avec sa forêt aplatie.
+
+    Args:
+        model (ModelDiabetes): Modèle chargé (load_model)
+        output_path (str): Chemin du fichier à écrire
+
+    Returns:
+        Dict[str, Any]: En-tête écrit dans l'artefact
+    """
+    if model.flat_forest is None:
+        raise ValueError("Le modèle n'a pas de forêt aplatie : export impossible")
+
+    return write_artifact(model.flat_forest, output_path, {
+        "source": os.path.basename(model.model_path),
+        "source_sha256": model.model_sha256(),
+        "model_params": model.model_params,
+        "feature_columns": model.feature_columns,
+        "categorical_encodings": model.encodings,
+    })
+
+
+def write_artifact(forest: FlatForest, output_path: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Écrit une forêt aplatie et ses métadonnées (source, source_sha256, model_params,
+    feature_columns, categorical_encodings, champs libres) dans un artefact.
+    """
+    arrays = {name: np.ascontiguousarray(getattr(forest, name)) for name in FOREST_ARRAYS}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+
+    header = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        **metadata,
+        "arrays": layout,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _align(_PREFIX.size + len(header_bytes))
+
+    # Écriture atomique : un worker ne peut jamais ouvrir un artefact à moitié écrit
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(ARTIFACT_MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.write(b"\0" * (data_start + layout[name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, output_path)
+
+    return header
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """Lit et vérifie l'en-tête d'un artefact"""
+    with open(path, "rb") as f:
+        return _parse_header(f.read(_PREFIX.size), f)[0]
+
+
+def _parse_header(prefix: bytes, f) -> Tuple[Dict[str, Any], int]:
+    if len(prefix) < _PREFIX.size:
+        raise ValueError("Artefact invalide: fichier tronqué")
+    magic, header_length = _PREFIX.unpack(prefix)
+    if magic != ARTIFACT_MAGIC:
+        raise ValueError("Artefact invalide: signature inconnue")
+
+    header = json.loads(f.read(header_length).decode("utf-8"))
+    if header.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Version d'artefact non supportée: {header.get('format_version')}")
+    return header, _align(_PREFIX.size + header_length)
+
+
+def load_artifact(path: str) -> Tuple[FlatForest, Dict[str, Any]]:
+    """
+    Ouvre un artefact en memory-map (lecture seule) et reconstruit la forêt aplatie
+    sans copie des tableaux.
+
+    Returns:
+        Tuple[FlatForest, Dict[str, Any]]: Forêt et en-tête
+    """
+    with open(path, "rb") as f:
+        header, data_start = _parse_header(f.read(_PREFIX.size), f)
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = {}
+    for name in FOREST_ARRAYS:
+        spec = header["arrays"][name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        offset = data_start + spec["offset"]
+        if offset + count * dtype.itemsize > len(buffer):
+            raise ValueError(f"Artefact invalide: tableau {name} tronqué")
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(spec["shape"])
+
+    arrays["classes"] = arrays.pop("classes_")
+    return FlatForest(**arrays), header
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Artefact natif du modèle (sans scikit-learn au chargement)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Convertit le modèle pickle en artefact")
+    export_parser.add_argument("--model", default="Model_diabetes_RF.pkl")
+    export_parser.add_argument("--output", default=None)
+    export_parser.add_argument("--check-rows", type=int, default=100_000,
+                               help="Lignes aléatoires comparées à scikit-learn après l'export")
+
+    info_parser = subparsers.add_parser("info", help="Affiche l'en-tête d'un artefact")
+    info_parser.add_argument("artifact")
+
+    args = parser.parse_args()
+
+    if args.command == "info":
+        print(json.dumps(read_header(args.artifact), indent=2, ensure_ascii=False))
+        return 0
+
+    from model import ModelDiabetes
+
+    model = ModelDiabetes(args.model)
+    model.load_model()
+    output_path = args.output or default_artifact_path(args.model)
+    export_artifact(model, output_path)
+    print(f"✅ Artefact écrit: {output_path} ({os.path.getsize(output_path)} octets)")
+
+    # Contrôle : l'artefact rechargé doit reproduire exactement scikit-learn
+    forest, _ = load_artifact(output_path)
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 2, size=(args.check_rows, len(model.feature_columns))).astype(np.float32)
+    X[:, 0] = rng.integers(0, 121, size=args.check_rows)
+    if not np.array_equal(forest.predict_proba(X), model.model.predict_proba(X)):
+        print("❌ L'artefact ne reproduit pas les probabilités de scikit-learn")
+        return 1
+    print(f"✅ Probabilités identiques à scikit-learn sur {args.check_rows} lignes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
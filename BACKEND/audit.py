@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+Journal d'audit des prédictions : un enregistrement binaire de taille fixe par patient
+évalué (horodatage, version du modèle, patient encodé, P(diabète), classe, risque).
+
+Le chemin des requêtes ne fait qu'ajouter les lignes dans un tampon circulaire borné
+en mémoire (AuditLog.record) ; un thread écrit le tampon par blocs dans des fichiers
+en ajout seul, avec rotation par taille. Quand le tampon est plein, la politique
+choisie s'applique : ignorer les nouvelles lignes, écraser les plus anciennes ou
+attendre une place (dans la limite d'un délai). Les lignes perdues sont comptées.
+
+Format d'un fichier : AUDIT_MAGIC, longueur de l'en-tête (uint32 little-endian),
+en-tête JSON (colonnes, encodages, niveaux de risque), puis les enregistrements
+AUDIT_DTYPE bout à bout. Un enregistrement incomplet en fin de fichier (arrêt brutal)
+est ignoré à la lecture.
+
+Usage (lecture) :
+    python audit.py summary audit/
+    python audit.py query audit/ --since 2025-01-01T00:00:00 --risk-level "Très élevé" --limit 100
+    python audit.py query audit/ --version 3f2a9c1b7d4e --format csv > extrait.csv
+"""
+
+import argparse
+import calendar
+import csv
+import glob
+import json
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lookup_table import RISK_THRESHOLDS, unpack_keys
+from metrics import Counter, Gauge
+
+AUDIT_FORMAT_VERSION = 1
+AUDIT_MAGIC = b"DIABAUD1"
+# Un enregistrement : 30 octets. version : identifiant hexadécimal de 12 caractères (48 bits) ;
+# key : patient encodé (age << 15 | masque, voir lookup_table.pack_keys) ;
+# p_diabetes : NaN en mode tranche (probabilités non calculées)
+AUDIT_DTYPE = np.dtype([
+    ("timestamp_ns", "<i8"),
+    ("version", "<u8"),
+    ("key", "<u4"),
+    ("p_diabetes", "<f8"),
+    ("prediction", "u1"),
+    ("risk", "u1"),
+])
+
+# Politiques quand le tampon est plein
+POLICIES = ("drop_newest", "drop_oldest", "block")
+
+
+def _version_code(version: str) -> int:
+    """Identifiant de version hexadécimal -> entier (0 s'il n'est pas hexadécimal)"""
+    try:
+        return int(version[:12], 16)
+    except ValueError:
+        return 0
+
+
+class AuditLog:
+    """
+    Tampon circulaire de capacity enregistrements et thread d'écriture.
+
+    Le thread écrit tout le contenu du tampon toutes les flush_interval secondes, ou
+    dès que le tampon est à moitié plein. Un nouveau fichier est ouvert quand le
+    fichier courant dépasserait max_file_bytes ; avec max_files > 0, les fichiers les
+    plus anciens du dossier sont supprimés au-delà de ce nombre.
+
+    Politiques quand le tampon est plein :
+        drop_newest  les nouvelles lignes sont ignorées (la requête n'attend jamais)
+        drop_oldest  les lignes les plus anciennes non écrites sont écrasées
+        block        le thread appelant attend une place, au plus block_timeout
+                     secondes, puis ignore les lignes restantes
+    """
+
+    def __init__(self, directory: str, feature_columns: Sequence[str], encodings: Dict[str, Dict[str, int]],
+                 risk_levels: Sequence[str], capacity: int = 65536, policy: str = "drop_newest",
+                 flush_interval: float = 1.0, max_file_bytes: int = 64 << 20, max_files: int = 0,
+                 block_timeout: float = 1.0, fsync: bool = False):
+
+        if policy not in POLICIES:
+            raise ValueError(f"Politique d'audit inconnue: {policy} (valeurs: {', '.join(POLICIES)})")
+        self.directory = directory
+        self.header = {
+            "format_version": AUDIT_FORMAT_VERSION,
+            "dtype": AUDIT_DTYPE.descr,
+            "feature_columns": list(feature_columns),
+            "categorical_encodings": encodings,
+            "risk_levels": list(risk_levels),
+            "pid": os.getpid(),
+        }
+        self.capacity = capacity
+        self.policy = policy
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.block_timeout = block_timeout
+        self.fsync = fsync
+
+        self._buffer = np.zeros(capacity, dtype=AUDIT_DTYPE)
+        self._head = 0  # plus ancienne ligne non écrite
+        self._size = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        self._version_codes: Dict[str, int] = {}
+
+        self._file = None
+        self._file_path: Optional[str] = None
+        self._file_bytes = 0
+        self._file_sequence = 0
+
+        # Métriques
+        self.recorded = Counter("diabete_audit_records_total", "Lignes ajoutées au tampon d'audit")
+        self.written = Counter("diabete_audit_written_total", "Lignes d'audit écrites sur le disque")
+        self.dropped = Counter("diabete_audit_dropped_total", "Lignes d'audit perdues (tampon plein, erreur d'écriture)")
+        self.write_errors = Counter("diabete_audit_write_errors_total", "Écritures du journal d'audit en erreur")
+        self.buffered = Gauge("diabete_audit_buffered", "Lignes d'audit en attente d'écriture")
+
+    def record(self, version: str, keys: np.ndarray, predictions: np.ndarray,
+               p_diabetes: Optional[np.ndarray] = None, risk: Optional[np.ndarray] = None):
+        """
+        Ajoute les patients évalués au tampon : une copie en mémoire, jamais d'accès disque.
+
+        Args:
+            version: Version du modèle qui a prédit
+            keys: Patients encodés (lookup_table.pack_keys)
+            predictions: Classes prédites
+            p_diabetes: P(diabète) par patient (absente en mode tranche)
+            risk: Codes de risque, déduits de p_diabetes s'ils ne sont pas fournis
+        """
+        n_rows = len(keys)
+        if n_rows == 0:
+            return
+        if risk is None:
+            risk = np.searchsorted(RISK_THRESHOLDS, p_diabetes, side="right")
+        version_code = self._version_codes.get(version)
+        if version_code is None:
+            version_code = self._version_codes.setdefault(version, _version_code(version))
+
+        if n_rows == 1:
+            # Patient seul : un tuple écrit directement dans le tampon, sans tableau intermédiaire
+            record = (time.time_ns(), version_code, int(keys[0]),
+                      math.nan if p_diabetes is None else float(p_diabetes[0]), int(predictions[0]), int(risk[0]))
+            with self._lock:
+                if self._size < self.capacity:
+                    self._buffer[(self._head + self._size) % self.capacity] = record
+                    self._size += 1
+                else:
+                    self._put(np.array([record], dtype=AUDIT_DTYPE))
+                self.buffered.set(self._size)
+                if self._size * 2 >= self.capacity:
+                    self._not_empty.notify()
+            self.recorded.inc()
+            return
+
+        records = np.empty(n_rows, dtype=AUDIT_DTYPE)
+        records["timestamp_ns"] = time.time_ns()
+        records["version"] = version_code
+        records["key"] = keys
+        records["p_diabetes"] = np.nan if p_diabetes is None else p_diabetes
+        records["prediction"] = predictions
+        records["risk"] = risk
+
+        with self._lock:
+            self._put(records)
+            self.buffered.set(self._size)
+            if self._size * 2 >= self.capacity:
+                self._not_empty.notify()
+        self.recorded.inc(n_rows)
+
+    def _put(self, records: np.ndarray):
+        """Copie records dans le tampon selon la politique (verrou tenu)"""
+        if self.policy == "drop_oldest":
+            if len(records) > self.capacity:
+                self.dropped.inc(len(records) - self.capacity)
+                records = records[-self.capacity:]
+            overflow = self._size + len(records) - self.capacity
+            if overflow > 0:
+                self._head = (self._head + overflow) % self.capacity
+                self._size -= overflow
+                self.dropped.inc(overflow)
+            self._copy_in(records)
+            return
+
+        if self.policy == "drop_newest":
+            kept = min(len(records), self.capacity - self._size)
+            if kept < len(records):
+                self.dropped.inc(len(records) - kept)
+            self._copy_in(records[:kept])
+            return
+
+        # block : par morceaux, au rythme des écritures
+        deadline = time.monotonic() + self.block_timeout
+        while len(records):
+            free = self.capacity - self._size
+            if free == 0:
+                self._not_empty.notify()
+                remaining = deadline - time.monotonic()
+                if self._closing or remaining <= 0 or not self._not_full.wait(remaining):
+                    if self._size == self.capacity:
+                        self.dropped.inc(len(records))
+                        return
+                continue
+            self._copy_in(records[:free])
+            records = records[free:]
+
+    def _copy_in(self, records: np.ndarray):
+        if not len(records):
+            return
+        start = (self._head + self._size) % self.capacity
+        first = min(len(records), self.capacity - start)
+        self._buffer[start:start + first] = records[:first]
+        self._buffer[:len(records) - first] = records[first:]
+        self._size += len(records)
+
+    def _take_all(self) -> np.ndarray:
+        """Retire tout le contenu du tampon, dans l'ordre d'arrivée (verrou tenu)"""
+        end = self._head + self._size
+        if end <= self.capacity:
+            records = self._buffer[self._head:end].copy()
+        else:
+            records = np.concatenate([self._buffer[self._head:], self._buffer[:end - self.capacity]])
+        self._head = end % self.capacity
+        self._size = 0
+        self.buffered.set(0)
+        self._not_full.notify_all()
+        return records
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._size * 2 < self.capacity and not self._closing:
+                    # Écriture par blocs : à l'échéance, ou plus tôt si le tampon est à moitié plein
+                    self._not_empty.wait(self.flush_interval)
+                records = self._take_all() if self._size else None
+                closing = self._closing
+            if records is not None:
+                self._write(records)
+            if closing:
+                with self._lock:
+                    if not self._size:
+                        break
+
+    def _write(self, records: np.ndarray):
+        data = records.tobytes()
+        try:
+            if self._file is None or self._file_bytes + len(data) > self.max_file_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file_bytes += len(data)
+            self.written.inc(len(records))
+        except OSError as e:
+            self.write_errors.inc()
+            self.dropped.inc(len(records))
+            print(f"⚠️ Journal d'audit : {len(records)} lignes non écrites dans {self._file_path}: {e}")
+            self._close_file()
+
+    def _rotate(self):
+        """Ferme le fichier courant et en ouvre un nouveau (en-tête écrit immédiatement)"""
+        self._close_file()
+        self._file_sequence += 1
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        self._file_path = os.path.join(self.directory, f"audit-{stamp}-{os.getpid()}-{self._file_sequence:04d}.bin")
+        header = json.dumps({**self.header, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}).encode()
+        self._file = open(self._file_path, "ab")
+        self._file.write(AUDIT_MAGIC + struct.pack("<I", len(header)) + header)
+        self._file_bytes = self._file.tell()
+        if self.max_files > 0:
+            self._apply_retention()
+
+    def _apply_retention(self):
+        """
+        Supprime les fichiers les plus anciens de ce processus au-delà de max_files. Les
+        fichiers des autres workers (même dossier) ne sont jamais touchés : ils peuvent
+        être en cours d'écriture.
+        """
+        paths = audit_files(self.directory, pid=os.getpid())
+        for path in paths[:max(0, len(paths) - self.max_files)]:
+            if path != self._file_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def stop(self):
+        """Écrit les lignes en attente puis arrête le thread d'écriture"""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._closing = True
+            self._not_empty.notify()
+            self._not_full.notify_all()
+        self._thread.join()
+        self._thread = None
+        self._close_file()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "policy": self.policy,
+            "capacity": self.capacity,
+            "buffered": self._size,
+            "recorded": self.recorded.value,
+            "written": self.written.value,
+            "dropped": self.dropped.value,
+            "write_errors": self.write_errors.value,
+            "current_file": self._file_path,
+        }
+
+    def collect(self) -> List[Any]:
+        """Métriques exposées sur /metrics"""
+        return [self.recorded, self.written, self.dropped, self.write_errors, self.buffered]
+
+
+def audit_files(directory: str, pid: Optional[int] = None) -> List[str]:
+    """Fichiers d'audit du dossier (ceux du processus pid seulement s'il est donné), du plus ancien au plus récent"""
+    pattern = "audit-*.bin" if pid is None else f"audit-*-{pid}-*.bin"
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+
+def read_audit_file(path: str) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    En-tête et enregistrements d'un fichier d'audit (memory-map en lecture seule).
+    Un enregistrement incomplet en fin de fichier est ignoré.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(AUDIT_MAGIC)) != AUDIT_MAGIC:
+            raise ValueError(f"{path} n'est pas un journal d'audit")
+        (header_length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_length))
+    if header["format_version"] != AUDIT_FORMAT_VERSION:
+        raise ValueError(f"Version de format non supportée: {header['format_version']}")
+
+    offset = len(AUDIT_MAGIC) + 4 + header_length
+    n_records = (os.path.getsize(path) - offset) // AUDIT_DTYPE.itemsize
+    if n_records == 0:
+        return header, np.empty(0, dtype=AUDIT_DTYPE)
+    return header, np.memmap(path, dtype=AUDIT_DTYPE, mode="r", offset=offset, shape=(n_records,))
+
+
+def _parse_time(value: str) -> int:
+    """Date ISO 8601 UTC (2025-01-31 ou 2025-01-31T08:00:00) -> nanosecondes"""
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(time.strptime(value.rstrip("Z"), fmt)) * 1_000_000_000
+        except ValueError:
+            continue
+    raise ValueError(f"Date invalide: {value}")
+
+
+def query(directory: str, since: Optional[str] = None, until: Optional[str] = None,
+          version: Optional[str] = None, risk_level: Optional[str] = None,
+          prediction: Optional[int] = None, min_p: Optional[float] = None,
+          limit: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Enregistrements filtrés de tous les fichiers du dossier, dans l'ordre des fichiers,
+    décodés en dicts (patient en clair comme dans les réponses de /predict).
+    """
+    since_ns = _parse_time(since) if since else None
+    until_ns = _parse_time(until) if until else None
+    returned = 0
+
+    for path in audit_files(directory):
+        header, records = read_audit_file(path)
+        mask = np.ones(len(records), dtype=bool)
+        if since_ns is not None:
+            mask &= records["timestamp_ns"] >= since_ns
+        if until_ns is not None:
+            mask &= records["timestamp_ns"] < until_ns
+        if version is not None:
+            mask &= records["version"] == _version_code(version)
+        if risk_level is not None:
+            if risk_level not in header["risk_levels"]:
+                raise ValueError(f"Niveau de risque inconnu: {risk_level} "
+                                 f"(valeurs: {', '.join(header['risk_levels'])})")
+            mask &= records["risk"] == header["risk_levels"].index(risk_level)
+        if prediction is not None:
+            mask &= records["prediction"] == prediction
+        if min_p is not None:
+            mask &= records["p_diabetes"] >= min_p
+
+        selected = np.asarray(records[mask])
+        if limit:
+            selected = selected[:limit - returned]
+        for row in decode_records(header, selected):
+            yield row
+        returned += len(selected)
+        if limit and returned >= limit:
+            return
+
+
+def decode_records(header: Dict[str, Any], records: np.ndarray) -> List[Dict[str, Any]]:
+    """Enregistrements -> dicts (horodatage ISO, version, patient en clair, prédiction)"""
+    columns = header["feature_columns"]
+    labels = {column: {code: label for label, code in mapping.items()}
+              for column, mapping in header["categorical_encodings"].items()}
+    features = unpack_keys(records["key"]).astype(np.int64).tolist()
+    rows = []
+    for record, values in zip(records.tolist(), features):
+        timestamp_ns, version, _, p_diabetes, prediction, risk = record
+        patient = {column: labels[column][value] if column in labels else value
+                   for column, value in zip(columns, values)}
+        rows.append({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp_ns // 1_000_000_000))
+                         + f".{timestamp_ns % 1_000_000_000 // 1000:06d}Z",
+            "model_version": f"{version:012x}",
+            **patient,
+            "prediction": prediction,
+            "p_diabetes": None if math.isnan(p_diabetes) else p_diabetes,
+            "risk_level": header["risk_levels"][risk],
+        })
+    return rows
+
+
+def summarize(directory: str) -> Dict[str, Any]:
+    """Fichiers, nombre d'enregistrements, période couverte et répartitions par version et risque"""
+    files = []
+    versions: Dict[str, int] = {}
+    risk_levels: Dict[str, int] = {}
+    first, last = None, None
+    for path in audit_files(directory):
+        header, records = read_audit_file(path)
+        files.append({"path": path, "records": len(records), "bytes": os.path.getsize(path)})
+        if not len(records):
+            continue
+        timestamps = records["timestamp_ns"]
+        first = min(first, int(timestamps.min())) if first is not None else int(timestamps.min())
+        last = max(last, int(timestamps.max())) if last is not None else int(timestamps.max())
+        codes, counts = np.unique(records["version"], return_counts=True)
+        for code, count in zip(codes.tolist(), counts.tolist()):
+            versions[f"{code:012x}"] = versions.get(f"{code:012x}", 0) + count
+        for level, count in zip(header["risk_levels"], np.bincount(records["risk"], minlength=len(header["risk_levels"]))):
+            risk_levels[level] = risk_levels.get(level, 0) + int(count)
+
+    iso = lambda ns: time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ns // 1_000_000_000)) if ns is not None else None
+    return {
+        "files": files,
+        "records": sum(f["records"] for f in files),
+        "first": iso(first),
+        "last": iso(last),
+        "model_versions": versions,
+        "risk_levels": risk_levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lecture du journal d'audit des prédictions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summary_parser = subparsers.add_parser("summary", help="Fichiers, période et répartitions")
+    summary_parser.add_argument("directory")
+
+    query_parser = subparsers.add_parser("query", help="Enregistrements filtrés (NDJSON ou CSV)")
+    query_parser.add_argument("directory")
+    query_parser.add_argument("--since", default=None, help="Date UTC incluse (2025-01-31 ou 2025-01-31T08:00:00)")
+    query_parser.add_argument("--until", default=None, help="Date UTC exclue")
+    query_parser.add_argument("--version", default=None, help="Version du modèle (12 caractères)")
+    query_parser.add_argument("--risk-level", default=None)
+    query_parser.add_argument("--prediction", type=int, choices=[0, 1], default=None)
+    query_parser.add_argument("--min-p", type=float, default=None, help="P(diabète) minimale")
+    query_parser.add_argument("--limit", type=int, default=0, help="Nombre maximal de lignes (0 = toutes)")
+    query_parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        print(json.dumps(summarize(args.directory), indent=2, ensure_ascii=False))
+        return 0
+
+    rows = query(args.directory, args.since, args.until, args.version, args.risk_level,
+                 args.prediction, args.min_p, args.limit)
+    writer = None
+    try:
+        for row in rows:
+            if args.format == "ndjson":
+                sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+                continue
+            if writer is None:
+                writer = csv.DictWriter(sys.stdout, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+    except ValueError as e:
+        # Filtre invalide (date, niveau de risque) : message sur stderr, la sortie reste exploitable
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import Counter, Histogram
+
+
+class QueueFullError(RuntimeError):
+    """La file d'attente du micro-batcher est pleine"""
+
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes /predict concurrentes en un seul appel d'inférence.
+
+    Les requêtes sont accumulées jusqu'à max_batch_size éléments ou max_wait_us
+    microsecondes après la première, puis évaluées ensemble dans un thread
+    (la boucle asyncio continue de remplir le lot suivant pendant ce temps).
+    Chaque requête en attente reçoit ensuite son propre résultat.
+
+    Chaque requête indique le modèle qui doit l'évaluer (la version lue au début de
+    la requête) : predict_batch(model, records) est appelé une fois par modèle
+    présent dans le lot, un seul en dehors d'une bascule.
+    """
+
+    def __init__(self, predict_batch: Callable[[Any, List[Dict]], List[Dict[str, Any]]],
+                 max_batch_size: int = 64, max_wait_us: int = 2000, max_queue_depth: int = 1024):
+
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_us = max_wait_us
+        self.max_queue_depth = max_queue_depth
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Métriques
+        size_buckets = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+        self.batch_size = Histogram(
+            "diabete_batcher_batch_size", [b for b in size_buckets if b < max_batch_size] + [max_batch_size],
+            "Nombre de requêtes par lot"
+        )
+        self.queue_wait = Histogram(
+            "diabete_batcher_queue_wait_seconds",
+            [50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3],
+            "Attente en file avant l'inférence"
+        )
+        self.rejected = Counter("diabete_batcher_rejected_total", "Requêtes refusées (file pleine)")
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Démarre la boucle de regroupement (à appeler depuis la boucle asyncio)"""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_depth)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Arrête la boucle ; les requêtes encore en file reçoivent une erreur"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while self._queue is not None and not self._queue.empty():
+            _, _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher arrêté"))
+
+    async def submit(self, record: Dict, model: Any) -> Dict[str, Any]:
+        """
+        Ajoute un patient au prochain lot et attend son résultat, calculé par model.
+
+        Raises:
+            QueueFullError: si la file a atteint max_queue_depth
+        """
+        if not self.is_running:
+            raise RuntimeError("Micro-batcher non démarré")
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((record, model, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected.inc()
+            raise QueueFullError(f"File d'attente pleine ({self.max_queue_depth} requêtes)")
+
+        return await future
+
+    async def _collect(self) -> List:
+        """Attend une première requête puis remplit le lot jusqu'à la taille ou au délai"""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_us / 1e6
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+
+            now = time.perf_counter()
+            for _, _, _, enqueued_at in batch:
+                self.queue_wait.observe(now - enqueued_at)
+            self.batch_size.observe(len(batch))
+
+            # Un sous-lot par modèle (plusieurs seulement si une bascule a eu lieu pendant l'attente)
+            groups: Dict[int, List] = {}
+            for item in batch:
+                groups.setdefault(id(item[1]), []).append(item)
+
+            for group in groups.values():
+                records = [record for record, _, _, _ in group]
+                try:
+                    results = await loop.run_in_executor(None, self.predict_batch, group[0][1], records)
+                except Exception as e:
+                    for _, _, future, _ in group:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for (_, _, future, _), result in zip(group, results):
+                    # Le client a pu abandonner la requête entre-temps
+                    if not future.done():
+                        future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Configuration et métriques du micro-batcher"""
+        return {
+            "running": self.is_running,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_us": self.max_wait_us,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_size": self._queue.qsize() if self._queue is not None else 0,
+            "rejected": self.rejected.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'encodage des entrées : chemin pandas historique
+(DataFrame + encode_categorical_features) contre l'encodeur NumPy précompilé.
+
+Usage : python benchmark_encoder.py [--sizes 1 100 100000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from model import ModelDiabetes
+from registry import warmup_records
+
+
+def pandas_path(model: ModelDiabetes, records):
+    """Chemin historique de preprocess_input"""
+    df = pd.DataFrame(records)[model.feature_columns]
+    return model.encode_categorical_features(df)
+
+
+def numpy_path(model: ModelDiabetes, records):
+    """Encodeur précompilé"""
+    return model.encoder.encode(records)
+
+
+def time_call(func, *args, min_time: float = 0.5):
+    """Temps moyen par appel (en secondes), répété jusqu'à min_time"""
+    func(*args)
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func(*args)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'encodage des entrées")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 100_000])
+    parser.add_argument("--min-time", type=float, default=0.5, help="Durée minimale par mesure (s)")
+    args = parser.parse_args()
+
+    model = ModelDiabetes()
+
+    print(f"{'taille':>8} | {'pandas (ms)':>12} | {'numpy (ms)':>11} | {'gain':>6}")
+    print("-" * 47)
+    for size in args.sizes:
+        records = warmup_records(model, size)
+
+        # Les deux chemins doivent produire exactement les mêmes valeurs
+        assert np.array_equal(pandas_path(model, records).to_numpy(dtype=np.float32),
+                              numpy_path(model, records))
+
+        pandas_time = time_call(pandas_path, model, records, min_time=args.min_time)
+        numpy_time = time_call(numpy_path, model, records, min_time=args.min_time)
+        print(f"{size:>8} | {pandas_time * 1e3:>12.4f} | {numpy_time * 1e3:>11.4f} | "
+              f"{pandas_time / numpy_time:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
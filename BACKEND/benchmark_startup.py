@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark du démarrage à froid : chaque mesure est faite dans un nouveau processus
+Python, en séparant le temps d'import (modules de l'API) du temps de chargement
+du modèle et de la première prédiction. Indique aussi si scikit-learn et pandas
+ont été importés.
+
+Usage : python benchmark_startup.py [--models Model_diabetes_RF.pkl Model_diabetes_RF.forest] [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+STAGES = ("import_seconds", "load_seconds", "first_prediction_seconds", "total_seconds")
+
+PATIENT = {
+    "age": 45, "gender": "Male", "polyuria": "Yes", "polydipsia": "Yes", "sudden_weight_loss": "No",
+    "weakness": "Yes", "polyphagia": "No", "genital_thrush": "No", "visual_blurring": "No",
+    "itching": "No", "irritability": "No", "delayed_healing": "No", "partial_paresis": "No",
+    "muscle_stiffness": "No", "alopecia": "No", "obesity": "No",
+}
+
+
+def measure_child(model_path: str):
+    """Exécuté dans le processus enfant : mesure un démarrage complet"""
+    start = time.perf_counter()
+    import main  # noqa: F401  (application FastAPI et ses dépendances)
+    from model import ModelDiabetes
+    imported = time.perf_counter()
+
+    model = ModelDiabetes(model_path)
+    model.load_model()
+    loaded = time.perf_counter()
+
+    result = model.predict_from_json(PATIENT)
+    predicted = time.perf_counter()
+    assert result["success"], result
+
+    print(json.dumps({
+        "import_seconds": imported - start,
+        "load_seconds": loaded - imported,
+        "first_prediction_seconds": predicted - loaded,
+        "total_seconds": predicted - start,
+        "sklearn_imported": "sklearn" in sys.modules,
+        "pandas_imported": "pandas" in sys.modules,
+    }))
+
+
+def run(model_path: str, runs: int):
+    """Lance runs processus enfants et retourne la médiane de chaque étape"""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", model_path],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    summary = {stage: statistics.median(sample[stage] for sample in samples) for stage in STAGES}
+    summary["sklearn_imported"] = samples[0]["sklearn_imported"]
+    summary["pandas_imported"] = samples[0]["pandas_imported"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage à froid")
+    parser.add_argument("--models", nargs="+", default=["Model_diabetes_RF.pkl", "Model_diabetes_RF.forest"])
+    parser.add_argument("--runs", type=int, default=5, help="Nombre de démarrages mesurés par modèle")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child(args.child)
+        return
+
+    results = {model_path: run(model_path, args.runs) for model_path in args.models}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'modèle':<28} | {'import (ms)':>11} | {'chargement (ms)':>15} | "
+          f"{'1re préd. (ms)':>14} | {'total (ms)':>10} | sklearn | pandas")
+    print("-" * 112)
+    for model_path, summary in results.items():
+        print(f"{os.path.basename(model_path):<28} | {summary['import_seconds'] * 1e3:>11.1f} | "
+              f"{summary['load_seconds'] * 1e3:>15.1f} | {summary['first_prediction_seconds'] * 1e3:>14.2f} | "
+              f"{summary['total_seconds'] * 1e3:>10.1f} | {'oui' if summary['sklearn_imported'] else 'non':>7} | "
+              f"{'oui' if summary['pandas_imported'] else 'non':>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks reproductible de l'API.
+
+1. Micro-benchmarks : chaque méthode de ModelDiabetes à plusieurs tailles de lot.
+2. Charge : l'application FastAPI est appelée directement en ASGI (sans réseau ni
+   serveur) par N clients concurrents ; débit et latences p50/p95/p99 par endpoint.
+
+Les résultats sont écrits en JSON. Avec --baseline, chaque mesure est comparée à un
+fichier de résultats précédent et le code de sortie vaut 1 si l'une d'elles se dégrade
+au-delà de --threshold.
+
+Usage :
+    python benchmark_suite.py --output benchmark_results.json
+    python benchmark_suite.py --baseline benchmark_results.json --threshold 0.15
+    python benchmark_suite.py --skip-micro --concurrency 1 8 32 --duration 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from benchmark_encoder import time_call
+from model import ModelDiabetes
+from registry import warmup_records
+
+# Sens de chaque mesure pour la détection de régression
+LOWER_IS_BETTER = ("seconds_per_call", "p50_ms", "p95_ms", "p99_ms")
+HIGHER_IS_BETTER = ("rows_per_second", "throughput_rps")
+# Mesures comparées à la référence (les percentiles bas sont trop bruités)
+COMPARED_METRICS = ("seconds_per_call", "throughput_rps", "p99_ms")
+
+
+def run_micro(model: ModelDiabetes, sizes: List[int], min_time: float) -> Dict[str, Dict[str, float]]:
+    """Temps par appel de chaque méthode de ModelDiabetes (cache désactivé)"""
+    results = {}
+    for size in sizes:
+        records = warmup_records(model, size)
+        validated = [model.validate_json_input(record) for record in records]
+        features = model.encode_batch(validated)
+
+        cases = {
+            "validate_json_input": (lambda: [model.validate_json_input(record) for record in records]),
+            "preprocess_input": (lambda: model.preprocess_input(validated)),
+            "predict": (lambda: model.predict(validated)),
+            "predict_proba": (lambda: model.predict_proba(validated)),
+            "predict_with_proba": (lambda: model.predict_with_proba(validated)),
+            "infer": (lambda: model._infer(features)),
+            "predict_batch_from_json": (lambda: model.predict_batch_from_json(records)),
+        }
+        if size == 1:
+            cases["predict_from_json"] = lambda: model.predict_from_json(records[0])
+
+        for name, func in cases.items():
+            seconds = time_call(func, min_time=min_time)
+            results[f"{name}[{size}]"] = {
+                "seconds_per_call": seconds,
+                "rows_per_second": size / seconds,
+            }
+            print(f"  {name + f'[{size}]':<32} {seconds * 1e6:>12.1f} µs/appel  {size / seconds:>12.0f} lignes/s")
+    return results
+
+
+async def asgi_request(app, method: str, path: str, body: bytes = b"",
+                       content_type: str = "application/json") -> Tuple[int, bytes]:
+    """Appelle l'application ASGI directement et retourne (statut, corps)"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "server": ("bench", 80), "client": ("127.0.0.1", 0),
+        "headers": [(b"host", b"bench"), (b"content-type", content_type.encode()),
+                    (b"content-length", str(len(body)).encode())],
+    }
+    request_sent = False
+    status = 0
+    chunks = []
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def run_load(app, path: str, bodies: List[bytes], concurrency: int, duration: float) -> Dict[str, float]:
+    """
+    concurrency clients envoient des requêtes en boucle pendant duration secondes.
+    Retourne le débit et les percentiles de latence.
+    """
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(seed: int):
+        nonlocal errors
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            body = bodies[rng.randrange(len(bodies))]
+            start = time.perf_counter()
+            status, _ = await asgi_request(app, "POST", path, body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(seed) for seed in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1e3
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+async def run_load_suite(concurrency_levels: List[int], duration: float, batch_size: int,
+                         n_patients: int) -> Dict[str, Dict[str, float]]:
+    """Charge sur /predict et /predict/batch, application démarrée en mémoire"""
+    import main
+
+    await main.app.router.startup()
+    try:
+        patients = warmup_records(main.model, n_patients)
+        single_bodies = [json.dumps(patient).encode() for patient in patients]
+        batch_bodies = [
+            json.dumps({"patients": patients[i:i + batch_size]}).encode()
+            for i in range(0, max(len(patients) - batch_size, 0) + 1, batch_size)
+        ]
+
+        results = {}
+        for path, bodies in (("/predict", single_bodies), ("/predict/batch", batch_bodies)):
+            for concurrency in concurrency_levels:
+                name = f"{path} c={concurrency}" + (f" lot={batch_size}" if path == "/predict/batch" else "")
+                result = await run_load(main.app, path, bodies, concurrency, duration)
+                results[name] = result
+                print(f"  {name:<32} {result['throughput_rps']:>9.0f} req/s  p50 {result['p50_ms']:.2f} ms  "
+                      f"p95 {result['p95_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms  erreurs {result['errors']}")
+        return results
+    finally:
+        await main.app.router.shutdown()
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Liste des mesures dégradées de plus de threshold (en relatif) par rapport à la référence"""
+    regressions = []
+    for section in ("micro", "load"):
+        for name, metrics in results.get(section, {}).items():
+            reference = baseline.get(section, {}).get(name)
+            if not reference:
+                continue
+            for metric in COMPARED_METRICS:
+                if metric not in metrics or not reference.get(metric):
+                    continue
+                change = metrics[metric] / reference[metric] - 1
+                worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+                if worse:
+                    regressions.append(f"{section} {name} {metric}: {reference[metric]:.6g} -> "
+                                       f"{metrics[metric]:.6g} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks et test de charge en mémoire")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="Résultats de référence à comparer")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Dégradation relative tolérée")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--min-time", type=float, default=0.5, help="Durée minimale par micro-benchmark (s)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=3.0, help="Durée de chaque test de charge (s)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Patients par requête /predict/batch")
+    parser.add_argument("--patients", type=int, default=10_000, help="Patients distincts envoyés")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_path": os.getenv("MODEL_PATH", "Model_diabetes_RF.pkl"),
+            "args": vars(args),
+        }
+    }
+
+    if not args.skip_micro:
+        print("⏳ Micro-benchmarks")
+        model = ModelDiabetes(results["meta"]["model_path"])
+        model.load_model()
+        results["micro"] = run_micro(model, args.sizes, args.min_time)
+
+    if not args.skip_load:
+        print("⏳ Test de charge ASGI")
+        results["load"] = asyncio.run(run_load_suite(args.concurrency, args.duration,
+                                                     args.batch_size, args.patients))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Résultats écrits: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} régression(s) au-delà de {args.threshold:.0%} :")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"✅ Aucune régression au-delà de {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
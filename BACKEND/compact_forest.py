@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Compaction de la forêt : variantes plus petites du modèle servi, comparées au modèle
+complet sur un jeu de validation, et export de la variante retenue en artefact.
+
+Variantes :
+    first-K        K premiers arbres
+    greedy-K       K arbres choisis un à un pour approcher au mieux les probabilités
+                   du modèle complet (sélection gloutonne sur la moitié du jeu)
+    depth-D        tous les arbres tronqués à la profondeur D
+    greedy-K-D     combinaison des deux (avec --grid)
+
+Chaque variante est mesurée sur l'autre moitié du jeu : écart de P(diabète), accord
+des classes et des niveaux de risque avec le modèle complet, latence d'une ligne et
+d'un lot de 1000 lignes. La variante retenue est la moins coûteuse (arbres × profondeur)
+qui respecte les seuils d'accord ; elle est écrite en artefact servable par
+ModelDiabetes (MODEL_PATH ou POST /admin/model/reload).
+
+Usage :
+    python compact_forest.py --report compaction_report.json
+    python compact_forest.py --data diabetes_data_upload.csv --output Model_diabetes_RF.compact.forest
+    python compact_forest.py --trees 50 100 --depths 6 7 --grid --min-risk-agreement 0.98
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from artifact import write_artifact
+from benchmark_encoder import time_call
+from forest import FlatForest
+from lookup_table import KEYS_PER_AGE, MAX_AGE, RISK_THRESHOLDS, unpack_keys
+from model import ModelDiabetes
+
+
+def load_dataset(model: ModelDiabetes, path: Optional[str], samples: int,
+                 seed: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Jeu de validation encodé et, si le CSV a une colonne class, les étiquettes.
+    Sans fichier : patients tirés uniformément parmi toutes les combinaisons possibles.
+    """
+    if path is None:
+        rng = np.random.default_rng(seed)
+        return unpack_keys(rng.integers(0, (MAX_AGE + 1) * KEYS_PER_AGE, size=samples)), None
+
+    import pandas as pd
+    from streaming import normalize_column
+
+    data = pd.read_csv(path)
+    data.columns = [normalize_column(column) for column in data.columns]
+    records = data.to_dict(orient="records")
+    features = model.encode_batch([model.validate_json_input(record) for record in records])
+    labels = None
+    if "class" in data.columns:
+        labels = data["class"].map({"Positive": 1, "Negative": 0}).to_numpy()
+    # Ordre aléatoire reproductible avant le partage sélection / validation
+    order = np.random.default_rng(seed).permutation(len(features))
+    return features[order], labels[order] if labels is not None else None
+
+
+def greedy_tree_order(forest: FlatForest, X: np.ndarray, n_trees: int) -> List[int]:
+    """
+    Sélection gloutonne : à chaque étape, l'arbre qui minimise l'écart quadratique
+    moyen entre la moyenne des arbres retenus et P(classe 1) du modèle complet.
+    """
+    tree_values = forest.value[forest.apply(X), 1]  # (n, n_arbres)
+    target = tree_values.mean(axis=1)
+    squared_norms = (tree_values ** 2).sum(axis=0)
+    total = np.zeros(len(X))
+    chosen: List[int] = []
+    available = np.ones(forest.n_estimators, dtype=bool)
+
+    for k in range(1, n_trees + 1):
+        # ||(total + v) / k - target||² à une constante près, pour tous les arbres v
+        residual = total / k - target
+        errors = 2.0 / k * (residual @ tree_values) + squared_norms / k ** 2
+        errors[~available] = np.inf
+        tree = int(np.argmin(errors))
+        chosen.append(tree)
+        available[tree] = False
+        total += tree_values[:, tree]
+    return chosen
+
+
+def build_variants(forest: FlatForest, X_select: np.ndarray, tree_counts: List[int],
+                   depths: List[int], grid: bool) -> Dict[str, Tuple[Optional[List[int]], Optional[int]]]:
+    """Variantes à évaluer : nom -> (arbres, profondeur maximale)"""
+    tree_counts = sorted(k for k in set(tree_counts) if 0 < k < forest.n_estimators)
+    depths = sorted(d for d in set(depths) if 0 < d < forest.max_depth)
+    greedy_order = greedy_tree_order(forest, X_select, max(tree_counts)) if tree_counts else []
+
+    variants: Dict[str, Tuple[Optional[List[int]], Optional[int]]] = {"full": (None, None)}
+    for k in tree_counts:
+        variants[f"first-{k}"] = (list(range(k)), None)
+        variants[f"greedy-{k}"] = (greedy_order[:k], None)
+    for depth in depths:
+        variants[f"depth-{depth}"] = (None, depth)
+        if grid:
+            for k in tree_counts:
+                variants[f"greedy-{k}-{depth}"] = (greedy_order[:k], depth)
+    return variants
+
+
+def evaluate(forest: FlatForest, reference: np.ndarray, X: np.ndarray, labels: Optional[np.ndarray],
+             min_time: float) -> Dict[str, Any]:
+    """Accord avec les probabilités de référence et latence d'une variante"""
+    probabilities = forest.predict_proba(X)
+    p_diabetes, p_reference = probabilities[:, 1], reference[:, 1]
+    predictions = forest.classes_.take(np.argmax(probabilities, axis=1))
+    reference_predictions = forest.classes_.take(np.argmax(reference, axis=1))
+    risk = np.searchsorted(RISK_THRESHOLDS, p_diabetes, side="right")
+    reference_risk = np.searchsorted(RISK_THRESHOLDS, p_reference, side="right")
+
+    batch = X[:1000]
+    result = {
+        "n_estimators": forest.n_estimators,
+        "max_depth": forest.max_depth,
+        "n_nodes": forest.n_nodes,
+        "steps_per_row": int(forest.depths.sum()),
+        "p_abs_diff_mean": float(np.abs(p_diabetes - p_reference).mean()),
+        "p_abs_diff_max": float(np.abs(p_diabetes - p_reference).max()),
+        "class_agreement": float((predictions == reference_predictions).mean()),
+        "risk_agreement": float((risk == reference_risk).mean()),
+        "seconds_per_row": time_call(forest.predict_proba, X[:1], min_time=min_time),
+        "seconds_per_1000_rows": time_call(forest.predict_proba, batch, min_time=min_time),
+    }
+    if labels is not None:
+        result["accuracy"] = float((predictions == labels).mean())
+    return result
+
+
+def choose_variant(results: Dict[str, Dict[str, Any]], min_class_agreement: float,
+                   min_risk_agreement: float) -> str:
+    """Variante la moins coûteuse (pas de descente par ligne) respectant les seuils d'accord"""
+    eligible = [
+        name for name, result in results.items()
+        if result["class_agreement"] >= min_class_agreement and result["risk_agreement"] >= min_risk_agreement
+    ]
+    return min(eligible, key=lambda name: (results[name]["steps_per_row"], results[name]["seconds_per_row"]))
+
+
+def export_variant(model: ModelDiabetes, forest: FlatForest, name: str, trees: Optional[List[int]],
+                   max_depth: Optional[int], result: Dict[str, Any], output_path: str) -> Dict[str, Any]:
+    """
+    Écrit la variante en artefact. Son empreinte dérive de celle du modèle d'origine et
+    de la variante : elle a sa propre version et n'utilise pas la table précalculée
+    du modèle complet.
+    """
+    source_sha256 = model.model_sha256()
+    return write_artifact(forest, output_path, {
+        "source": os.path.basename(model.model_path),
+        "source_sha256": hashlib.sha256(f"{source_sha256}:{name}".encode()).hexdigest(),
+        "model_params": {**model.model_params, "n_estimators": forest.n_estimators, "max_depth": forest.max_depth},
+        "feature_columns": model.feature_columns,
+        "categorical_encodings": model.encodings,
+        "compaction": {
+            "variant": name,
+            "source_sha256": source_sha256,
+            "trees": trees,
+            "max_depth": max_depth,
+            "held_out": result,
+        },
+    })
+
+
+def print_report(results: Dict[str, Dict[str, Any]], chosen: Optional[str]):
+    print(f"{'variante':<18} {'arbres':>6} {'prof.':>5} {'nœuds':>7} {'|ΔP| moy':>9} {'|ΔP| max':>9} "
+          f"{'classe':>8} {'risque':>8} {'µs/ligne':>9} {'µs/1000':>9}")
+    for name, result in results.items():
+        marker = " ◀" if name == chosen else ""
+        print(f"{name:<18} {result['n_estimators']:>6} {result['max_depth']:>5} {result['n_nodes']:>7} "
+              f"{result['p_abs_diff_mean']:>9.5f} {result['p_abs_diff_max']:>9.4f} "
+              f"{result['class_agreement']:>8.2%} {result['risk_agreement']:>8.2%} "
+              f"{result['seconds_per_row'] * 1e6:>9.1f} {result['seconds_per_1000_rows'] * 1e6:>9.0f}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Variantes compactes de la forêt et rapport accord / latence")
+    parser.add_argument("--model", default="Model_diabetes_RF.pkl", help="Modèle pickle ou artefact")
+    parser.add_argument("--data", default=None, help="CSV de patients (en-têtes du notebook) ; sinon tirage uniforme")
+    parser.add_argument("--samples", type=int, default=40_000, help="Patients tirés sans --data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trees", type=int, nargs="+", default=[25, 50, 100, 150, 200])
+    parser.add_argument("--depths", type=int, nargs="+", default=[5, 6, 7])
+    parser.add_argument("--grid", action="store_true", help="Combiner sélection d'arbres et profondeur")
+    parser.add_argument("--min-class-agreement", type=float, default=0.995)
+    parser.add_argument("--min-risk-agreement", type=float, default=0.99)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Durée minimale de chaque mesure de latence (s)")
+    parser.add_argument("--report", default="compaction_report.json")
+    parser.add_argument("--output", default=None, help="Artefact de la variante retenue")
+    parser.add_argument("--select", default=None, help="Nom de la variante à exporter (au lieu des seuils)")
+    args = parser.parse_args()
+
+    model = ModelDiabetes(args.model)
+    model.load_model()
+    forest = model.flat_forest
+    if forest is None:
+        print("❌ Modèle non aplatissable : compaction impossible")
+        return 1
+
+    X, labels = load_dataset(model, args.data, args.samples, args.seed)
+    half = len(X) // 2
+    X_select, X_eval = X[:half], X[half:]
+    labels_eval = labels[half:] if labels is not None else None
+    print(f"⏳ {len(X_select)} patients pour la sélection, {len(X_eval)} pour la validation")
+
+    variants = build_variants(forest, X_select, args.trees, args.depths, args.grid)
+    reference = forest.predict_proba(X_eval)
+    results = {}
+    forests = {}
+    for name, (trees, max_depth) in variants.items():
+        forests[name] = forest if name == "full" else forest.subforest(trees, max_depth)
+        results[name] = evaluate(forests[name], reference, X_eval, labels_eval, args.min_time)
+
+    if args.select:
+        if args.select not in results:
+            print(f"❌ Variante inconnue: {args.select} (disponibles: {', '.join(results)})")
+            return 1
+        chosen = args.select
+    else:
+        chosen = choose_variant(results, args.min_class_agreement, args.min_risk_agreement)
+    print_report(results, chosen)
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({
+            "model": args.model,
+            "data": args.data or f"uniforme ({args.samples} patients, graine {args.seed})",
+            "held_out_rows": len(X_eval),
+            "thresholds": {"class_agreement": args.min_class_agreement, "risk_agreement": args.min_risk_agreement},
+            "chosen": chosen,
+            "variants": {name: {"trees": variants[name][0], "depth_cap": variants[name][1], **results[name]}
+                         for name in results},
+        }, f, indent=2)
+    print(f"✅ Rapport écrit: {args.report} (variante retenue: {chosen})")
+
+    if args.output:
+        trees, max_depth = variants[chosen]
+        export_variant(model, forests[chosen], chosen, trees, max_depth, results[chosen], args.output)
+        # Contrôle : l'artefact servi par ModelDiabetes reproduit la variante
+        served = ModelDiabetes(args.output)
+        served.load_model()
+        check = X_eval[:2000]
+        if not np.array_equal(served.flat_forest.predict_proba(check), forests[chosen].predict_proba(check)):
+            print("❌ L'artefact ne reproduit pas la variante")
+            return 1
+        print(f"✅ Variante {chosen} écrite: {args.output} ({os.path.getsize(args.output)} octets)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+Fixtures partagées des tests pytest (modèle scikit-learn, artefact, patients encodés).
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PICKLE_PATH = os.path.join(HERE, "Model_diabetes_RF.pkl")
+
+
+def random_rows(n: int, seed: int = 0) -> np.ndarray:
+    """Patients encodés aléatoires (âge puis 15 variables 0/1), âges extrêmes 0 et 120 compris"""
+    rng = np.random.default_rng(seed)
+    X = np.empty((n, 16), dtype=np.float32)
+    X[:, 0] = rng.integers(0, 121, n)
+    X[:, 1:] = rng.integers(0, 2, (n, 15))
+    X[:4, 0] = (0, 120, 0, 120)
+    X[2:4, 1:] = 1
+    X[:2, 1:] = 0
+    return X
+
+
+@pytest.fixture(scope="session")
+def sklearn_model():
+    import joblib
+    return joblib.load(PICKLE_PATH)
+
+
+@pytest.fixture(scope="session")
+def artifact_path(tmp_path_factory) -> str:
+    """
+    Artefact .forest exporté du pickle versionné (le .forest du dossier est un produit
+    de build ignoré par git : les tests ne s'appuient pas dessus)
+    """
+    from artifact import export_artifact
+    from model import ModelDiabetes
+
+    model = ModelDiabetes(PICKLE_PATH)
+    model.load_model()
+    path = str(tmp_path_factory.mktemp("artifact") / "Model_diabetes_RF.forest")
+    export_artifact(model, path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def encoded_rows() -> np.ndarray:
+    return random_rows(20_000)
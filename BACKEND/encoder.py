@@ -0,0 +1,98 @@
+
+import numpy as np
+from typing import Dict, List, Any, Union
+
+
+class FeatureEncoder:
+    """
+    Encodeur précompilé pour le schéma fixe de ModelDiabetes.
+    Transforme un dict ou une liste de dicts directement en matrice NumPy contiguë
+    dans l'ordre de feature_columns, sans passer par pandas.
+    """
+
+    def __init__(self, feature_columns: List[str], encodings: Dict[str, Dict[str, int]],
+                 dtype=np.float32):
+
+        self.feature_columns = list(feature_columns)
+        self.dtype = np.dtype(dtype)
+
+        # Pour chaque colonne : (position, nom, table d'encodage, valeur par défaut).
+        # La valeur par défaut reprend la règle d'encode_categorical_features :
+        # une valeur inconnue est remplacée par la première valeur connue.
+        self._columns = []
+        for index, column in enumerate(self.feature_columns):
+            mapping = encodings.get(column)
+            default = next(iter(mapping.values())) if mapping else None
+            self._columns.append((index, column, mapping, default))
+
+        # Colonnes binaires dans l'ordre de feature_columns (bit i = i-ème colonne binaire)
+        self._binary_columns = [(column, mapping) for _, column, mapping, _ in self._columns if mapping]
+        self._numeric_column = next(column for _, column, mapping, _ in self._columns if not mapping)
+
+    def encode(self, data: Union[Dict, List[Dict], Any]) -> np.ndarray:
+        """
+        Encode un patient, une liste de patients ou un DataFrame.
+
+        Args:
+            data: dict, liste de dicts ou DataFrame (usage hors ligne)
+
+        Returns:
+            np.ndarray: Matrice (n_patients, n_features) C-contiguë
+        """
+        if isinstance(data, dict):
+            return self.encode_records([data])
+        if isinstance(data, list):
+            return self.encode_records(data)
+        if hasattr(data, "columns"):
+            return self.encode_frame(data)
+        raise ValueError("Les données doivent être un dict, une liste de dict ou un DataFrame")
+
+    def encode_records(self, records: List[Dict]) -> np.ndarray:
+        """
+        Encode une liste de dicts colonne par colonne.
+        """
+        matrix = np.empty((len(records), len(self._columns)), dtype=self.dtype)
+
+        try:
+            for index, column, mapping, default in self._columns:
+                if mapping is None:
+                    matrix[:, index] = [record[column] for record in records]
+                else:
+                    get = mapping.get
+                    matrix[:, index] = [get(record[column], default) for record in records]
+        except KeyError:
+            missing = set()
+            for record in records:
+                missing.update(set(self.feature_columns) - set(record))
+            raise ValueError(f"Colonnes manquantes: {missing}")
+
+        return matrix
+
+    def pack_record(self, record: Dict) -> int:
+        """
+        Clé compacte d'un patient validé : age << 15 | masque des colonnes binaires
+        (même convention que lookup_table.pack_keys).
+        """
+        key = 0
+        for bit, (column, mapping) in enumerate(self._binary_columns):
+            key |= mapping[record[column]] << bit
+        return (int(record[self._numeric_column]) << len(self._binary_columns)) | key
+
+    def encode_frame(self, frame) -> np.ndarray:
+        """
+        Encode un DataFrame pandas (usage hors ligne, traitements en masse).
+        """
+        missing_columns = set(self.feature_columns) - set(frame.columns)
+        if missing_columns:
+            raise ValueError(f"Colonnes manquantes: {missing_columns}")
+
+        matrix = np.empty((len(frame), len(self._columns)), dtype=self.dtype)
+
+        for index, column, mapping, default in self._columns:
+            values = frame[column]
+            if mapping is None:
+                matrix[:, index] = values.to_numpy()
+            else:
+                matrix[:, index] = values.map(mapping).fillna(default).to_numpy()
+
+        return matrix
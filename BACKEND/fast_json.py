@@ -0,0 +1,28 @@
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+# orjson est optionnel (pip install orjson) : sérialisation plusieurs fois plus rapide
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """JSON compact en UTF-8 (sans espaces), avec orjson si disponible"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Réponse JSON sérialisée par dumps. Retournée directement par un endpoint, elle
+    évite aussi le passage de FastAPI par jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,309 @@
+
+"""
+Statistiques en flux des patients évalués et des prédictions, en mémoire constante.
+
+Les threads mettent à jour un nombre fixe de groupes de compteurs, chacun avec son
+verrou (peu disputé) ; un instantané additionne les compteurs de tous les groupes.
+Les instantanés ne contiennent que des sommes : ceux de plusieurs workers se fusionnent
+par addition (merge_snapshots), et drift_report compare un instantané à une référence
+enregistrée.
+"""
+
+import itertools
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from lookup_table import MAX_AGE, RISK_THRESHOLDS
+
+# Histogramme de P(diabète) : P_BINS intervalles de même largeur sur [0, 1]
+P_BINS = 20
+# Tranches d'âge (années) pour le calcul de dérive
+AGE_DRIFT_WIDTH = 10
+# Évite log(0) dans le PSI pour une case vide
+PSI_EPSILON = 1e-4
+# Groupes de compteurs partagés par les threads (mémoire fixe quel que soit le trafic)
+DEFAULT_SHARDS = 16
+
+
+class _Shard:
+    """Compteurs d'un groupe de threads, protégés par leur propre verrou"""
+
+    def __init__(self, n_binary: int, n_risk_levels: int):
+
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.rows_with_probability = 0
+        self.yes = np.zeros(n_binary, dtype=np.int64)
+        self.age = np.zeros(MAX_AGE + 1, dtype=np.int64)
+        self.p_diabetes = np.zeros(P_BINS, dtype=np.int64)
+        self.risk = np.zeros(n_risk_levels, dtype=np.int64)
+        self.predictions = np.zeros(2, dtype=np.int64)
+
+    def clear(self):
+        """Remise à zéro en place (verrou tenu par l'appelant)"""
+        self.rows = 0
+        self.rows_with_probability = 0
+        for name in ("yes", "age", "p_diabetes", "risk", "predictions"):
+            getattr(self, name).fill(0)
+
+
+class FeatureStatistics:
+    """
+    Taux de 'Yes' par colonne binaire, histogramme des âges, histogramme de P(diabète),
+    répartition des niveaux de risque et des classes prédites.
+
+    Les colonnes de features suivent feature_columns : l'âge en premier, puis les
+    colonnes binaires (0/1).
+
+    Les compteurs sont répartis sur n_shards groupes fixes : chaque thread reçoit un
+    groupe à sa première observation (à tour de rôle), si bien que la mémoire et le coût
+    de snapshot ne dépendent pas du nombre de threads créés au fil du trafic. Le verrou
+    d'un groupe n'est disputé que par les threads qui le partagent.
+    """
+
+    def __init__(self, feature_columns: Sequence[str], risk_levels: Sequence[str],
+                 n_shards: int = DEFAULT_SHARDS):
+
+        self.feature_columns = list(feature_columns)
+        self.binary_columns = self.feature_columns[1:]
+        self.risk_levels = list(risk_levels)
+        self._shards: List[_Shard] = [_Shard(len(self.binary_columns), len(self.risk_levels))
+                                      for _ in range(n_shards)]
+        self._local = threading.local()
+        self._next_shard = itertools.count()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # next() sur itertools.count est atomique sous le GIL
+            shard = self._shards[next(self._next_shard) % len(self._shards)]
+            self._local.shard = shard
+        return shard
+
+    def observe(self, features: np.ndarray, predictions: np.ndarray,
+                p_diabetes: Optional[np.ndarray] = None, risk: Optional[np.ndarray] = None):
+        """
+        Ajoute un lot de patients évalués.
+
+        Args:
+            features: Matrice encodée (âge, puis colonnes binaires)
+            predictions: Classes prédites (0 ou 1)
+            p_diabetes: P(diabète) par patient (absente en mode tranche)
+            risk: Codes de risque, déduits de p_diabetes s'ils ne sont pas fournis
+        """
+        n_rows = len(features)
+        if n_rows == 0:
+            return
+        if risk is None:
+            risk = np.searchsorted(RISK_THRESHOLDS, p_diabetes, side="right")
+        shard = self._shard()
+
+        with shard.lock:
+            self._add(shard, features, predictions, p_diabetes, risk)
+
+    def _add(self, shard: _Shard, features: np.ndarray, predictions: np.ndarray,
+             p_diabetes: Optional[np.ndarray], risk: np.ndarray):
+        n_rows = len(features)
+        if n_rows == 1:
+            # Patient seul : indexation directe, sans bincount
+            shard.yes += features[0, 1:].astype(np.int64)
+            shard.age[min(int(features[0, 0]), MAX_AGE)] += 1
+            shard.risk[int(risk[0])] += 1
+            shard.predictions[int(predictions[0])] += 1
+            if p_diabetes is not None:
+                shard.p_diabetes[min(int(p_diabetes[0] * P_BINS), P_BINS - 1)] += 1
+        else:
+            shard.yes += features[:, 1:].sum(axis=0).astype(np.int64)
+            ages = np.minimum(features[:, 0].astype(np.int64), MAX_AGE)
+            shard.age += np.bincount(ages, minlength=MAX_AGE + 1)
+            shard.risk += np.bincount(risk, minlength=len(self.risk_levels))
+            shard.predictions += np.bincount(predictions.astype(np.int64), minlength=2)
+            if p_diabetes is not None:
+                bins = np.minimum((p_diabetes * P_BINS).astype(np.int64), P_BINS - 1)
+                shard.p_diabetes += np.bincount(bins, minlength=P_BINS)
+
+        if p_diabetes is not None:
+            shard.rows_with_probability += n_rows
+        shard.rows += n_rows
+
+    def reset(self):
+        """Remet les compteurs à zéro (après le préchauffage d'une version)"""
+        for shard in self._shards:
+            with shard.lock:
+                shard.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Sommes brutes de tous les threads (fusionnables avec merge_snapshots)"""
+        total = _Shard(len(self.binary_columns), len(self.risk_levels))
+        for shard in self._shards:
+            with shard.lock:
+                total.rows += shard.rows
+                total.rows_with_probability += shard.rows_with_probability
+                for name in ("yes", "age", "p_diabetes", "risk", "predictions"):
+                    getattr(total, name).__iadd__(getattr(shard, name))
+        return {
+            "rows": total.rows,
+            "rows_with_probability": total.rows_with_probability,
+            "binary_columns": self.binary_columns,
+            "risk_levels": self.risk_levels,
+            "yes": total.yes.tolist(),
+            "age": total.age.tolist(),
+            "p_diabetes": total.p_diabetes.tolist(),
+            "risk": total.risk.tolist(),
+            "predictions": total.predictions.tolist(),
+        }
+
+
+SUMMED_FIELDS = ("rows", "rows_with_probability", "yes", "age", "p_diabetes", "risk", "predictions")
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Additionne des instantanés (plusieurs workers, plusieurs périodes)"""
+    merged = None
+    for snapshot in snapshots:
+        if merged is None:
+            merged = {key: (list(value) if isinstance(value, list) else value) for key, value in snapshot.items()}
+            continue
+        for field in SUMMED_FIELDS:
+            if isinstance(merged[field], list):
+                merged[field] = [a + b for a, b in zip(merged[field], snapshot[field])]
+            else:
+                merged[field] += snapshot[field]
+    return merged
+
+
+def summarize(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Taux et répartitions lisibles calculés à partir d'un instantané"""
+    rows = snapshot["rows"]
+    ages = np.array(snapshot["age"])
+    age_total = ages.sum()
+    p_edges = np.linspace(0, 1, P_BINS + 1)
+    return {
+        "rows": rows,
+        "yes_rate": {column: round(count / rows, 4) if rows else None
+                     for column, count in zip(snapshot["binary_columns"], snapshot["yes"])},
+        "age": {
+            "mean": round(float(ages @ np.arange(len(ages)) / age_total), 2) if age_total else None,
+            "histogram": _age_groups(ages),
+        },
+        "p_diabetes_histogram": {
+            f"{low:.2f}-{high:.2f}": count for low, high, count in zip(p_edges[:-1], p_edges[1:], snapshot["p_diabetes"])
+        },
+        "risk_levels": dict(zip(snapshot["risk_levels"], snapshot["risk"])),
+        "predictions": {"no_diabetes": snapshot["predictions"][0], "diabetes": snapshot["predictions"][1]},
+    }
+
+
+def _age_groups(ages: np.ndarray) -> Dict[str, int]:
+    """Histogramme des âges par tranches de AGE_DRIFT_WIDTH ans"""
+    groups = {}
+    for start in range(0, len(ages), AGE_DRIFT_WIDTH):
+        end = min(start + AGE_DRIFT_WIDTH, len(ages)) - 1
+        groups[f"{start}-{end}"] = int(ages[start:end + 1].sum())
+    return groups
+
+
+def _psi(current: Sequence[int], reference: Sequence[int]) -> Optional[float]:
+    """Population Stability Index entre deux histogrammes (> 0.2 : dérive marquée)"""
+    current = np.asarray(current, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    if current.sum() == 0 or reference.sum() == 0:
+        return None
+    current = np.maximum(current / current.sum(), PSI_EPSILON)
+    reference = np.maximum(reference / reference.sum(), PSI_EPSILON)
+    return round(float(np.sum((current - reference) * np.log(current / reference))), 4)
+
+
+def drift_report(current: Dict[str, Any], reference: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compare un instantané à une référence : écart des taux de 'Yes' par colonne et
+    PSI des histogrammes d'âge (par tranches), de P(diabète) et des niveaux de risque.
+    """
+    def rates(snapshot):
+        rows = snapshot["rows"]
+        return [count / rows if rows else 0.0 for count in snapshot["yes"]]
+
+    age_groups = lambda snapshot: list(_age_groups(np.array(snapshot["age"])).values())
+    return {
+        "reference_rows": reference["rows"],
+        "yes_rate_delta": {column: round(now - before, 4) for column, now, before
+                           in zip(current["binary_columns"], rates(current), rates(reference))},
+        "psi": {
+            "age": _psi(age_groups(current), age_groups(reference)),
+            "p_diabetes": _psi(current["p_diabetes"], reference["p_diabetes"]),
+            "risk_levels": _psi(current["risk"], reference["risk"]),
+        },
+    }
+
+
+def write_snapshot(snapshot: Dict[str, Any], path: str):
+    """Écrit un instantané de façon atomique (fichier temporaire puis renommage)"""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def read_snapshots(directory: str) -> List[Dict[str, Any]]:
+    """Instantanés des workers écrits dans directory (fichiers illisibles ignorés)"""
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+class SnapshotWriter:
+    """
+    Écrit périodiquement l'instantané d'un worker dans un dossier partagé
+    (un fichier par processus), pour que n'importe quel worker puisse fusionner
+    les statistiques de tous.
+    """
+
+    def __init__(self, get_snapshot, directory: str, interval: float = 10.0):
+
+        self.get_snapshot = get_snapshot
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"worker-{os.getpid()}.json")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self):
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            write_snapshot(snapshot, self.path)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.write()
+                except OSError as e:
+                    print(f"⚠️ Statistiques non écrites dans {self.path}: {e}")
+
+        self._thread = threading.Thread(target=run, name="stats-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Arrête l'écriture périodique après un dernier instantané"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            try:
+                self.write()
+            except OSError:
+                pass
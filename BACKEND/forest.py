@@ -0,0 +1,540 @@
+
+import json
+import os
+import sys
+import numpy as np
+from typing import Any, Dict, Optional, Sequence
+
+# Tableaux sauvegardés par FlatForest.save (un fichier .npy chacun)
+FOREST_ARRAYS = (
+    "feature", "threshold", "left", "value", "roots", "depths", "classes_",
+    "condition_feature", "condition_threshold", "condition_index",
+)
+METADATA_FILE = "forest.json"
+
+# Nombre maximal de lignes évaluées en une fois
+DEFAULT_CHUNK_SIZE = 4096
+# En dessous de ce nombre de lignes, tous les arbres sont descendus ensemble ;
+# au-delà, les arbres sont parcourus un par un, chacun vectorisé sur les lignes
+SMALL_BATCH_SIZE = 512
+# Écart minimal entre l'intervalle atteignable et un seuil pour s'arrêter : couvre
+# largement les erreurs d'arrondi de la somme des arbres (~1e-14)
+BOUND_MARGIN = 1e-9
+# Premier niveau où l'arrêt est testé : plus haut, l'encadrement est toujours trop large
+MIN_CHECK_DEPTH = 3
+# Lignes par bloc pour predict_contributions (tableau intermédiaire n × n_arbres × n_features)
+CONTRIBUTION_CHUNK_SIZE = 64
+
+
+class FlatForest:
+    """
+    Forêt aplatie en tableaux contigus (feature, seuil, enfants, valeurs des feuilles).
+    Évalue une ligne ou un lot sans appeler scikit-learn, avec des résultats
+    identiques bit à bit à RandomForestClassifier.predict_proba.
+
+    Les nœuds de chaque arbre sont renumérotés en largeur pour que l'enfant droit
+    suive toujours l'enfant gauche : un pas de descente vaut
+    `left[node] + (x > threshold[node])`. Les feuilles bouclent sur elles-mêmes
+    (seuil +inf), ce qui permet de descendre tous les arbres max_depth fois.
+
+    Les couples (feature, seuil) distincts sont peu nombreux (une centaine) : chaque
+    ligne est d'abord transformée en vecteur de décisions sur ces conditions, puis
+    la descente ne fait plus que des lectures de tableaux.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray,
+                 value: np.ndarray, roots: np.ndarray, depths: np.ndarray, classes: np.ndarray,
+                 condition_feature: Optional[np.ndarray] = None,
+                 condition_threshold: Optional[np.ndarray] = None,
+                 condition_index: Optional[np.ndarray] = None):
+
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.value = value
+        self.roots = roots
+        self.depths = depths
+        self.classes_ = classes
+        self.n_estimators = len(roots)
+        self.n_classes = value.shape[1]
+        self.max_depth = int(depths.max()) if len(depths) else 0
+
+        # Conditions distinctes et indice de condition de chaque nœud
+        if condition_index is None:
+            conditions, condition_index = np.unique(
+                np.stack([feature.astype(np.float64), threshold], axis=1), axis=0, return_inverse=True
+            )
+            condition_feature = conditions[:, 0].astype(np.intp)
+            condition_threshold = conditions[:, 1]
+            condition_index = np.ascontiguousarray(condition_index.ravel(), dtype=np.intp)
+        self.condition_feature = condition_feature
+        self.condition_threshold = condition_threshold
+        self.condition_index = condition_index
+        self.n_conditions = len(condition_feature)
+        # Bornes des valeurs de feuilles sous chaque nœud (predict_buckets), calculées à la demande
+        self._subtree_bounds = None
+        # Contributions cumulées de la racine à chaque nœud (predict_contributions), calculées à la demande
+        self._path_contributions = None
+
+    @classmethod
+    def from_sklearn(cls, model) -> "FlatForest":
+        """
+        Aplatit un RandomForestClassifier entraîné.
+
+        Args:
+            model: RandomForestClassifier (mono-sortie)
+
+        Returns:
+            FlatForest: Forêt aplatie
+        """
+        if not hasattr(model, "estimators_") or getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError(f"Modèle non supporté pour l'aplatissement: {type(model).__name__}")
+
+        n_classes = int(model.n_classes_)
+        features, thresholds, lefts, values, roots, depths = [], [], [], [], [], []
+        offset = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            order, new_left = _breadth_first_layout(tree.children_left, tree.children_right)
+            is_leaf = tree.children_left[order] == -1
+
+            feature = np.where(is_leaf, 0, tree.feature[order]).astype(np.intp)
+            threshold = np.where(is_leaf, np.inf, tree.threshold[order]).astype(np.float64)
+            left = np.where(is_leaf, np.arange(len(order)), new_left) + offset
+
+            # Valeurs des feuilles telles que retournées par DecisionTreeClassifier.predict_proba
+            value = tree.value[order, 0, :n_classes].astype(np.float64)
+            totals = value.sum(axis=1)
+            if np.any(np.abs(totals - 1.0) > 1e-6):
+                # Anciennes versions de scikit-learn : effectifs, normalisés à la prédiction
+                totals[totals == 0.0] = 1.0
+                value = value / totals[:, np.newaxis]
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(left.astype(np.intp))
+            values.append(value)
+            roots.append(offset)
+            depths.append(tree.max_depth)
+            offset += len(order)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            left=np.ascontiguousarray(np.concatenate(lefts)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            depths=np.asarray(depths, dtype=np.intp),
+            classes=np.asarray(model.classes_),
+        )
+
+    def save(self, directory: str, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Sauvegarde les tableaux (un .npy par tableau) et les métadonnées dans directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in FOREST_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump(metadata or {}, f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "FlatForest":
+        """
+        Ouvre une forêt sauvegardée. Avec mmap_mode="r", les tableaux restent dans le cache
+        de pages du système et sont partagés sans copie entre tous les processus.
+        """
+        arrays = {
+            # np.asarray retire la sous-classe memmap (surcoût à chaque opération)
+            name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode))
+            for name in FOREST_ARRAYS
+        }
+        arrays["classes"] = arrays.pop("classes_")
+        return cls(**arrays)
+
+    @staticmethod
+    def read_metadata(directory: str) -> Optional[Dict[str, Any]]:
+        """Métadonnées d'une forêt sauvegardée, None si absente ou incomplète"""
+        try:
+            with open(os.path.join(directory, METADATA_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def decisions(self, X: np.ndarray) -> np.ndarray:
+        """
+        Évalue toutes les conditions distinctes pour chaque ligne, forme (n, n_conditions).
+        """
+        # Même conversion que scikit-learn : X en float32, comparé au seuil en float64
+        X = np.asarray(X, dtype=np.float32)
+        return X[:, self.condition_feature] > self.condition_threshold
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Retourne l'indice de la feuille atteinte dans chaque arbre, forme (n, n_arbres).
+        """
+        return self._apply_trees(self.decisions(X), self.roots, self.max_depth)
+
+    def _apply_trees(self, decisions: np.ndarray, roots: np.ndarray, depth: int) -> np.ndarray:
+        """
+        Descend les arbres de racines roots pour chaque ligne de decisions, forme (n, len(roots)).
+        """
+        n_rows = len(decisions)
+        flat_decisions = decisions.ravel()
+        row_offsets = (np.arange(n_rows) * self.n_conditions)[:, np.newaxis]
+        nodes = np.broadcast_to(roots, (n_rows, len(roots)))
+
+        for _ in range(depth):
+            nodes = self.left[nodes] + flat_decisions[row_offsets + self.condition_index[nodes]]
+
+        return nodes
+
+    def predict_proba(self, X: np.ndarray, chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+        """
+        Probabilités moyennes de la forêt, forme (n, n_classes).
+        """
+        X = np.asarray(X)
+        if len(X) == 1:
+            return self._predict_proba_one(X[0])
+        if len(X) <= SMALL_BATCH_SIZE:
+            return self._predict_proba_small(X)
+
+        probabilities = np.empty((len(X), self.n_classes), dtype=np.float64)
+        for start in range(0, len(X), chunk_size):
+            probabilities[start:start + chunk_size] = self._predict_proba_large(X[start:start + chunk_size])
+
+        return probabilities
+
+    def _predict_proba_one(self, x: np.ndarray) -> np.ndarray:
+        """
+        Une seule ligne : chemin le plus court (tableaux 1D de n_arbres éléments).
+        """
+        nodes = self._apply_one(x)
+        # Somme séquentielle dans l'ordre des arbres, comme l'accumulation de scikit-learn
+        probabilities = np.cumsum(self.value[nodes], axis=0)[-1]
+        probabilities /= self.n_estimators
+        return probabilities[np.newaxis]
+
+    def _apply_one(self, x: np.ndarray) -> np.ndarray:
+        """Feuilles atteintes par une seule ligne, forme (n_arbres,)"""
+        decisions = np.asarray(x, dtype=np.float32)[self.condition_feature] > self.condition_threshold
+        nodes = self.roots
+
+        for _ in range(self.max_depth):
+            nodes = self.left[nodes] + decisions[self.condition_index[nodes]]
+
+        return nodes
+
+    def _predict_proba_small(self, X: np.ndarray) -> np.ndarray:
+        """
+        Petits lots : tous les arbres descendus ensemble (max_depth pas vectorisés).
+        """
+        leaves = self.apply(X)
+        # Somme séquentielle dans l'ordre des arbres, comme l'accumulation de scikit-learn
+        probabilities = np.cumsum(self.value[leaves], axis=1)[:, -1]
+        probabilities /= self.n_estimators
+        return probabilities
+
+    def _predict_proba_large(self, X: np.ndarray) -> np.ndarray:
+        """
+        Grands lots : un arbre à la fois, chaque pas vectorisé sur toutes les lignes.
+        """
+        n_rows = len(X)
+        # Décisions transposées (condition, ligne) pour des lectures contiguës
+        flat_decisions = np.ascontiguousarray(self.decisions(X).T).ravel()
+        condition_offsets = self.condition_index * n_rows
+        rows = np.arange(n_rows)
+        probabilities = np.zeros((n_rows, self.n_classes), dtype=np.float64)
+
+        for root, depth in zip(self.roots.tolist(), self.depths.tolist()):
+            nodes = np.full(n_rows, root, dtype=np.intp)
+            for _ in range(depth):
+                nodes = self.left[nodes] + flat_decisions[condition_offsets[nodes] + rows]
+            probabilities += self.value[nodes]
+
+        probabilities /= self.n_estimators
+        return probabilities
+
+    def predict_buckets(self, X: np.ndarray, boundaries, bucketize):
+        """
+        Évaluation anticipée quand seule la tranche de P(classe 1) compte (classe, niveau de
+        risque). Tous les arbres sont descendus ensemble, un niveau à la fois ; après chaque
+        niveau, P(classe 1) est encadrée par la somme des valeurs minimales et maximales
+        des feuilles sous le nœud courant de chaque arbre. Une ligne s'arrête dès que cet
+        encadrement ne contient plus aucun seuil de boundaries (à BOUND_MARGIN près).
+
+        Le résultat est identique à l'évaluation complète : une ligne arrêtée ne peut plus
+        changer de tranche, et une ligne qui descend jusqu'aux feuilles a exactement les
+        probabilités de predict_proba (même somme séquentielle des arbres).
+
+        Args:
+            X: Lignes encodées
+            boundaries: Seuils de P(classe 1) où bucketize peut changer de valeur
+            bucketize: Fonction (probabilités (n, 2)) -> codes entiers
+
+        Returns:
+            (codes, depth_used) : code de chaque ligne et nombre de niveaux descendus
+        """
+        if self.n_classes != 2:
+            raise ValueError("L'évaluation anticipée ne supporte que la classification binaire")
+
+        decisions = self.decisions(X)
+        n_rows = len(decisions)
+        flat_decisions = decisions.ravel()
+        boundaries = np.sort(np.asarray(boundaries, dtype=np.float64))
+        subtree_min, subtree_max = self._get_subtree_bounds()
+
+        codes = np.empty(n_rows, dtype=np.int64)
+        depth_used = np.full(n_rows, self.max_depth, dtype=np.int64)
+        active = np.arange(n_rows)
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_estimators))
+
+        for depth in range(1, self.max_depth + 1):
+            row_offsets = (active * self.n_conditions)[:, np.newaxis]
+            nodes = self.left[nodes] + flat_decisions[row_offsets + self.condition_index[nodes]]
+            if depth == self.max_depth:
+                break
+            if depth < MIN_CHECK_DEPTH:
+                continue
+
+            # Encadrement de P(classe 1), élargi de la marge
+            low = subtree_min[nodes].sum(axis=1) / self.n_estimators - BOUND_MARGIN
+            high = subtree_max[nodes].sum(axis=1) / self.n_estimators + BOUND_MARGIN
+            positions = np.searchsorted(boundaries, np.concatenate([low, high]), side="right")
+            decided = positions[:len(low)] == positions[len(low):]
+            if decided.any():
+                rows = active[decided]
+                # Tout l'encadrement est dans la même tranche : son milieu la représente
+                middle = (low[decided] + high[decided]) / 2
+                codes[rows] = bucketize(np.stack([1.0 - middle, middle], axis=1))
+                depth_used[rows] = depth
+                active = active[~decided]
+                nodes = nodes[~decided]
+                if not len(active):
+                    break
+
+        if len(active):
+            # Feuilles atteintes : somme séquentielle dans l'ordre des arbres, comme predict_proba
+            probabilities = np.cumsum(self.value[nodes], axis=1)[:, -1]
+            probabilities /= self.n_estimators
+            codes[active] = bucketize(probabilities)
+
+        return codes, depth_used
+
+    def _get_subtree_bounds(self):
+        """
+        Plus petite et plus grande valeur de classe 1 des feuilles sous chaque nœud
+        """
+        if self._subtree_bounds is None:
+            is_leaf = np.isinf(self.threshold)
+            leaf_values = self.value[:, 1]
+            right = np.minimum(self.left + 1, len(self.left) - 1)
+            subtree_min = leaf_values.copy()
+            subtree_max = leaf_values.copy()
+            # Propagation des feuilles vers la racine, un niveau par itération
+            for _ in range(self.max_depth):
+                subtree_min = np.where(is_leaf, leaf_values, np.minimum(subtree_min[self.left], subtree_min[right]))
+                subtree_max = np.where(is_leaf, leaf_values, np.maximum(subtree_max[self.left], subtree_max[right]))
+            self._subtree_bounds = (subtree_min, subtree_max)
+        return self._subtree_bounds
+
+    def predict_contributions(self, X: np.ndarray, class_index: int = 1,
+                              chunk_size: int = CONTRIBUTION_CHUNK_SIZE):
+        """
+        Décomposition de P(classes_[class_index]) le long des chemins de décision : chaque
+        pas d'un nœud vers son enfant change la valeur du nœud, et ce changement est
+        attribué à la feature testée par le nœud. Pour chaque ligne,
+        probabilité = biais + somme des contributions des features (à l'arrondi près).
+
+        Les contributions de la racine à chaque nœud sont précalculées une fois
+        (prepare_contributions) : une ligne coûte une descente des arbres et une somme
+        de n_arbres vecteurs de n_features valeurs.
+
+        Returns:
+            (probabilities, bias, contributions) : probabilités (n, n_classes) identiques
+            à predict_proba, biais (moyenne des valeurs des racines) et contributions
+            (n, n_features)
+        """
+        X = np.asarray(X)
+        n_rows, n_features = X.shape
+        path_contributions, bias = self.prepare_contributions(n_features, class_index)
+        probabilities = np.empty((n_rows, self.n_classes), dtype=np.float64)
+        contributions = np.empty((n_rows, n_features), dtype=np.float64)
+
+        if n_rows == 1:
+            leaves = self._apply_one(X[0])
+            probabilities[0] = np.cumsum(self.value[leaves], axis=0)[-1]
+            contributions[0] = path_contributions[leaves].sum(axis=0)
+        else:
+            for start in range(0, n_rows, chunk_size):
+                leaves = self.apply(X[start:start + chunk_size])
+                # Somme séquentielle dans l'ordre des arbres, comme predict_proba
+                probabilities[start:start + len(leaves)] = np.cumsum(self.value[leaves], axis=1)[:, -1]
+                contributions[start:start + len(leaves)] = path_contributions[leaves].sum(axis=1)
+
+        probabilities /= self.n_estimators
+        contributions /= self.n_estimators
+        return probabilities, bias, contributions
+
+    def prepare_contributions(self, n_features: int, class_index: int = 1):
+        """
+        Contributions cumulées de la racine à chaque nœud pour la classe class_index,
+        forme (n_nodes, n_features), propagées un niveau à la fois vers les feuilles,
+        et biais de la forêt.
+        """
+        key = (n_features, class_index)
+        if self._path_contributions is None or self._path_contributions[0] != key:
+            values = self.value[:, class_index]
+            path_contributions = np.zeros((self.n_nodes, n_features), dtype=np.float64)
+            is_leaf = np.isinf(self.threshold)
+            frontier = self.roots
+            for _ in range(self.max_depth):
+                parents = frontier[~is_leaf[frontier]]
+                if not len(parents):
+                    break
+                features = self.feature[parents]
+                for children in (self.left[parents], self.left[parents] + 1):
+                    path_contributions[children] = path_contributions[parents]
+                    path_contributions[children, features] += values[children] - values[parents]
+                frontier = np.concatenate([self.left[parents], self.left[parents] + 1])
+            bias = float(values[self.roots].mean())
+            self._path_contributions = (key, path_contributions, bias)
+        return self._path_contributions[1:]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Classes prédites (argmax des probabilités)"""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def subforest(self, trees: Optional[Sequence[int]] = None, max_depth: Optional[int] = None) -> "FlatForest":
+        """
+        Forêt réduite (voir compact_forest.py) : arbres trees (dans cet ordre, tous par
+        défaut), tronqués à max_depth. Un nœud interne à la profondeur max_depth devient
+        une feuille dont la valeur est sa répartition des classes à l'entraînement
+        (scikit-learn la conserve pour chaque nœud).
+        """
+        trees = range(self.n_estimators) if trees is None else trees
+        node_depths = self._node_depths()
+        is_leaf = np.isinf(self.threshold)
+        ends = np.append(self.roots[1:], self.n_nodes)
+        features, thresholds, lefts, values, roots, depths = [], [], [], [], [], []
+        offset = 0
+
+        for tree in trees:
+            start, end = int(self.roots[tree]), int(ends[tree])
+            # Disposition en largeur : les nœuds de profondeur <= max_depth forment un préfixe
+            block = np.arange(start, end)
+            if max_depth is not None:
+                block = block[node_depths[start:end] <= max_depth]
+            becomes_leaf = is_leaf[block]
+            if max_depth is not None:
+                becomes_leaf = becomes_leaf | (node_depths[block] == max_depth)
+
+            new_index = block - start + offset
+            features.append(np.where(becomes_leaf, 0, self.feature[block]).astype(np.intp))
+            thresholds.append(np.where(becomes_leaf, np.inf, self.threshold[block]))
+            lefts.append(np.where(becomes_leaf, new_index, self.left[block] - start + offset).astype(np.intp))
+            values.append(self.value[block])
+            roots.append(offset)
+            depths.append(int(node_depths[block].max()))
+            offset += len(block)
+
+        return FlatForest(
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            left=np.ascontiguousarray(np.concatenate(lefts)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            depths=np.asarray(depths, dtype=np.intp),
+            classes=np.asarray(self.classes_),
+        )
+
+    def _node_depths(self) -> np.ndarray:
+        """Profondeur de chaque nœud (0 pour les racines)"""
+        node_depths = np.zeros(self.n_nodes, dtype=np.intp)
+        is_leaf = np.isinf(self.threshold)
+        frontier = self.roots
+        for depth in range(1, self.max_depth + 1):
+            internal = frontier[~is_leaf[frontier]]
+            frontier = np.concatenate([self.left[internal], self.left[internal] + 1])
+            node_depths[frontier] = depth
+        return node_depths
+
+    def get_info(self) -> Dict[str, Any]:
+        """Informations sur la forêt aplatie"""
+        return {
+            "n_estimators": self.n_estimators,
+            "n_nodes": self.n_nodes,
+            "max_depth": self.max_depth,
+        }
+
+
+def _breadth_first_layout(children_left: np.ndarray, children_right: np.ndarray):
+    """
+    Ordre de parcours en largeur d'un arbre scikit-learn.
+
+    Returns:
+        (order, left) : order[i] est l'ancien indice du nouveau nœud i, left[i] le nouvel
+        indice de son enfant gauche (l'enfant droit est left[i] + 1), -1 pour une feuille
+    """
+    n_nodes = len(children_left)
+    order = np.empty(n_nodes, dtype=np.intp)
+    left = np.full(n_nodes, -1, dtype=np.intp)
+    order[0] = 0
+    head, tail = 0, 1
+
+    while head < tail:
+        node = order[head]
+        if children_left[node] != -1:
+            left[head] = tail
+            order[tail] = children_left[node]
+            order[tail + 1] = children_right[node]
+            tail += 2
+        head += 1
+
+    return order, left
+
+
+def main():
+    """Vérifie que la forêt aplatie reproduit exactement scikit-learn et mesure sa latence"""
+    import argparse
+    import time
+
+    from lookup_table import unpack_keys, MAX_AGE, KEYS_PER_AGE
+    from model import ModelDiabetes
+
+    parser = argparse.ArgumentParser(description="Vérification de la forêt aplatie")
+    parser.add_argument("--model", default="Model_diabetes_RF.pkl")
+    parser.add_argument("--samples", type=int, default=100_000)
+    args = parser.parse_args()
+
+    model = ModelDiabetes(args.model)
+    model.load_model()
+    forest = model.flat_forest
+
+    rng = np.random.default_rng(0)
+    X = unpack_keys(rng.integers(0, (MAX_AGE + 1) * KEYS_PER_AGE, size=args.samples))
+    identical = np.array_equal(forest.predict_proba(X), model.model.predict_proba(X))
+    identical_single = all(
+        np.array_equal(forest.predict_proba(X[i:i + 1]), model.model.predict_proba(X[i:i + 1]))
+        for i in range(min(200, len(X)))
+    )
+
+    latencies = []
+    for i in range(2000):
+        start = time.perf_counter_ns()
+        forest.predict_proba(X[i % len(X):i % len(X) + 1])
+        latencies.append(time.perf_counter_ns() - start)
+
+    print(f"Lignes comparées: {len(X)}, identiques à scikit-learn: {identical and identical_single}")
+    print(f"Latence une ligne: p50 {np.percentile(latencies, 50) / 1e3:.1f} µs, "
+          f"p99 {np.percentile(latencies, 99) / 1e3:.1f} µs")
+    return 0 if identical and identical_single else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""
+Configuration gunicorn pour servir l'API avec plusieurs workers uvicorn.
+
+    SHARED_MODEL_DIR=/dev/shm/diabete_model gunicorn main:app -c gunicorn.conf.py
+
+Avec SHARED_MODEL_DIR, la forêt est exportée une seule fois par le processus maître
+avant le fork ; chaque worker l'ouvre ensuite en memory-map (pages partagées) au lieu
+de charger sa propre copie du modèle scikit-learn.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    """Exporte la forêt partagée avant le démarrage des workers"""
+    shared_dir = os.getenv("SHARED_MODEL_DIR")
+    if shared_dir:
+        from model import ModelDiabetes
+        ModelDiabetes(os.getenv("MODEL_PATH", "Model_diabetes_RF.pkl")).export_shared_model(shared_dir)
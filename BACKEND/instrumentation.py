@@ -0,0 +1,80 @@
+
+import json
+import random
+import time
+from typing import Any, List
+
+from metrics import LATENCY_BUCKETS, Counter, Family, Histogram
+
+# Durée totale des requêtes et réponses par route (modèle de chemin, ex. /predict)
+request_latency = Family(
+    Histogram, "diabete_request_seconds", ["route", "method"],
+    "Durée totale des requêtes HTTP", buckets=LATENCY_BUCKETS,
+)
+responses_total = Family(Counter, "diabete_responses_total", ["route", "status"], "Réponses HTTP par statut")
+
+# Label des requêtes qui ne correspondent à aucune route (404), pour borner les labels
+UNMATCHED_ROUTE = "non_routee"
+
+
+class RequestMetricsMiddleware:
+    """
+    Middleware ASGI (sans BaseHTTPMiddleware) : mesure la durée de chaque requête par route
+    et écrit un journal JSON d'une ligne pour une fraction sample_rate des requêtes
+    (toujours pour les erreurs 5xx).
+
+    Le début de la requête est placé dans request.state.request_start pour que les
+    endpoints puissent mesurer l'étape de lecture du corps.
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0, log_headers: bool = False):
+
+        self.app = app
+        self.sample_rate = sample_rate
+        self.log_headers = log_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        scope.setdefault("state", {})["request_start"] = start
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            # La route est ajoutée au scope par le routeur FastAPI
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            request_latency.labels(route, scope["method"]).observe(duration)
+            responses_total.labels(route, str(status)).inc()
+
+            if status >= 500 or (self.sample_rate and random.random() < self.sample_rate):
+                self._log(scope, route, status, duration)
+
+    def _log(self, scope, route: str, status: int, duration: float):
+        entry = {
+            "ts": round(time.time(), 3),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "client": scope["client"][0] if scope.get("client") else None,
+        }
+        if self.log_headers:
+            entry["headers"] = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        print(json.dumps(entry, ensure_ascii=False))
+
+
+def collect() -> List[Any]:
+    """Métriques HTTP exposées sur /metrics"""
+    return request_latency.collect() + responses_total.collect()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Table de probabilités précalculée pour ModelDiabetes.
+
+L'espace d'entrée est fini : âge entier de 0 à 120 et 15 variables binaires,
+soit 121 x 2^15 = 3 964 928 combinaisons. Chaque combinaison est évaluée une seule
+fois par la forêt et P(diabète) est stockée quantifiée sur 16 bits dans un fichier
+.npy ouvert en memory-map (lecture seule, partagé entre les workers par le cache
+de pages du système).
+
+Usage :
+    python lookup_table.py build  [--model Model_diabetes_RF.pkl] [--output ...]
+    python lookup_table.py verify [--model ...] [--table ...] [--tolerance 1e-4] [--sample N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+TABLE_FORMAT_VERSION = 1
+MAX_AGE = 120
+N_BINARY_FEATURES = 15
+KEYS_PER_AGE = 1 << N_BINARY_FEATURES
+QUANTIZATION_SCALE = 65535
+# Quantification : P(diabète) >= 0.5 + 1/2 quantum <=> classe 1 (voir _quantize)
+LABEL_THRESHOLD = 32768
+# Seuils des niveaux de risque (ModelDiabetes._get_risk_level), préservés par la quantification
+RISK_THRESHOLDS = (0.3, 0.6, 0.8)
+
+DEFAULT_TABLE_SUFFIX = ".table.npy"
+
+# Poids des bits : la colonne 1 + i de feature_columns correspond au bit i
+_BIT_WEIGHTS = (1 << np.arange(N_BINARY_FEATURES)).astype(np.int64)
+
+
+def default_table_path(model_path: str) -> str:
+    """Chemin par défaut de la table associée à un modèle"""
+    return os.path.splitext(model_path)[0] + DEFAULT_TABLE_SUFFIX
+
+
+def file_sha256(path: str) -> str:
+    """Empreinte SHA-256 d'un fichier"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pack_keys(features: np.ndarray) -> np.ndarray:
+    """
+    Calcule la clé compacte (age << 15 | masque binaire) de chaque ligne encodée.
+
+    Args:
+        features (np.ndarray): Matrice (n, 16) dans l'ordre de feature_columns
+
+    Returns:
+        np.ndarray: Clés int64
+    """
+    ages = features[:, 0].astype(np.int64)
+    masks = features[:, 1:].astype(np.int64) @ _BIT_WEIGHTS
+    return (ages << N_BINARY_FEATURES) | masks
+
+
+def unpack_keys(keys: np.ndarray) -> np.ndarray:
+    """Reconstruit la matrice encodée (n, 16) float32 à partir des clés"""
+    keys = np.asarray(keys, dtype=np.int64)
+    features = np.empty((len(keys), 1 + N_BINARY_FEATURES), dtype=np.float32)
+    features[:, 0] = keys >> N_BINARY_FEATURES
+    features[:, 1:] = (keys[:, None] >> np.arange(N_BINARY_FEATURES)) & 1
+    return features
+
+
+def _smallest_code_at_or_above(threshold: float) -> int:
+    """Plus petit code q tel que q / QUANTIZATION_SCALE >= threshold (en flottant)"""
+    code = int(np.ceil(threshold * QUANTIZATION_SCALE))
+    while code > 0 and (code - 1) / QUANTIZATION_SCALE >= threshold:
+        code -= 1
+    while code / QUANTIZATION_SCALE < threshold:
+        code += 1
+    return code
+
+
+def _quantize(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Quantifie P(diabète) sur 16 bits en conservant exactement la classe prédite et le
+    niveau de risque : la classe 1 (argmax) est toujours >= LABEL_THRESHOLD, la classe 0
+    toujours en dessous, et chaque valeur reste du même côté des seuils de risque.
+    L'écart introduit ne dépasse pas deux quanta.
+    """
+    labels = np.argmax(probabilities, axis=1)
+    diabetes = probabilities[:, 1]
+    quantized = np.rint(diabetes * QUANTIZATION_SCALE).astype(np.int64)
+
+    for threshold in RISK_THRESHOLDS:
+        code = _smallest_code_at_or_above(threshold)
+        quantized = np.where(diabetes < threshold,
+                             np.minimum(quantized, code - 1),
+                             np.maximum(quantized, code))
+
+    quantized = np.where(labels == 1,
+                         np.maximum(quantized, LABEL_THRESHOLD),
+                         np.minimum(quantized, LABEL_THRESHOLD - 1))
+    return quantized.astype(np.uint16)
+
+
+class ProbabilityTable:
+    """
+    Table de probabilités en lecture seule, ouverte en memory-map.
+    Une prédiction coûte une lecture de tableau au lieu du parcours de la forêt.
+    """
+
+    def __init__(self, table_path: str):
+
+        self.table_path = table_path
+        with open(table_path + ".json", "r", encoding="utf-8") as f:
+            self.metadata: Dict[str, Any] = json.load(f)
+
+        if self.metadata.get("format_version") != TABLE_FORMAT_VERSION:
+            raise ValueError(f"Version de table non supportée: {self.metadata.get('format_version')}")
+
+        # mmap_mode="r" : pages partagées entre processus, aucune copie privée
+        self.values = np.load(table_path, mmap_mode="r")
+        if self.values.shape != ((MAX_AGE + 1) * KEYS_PER_AGE,) or self.values.dtype != np.uint16:
+            raise ValueError(f"Table invalide: forme {self.values.shape}, type {self.values.dtype}")
+
+    @property
+    def model_sha256(self) -> str:
+        return self.metadata["model_sha256"]
+
+    def covers(self, features: np.ndarray) -> bool:
+        """Vérifie que toutes les lignes appartiennent au domaine de la table"""
+        ages = features[:, 0]
+        binaries = features[:, 1:]
+        return bool(
+            np.all((ages >= 0) & (ages <= MAX_AGE) & (ages == np.floor(ages)))
+            and np.all((binaries == 0) | (binaries == 1))
+        )
+
+    def lookup(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retourne les classes et les probabilités [P(non), P(diabète)] des lignes encodées.
+        """
+        quantized = self.values[pack_keys(features)]
+        probabilities = np.empty((len(quantized), 2), dtype=np.float64)
+        probabilities[:, 1] = quantized / QUANTIZATION_SCALE
+        probabilities[:, 0] = 1.0 - probabilities[:, 1]
+        predictions = (quantized >= LABEL_THRESHOLD).astype(np.int64)
+        return predictions, probabilities
+
+
+def _forest(model):
+    """Forêt aplatie (identique à scikit-learn) ou, à défaut, le modèle scikit-learn"""
+    return model.flat_forest if model.flat_forest is not None else model.model
+
+
+def build_table(model, output_path: str) -> Dict[str, Any]:
+    """
+    Évalue toutes les combinaisons avec le modèle chargé et écrit la table.
+
+    Args:
+        model (ModelDiabetes): Modèle chargé
+        output_path (str): Chemin du fichier .npy
+
+    Returns:
+        Dict[str, Any]: Métadonnées écrites à côté de la table
+    """
+    values = np.empty((MAX_AGE + 1) * KEYS_PER_AGE, dtype=np.uint16)
+    masks = np.arange(KEYS_PER_AGE, dtype=np.int64)
+
+    start = time.perf_counter()
+    for age in range(MAX_AGE + 1):
+        keys = (age << N_BINARY_FEATURES) | masks
+        probabilities = _forest(model).predict_proba(unpack_keys(keys))
+        values[keys] = _quantize(probabilities)
+        if age % 20 == 0:
+            print(f"⏳ Âge {age}/{MAX_AGE}")
+
+    metadata = {
+        "format_version": TABLE_FORMAT_VERSION,
+        "model_path": os.path.basename(model.model_path),
+        "model_sha256": model.model_sha256(),
+        "feature_columns": model.feature_columns,
+        "categorical_encodings": model.encodings,
+        "max_age": MAX_AGE,
+        "quantization_scale": QUANTIZATION_SCALE,
+        "build_seconds": round(time.perf_counter() - start, 2),
+    }
+
+    # Écriture atomique : un worker ne peut jamais ouvrir une table à moitié écrite
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, values)
+    with open(tmp_path + ".json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path + ".json", output_path + ".json")
+    os.replace(tmp_path, output_path)
+
+    return metadata
+
+
+def verify_table(model, table: ProbabilityTable, tolerance: float, sample: int = 0,
+                 seed: int = 0) -> Dict[str, Any]:
+    """
+    Compare la table au modèle chargé.
+
+    Args:
+        model (ModelDiabetes): Modèle chargé
+        table (ProbabilityTable): Table à vérifier
+        tolerance (float): Écart absolu maximal toléré sur P(diabète)
+        sample (int): Nombre de clés tirées au hasard (0 = toutes les combinaisons)
+
+    Returns:
+        Dict[str, Any]: Rapport de vérification ("ok" indique le succès)
+    """
+    if sample:
+        rng = np.random.default_rng(seed)
+        key_batches = [rng.integers(0, len(table.values), size=sample)]
+    else:
+        masks = np.arange(KEYS_PER_AGE, dtype=np.int64)
+        key_batches = ((age << N_BINARY_FEATURES) | masks for age in range(MAX_AGE + 1))
+
+    sha256_match = table.model_sha256 == model.model_sha256()
+    checked = 0
+    max_error = 0.0
+    label_mismatches = 0
+    risk_mismatches = 0
+    for keys in key_batches:
+        features = unpack_keys(keys)
+        expected = _forest(model).predict_proba(features)
+        expected_labels = _forest(model).classes_.take(np.argmax(expected, axis=1))
+        labels, probabilities = table.lookup(features)
+
+        max_error = max(max_error, float(np.max(np.abs(probabilities[:, 1] - expected[:, 1]))))
+        label_mismatches += int(np.count_nonzero(labels != expected_labels))
+        risk_mismatches += sum(
+            model._get_risk_level(a) != model._get_risk_level(b)
+            for a, b in zip(probabilities[:, 1].tolist(), expected[:, 1].tolist())
+        )
+        checked += len(keys)
+
+    return {
+        "ok": (max_error <= tolerance and label_mismatches == 0 and risk_mismatches == 0
+               and sha256_match),
+        "checked": checked,
+        "max_abs_error": max_error,
+        "tolerance": tolerance,
+        "label_mismatches": label_mismatches,
+        "risk_level_mismatches": risk_mismatches,
+        "model_sha256_match": sha256_match,
+    }
+
+
+def main():
+    from model import ModelDiabetes
+
+    parser = argparse.ArgumentParser(description="Table de probabilités précalculée")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Construit la table à partir du modèle")
+    build_parser.add_argument("--model", default="Model_diabetes_RF.pkl")
+    build_parser.add_argument("--output", default=None)
+
+    verify_parser = subparsers.add_parser("verify", help="Vérifie la table contre le modèle")
+    verify_parser.add_argument("--model", default="Model_diabetes_RF.pkl")
+    verify_parser.add_argument("--table", default=None)
+    verify_parser.add_argument("--tolerance", type=float, default=1e-4)
+    verify_parser.add_argument("--sample", type=int, default=0,
+                               help="Nombre de combinaisons tirées au hasard (0 = toutes)")
+
+    args = parser.parse_args()
+
+    model = ModelDiabetes(args.model)
+    model.load_model()
+
+    if args.command == "build":
+        output_path = args.output or default_table_path(args.model)
+        metadata = build_table(model, output_path)
+        print(f"✅ Table écrite: {output_path} ({metadata['build_seconds']} s)")
+        return 0
+
+    table = ProbabilityTable(args.table or default_table_path(args.model))
+    report = verify_table(model, table, args.tolerance, args.sample)
+    print(json.dumps(report, indent=2))
+    if report["ok"]:
+        print("✅ La table correspond au modèle")
+        return 0
+    print("❌ La table ne correspond pas au modèle")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,35 @@
-from typing import Union, Dict, Any
-from fastapi import FastAPI, HTTPException, Request
+from typing import Union, Dict, Any, List
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response
 from pydantic import BaseModel, Field
-from model import ModelDiabetes
+from fastapi.concurrency import run_in_threadpool
+from model import RISK_LEVELS, ModelDiabetes
+from admission import AdmissionController, OverloadedError
+import admission
+from registry import ModelRegistry, ModelVersion, ReloadInProgressError
+from shadow import ShadowScorer
+from batcher import MicroBatcher, QueueFullError
+from fast_json import FastJSONResponse
+from audit import AuditLog
+from feature_stats import SnapshotWriter, drift_report, merge_snapshots, read_snapshots, summarize
+from metrics import (Counter, Gauge, bucket_levels_total, bucket_rows_total, process_memory,
+                     render_prometheus, stage_latency)
+import instrumentation
+from instrumentation import RequestMetricsMiddleware
+from wire_format import BINARY_MEDIA_TYPE, RECORD_SIZE, decode_records, encode_results, results_to_columns
+from streaming import DuplexStreamingResponse, iter_csv_records, iter_ndjson_records, stream_predictions
+import hmac
+import json
 import os
+import time
 from fastapi.middleware.cors import CORSMiddleware
 
 # Initialisation de l'application FastAPI
 app = FastAPI(
     title="API de Prédiction du Diabète",
     description="API pour prédire le risque de diabète basée sur des symptômes médicaux",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Configuration CORS très permissive pour debugging
@@ -22,15 +42,63 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
-# Middleware pour déboguer les requêtes
-@app.middleware("http")
-async def debug_requests(request: Request, call_next):
-    print(f"🔍 Method: {request.method}, URL: {request.url}")
-    print(f"🔍 Headers: {dict(request.headers)}")
-    response = await call_next(request)
-    print(f"🔍 Response status: {response.status_code}")
+# Métriques par route et journal JSON échantillonné des requêtes
+# (REQUEST_LOG_SAMPLE_RATE=1 et REQUEST_LOG_HEADERS=1 pour tout journaliser en débogage)
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "0.01"))
+REQUEST_LOG_HEADERS = os.getenv("REQUEST_LOG_HEADERS", "0") == "1"
+app.add_middleware(
+    RequestMetricsMiddleware,
+    sample_rate=REQUEST_LOG_SAMPLE_RATE,
+    log_headers=REQUEST_LOG_HEADERS
+)
+
+# Histogrammes des étapes mesurées dans les endpoints (les autres sont dans ModelDiabetes)
+PARSE_LATENCY = stage_latency.labels("parse")
+SERIALIZE_LATENCY = stage_latency.labels("serialize")
+
+
+def observe_parse(request: Request):
+    """Étape parse : réception du corps et validation pydantic, jusqu'à l'entrée dans l'endpoint"""
+    request_start = getattr(request.state, "request_start", None)
+    if request_start is not None:
+        PARSE_LATENCY.observe(time.perf_counter() - request_start)
+
+
+def timed_json_response(content: Dict[str, Any], version: ModelVersion = None) -> FastJSONResponse:
+    """
+    Sérialise la réponse en mesurant l'étape serialize. La réponse est retournée telle
+    quelle par l'endpoint : FastAPI ne la repasse pas dans jsonable_encoder.
+    Avec version, l'en-tête X-Model-Version indique la version qui a prédit.
+    """
+    start = time.perf_counter()
+    response = FastJSONResponse(content, headers=version_headers(version))
+    SERIALIZE_LATENCY.observe(time.perf_counter() - start)
     return response
 
+
+# Réponse compacte : ?format=compact ou en-tête Accept avec ce type
+COMPACT_MEDIA_TYPE = "application/vnd.diabete.compact+json"
+
+
+def wants_compact(request: Request, response_format: Union[str, None]) -> bool:
+    """Format compact demandé par le paramètre format ou par l'en-tête Accept"""
+    if response_format is not None:
+        return response_format == "compact"
+    return COMPACT_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+ResponseFormat = Query(
+    None, alias="format", pattern="^(full|compact|bucket)$",
+    description="compact : classe, P(diabète) et code de risque (0 à 3) sans écho des données ; "
+                "bucket : classe et niveau de risque seulement, avec arrêt anticipé dans les arbres"
+)
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    """Refus du contrôle d'admission : 503 immédiat avec le délai conseillé avant de réessayer"""
+    return FastJSONResponse({"detail": f"Service surchargé: {str(exc)}"}, status_code=503,
+                            headers={"Retry-After": str(exc.retry_after)})
+
 # Handler global pour toutes les requêtes OPTIONS
 @app.options("/{path:path}")
 def handle_options(path: str):
@@ -40,17 +108,246 @@ def handle_options(path: str):
 # Initialisation du modèle (global pour éviter de recharger à chaque requête)
 model = None
 
+# Nombre maximal de patients acceptés par requête de lot
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+
+# Nombre de patients évalués par appel au modèle sur /predict/stream
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "1000"))
+# Longueur maximale d'une ligne sur /predict/stream (octets) : au-delà, erreur pour cette ligne
+STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", "65536"))
+
+# Taille du cache LRU des prédictions (0 pour le désactiver)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "65536"))
+
+# Nombre maximal de patients par requête /predict/binary (3 octets chacun)
+MAX_BINARY_RECORDS = int(os.getenv("MAX_BINARY_RECORDS", "1000000"))
+
+# Micro-batching optionnel des appels /predict concurrents
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "0") == "1"
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "64"))
+MICROBATCH_MAX_WAIT_US = int(os.getenv("MICROBATCH_MAX_WAIT_US", "2000"))
+MICROBATCH_QUEUE_DEPTH = int(os.getenv("MICROBATCH_QUEUE_DEPTH", "1024"))
+batcher = None
+
+# Contrôle d'admission (désactivé si ADMISSION_MAX_IN_FLIGHT vaut 0) : au plus
+# ADMISSION_MAX_IN_FLIGHT requêtes évaluées à la fois et ADMISSION_MAX_QUEUE en attente
+# par groupe d'endpoints ; au-delà, ou si l'attente estimée dépasse ADMISSION_SLO_MS,
+# réponse 503 immédiate avec Retry-After
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "0"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_SLO_MS = float(os.getenv("ADMISSION_SLO_MS", "0"))
+predict_admission = AdmissionController("/predict", ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE,
+                                        ADMISSION_SLO_MS / 1000)
+# /predict/batch et /predict/binary : requêtes plus longues, file et durée moyenne séparées
+batch_admission = AdmissionController("/predict/batch", ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE,
+                                      ADMISSION_SLO_MS / 1000)
+
+# Statistiques des patients et prédictions (GET /stats) : avec STATS_DIR, chaque worker y
+# écrit son instantané toutes les STATS_FLUSH_INTERVAL secondes pour la fusion entre workers ;
+# STATS_REFERENCE_PATH est un instantané de référence (GET /stats?raw=true) pour la dérive
+STATS_DIR = os.getenv("STATS_DIR")
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "10"))
+STATS_REFERENCE_PATH = os.getenv("STATS_REFERENCE_PATH")
+stats_writer = None
+stats_reference = None
+
+# Journal d'audit des prédictions (désactivé sans AUDIT_DIR, voir audit.py) : tampon de
+# AUDIT_BUFFER_SIZE lignes écrit en arrière-plan toutes les AUDIT_FLUSH_INTERVAL secondes,
+# fichiers de AUDIT_MAX_FILE_MB Mo au plus, AUDIT_MAX_FILES conservés par worker (0 : tous).
+# AUDIT_POLICY quand le tampon est plein : drop_newest, drop_oldest ou block
+# (attente d'au plus AUDIT_BLOCK_TIMEOUT secondes) ; AUDIT_FSYNC=1 force l'écriture disque
+AUDIT_DIR = os.getenv("AUDIT_DIR")
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "65536"))
+AUDIT_POLICY = os.getenv("AUDIT_POLICY", "drop_newest")
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))
+AUDIT_MAX_FILE_MB = float(os.getenv("AUDIT_MAX_FILE_MB", "64"))
+AUDIT_MAX_FILES = int(os.getenv("AUDIT_MAX_FILES", "0"))
+AUDIT_BLOCK_TIMEOUT = float(os.getenv("AUDIT_BLOCK_TIMEOUT", "1"))
+AUDIT_FSYNC = os.getenv("AUDIT_FSYNC", "0") == "1"
+audit_log = None
+
+# Évaluation fantôme d'un modèle candidat (désactivée sans SHADOW_MODEL_PATH, voir shadow.py) :
+# SHADOW_SAMPLE_RATE des appels au modèle servi sont réévalués par le candidat dans
+# SHADOW_WORKERS threads, au plus SHADOW_CPU_SHARE d'un cœur, file de SHADOW_MAX_QUEUE échantillons
+SHADOW_MODEL_PATH = os.getenv("SHADOW_MODEL_PATH")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_WORKERS = int(os.getenv("SHADOW_WORKERS", "1"))
+SHADOW_MAX_QUEUE = int(os.getenv("SHADOW_MAX_QUEUE", "1024"))
+SHADOW_CPU_SHARE = float(os.getenv("SHADOW_CPU_SHARE", "0.25"))
+shadow_scorer = None
+
+# Modèle servi : pickle scikit-learn ou artefact natif (python artifact.py export)
+MODEL_PATH = os.getenv("MODEL_PATH", "Model_diabetes_RF.pkl")
+
+# Dossier de la forêt partagée entre workers gunicorn (ex. /dev/shm/diabete_model, voir gunicorn.conf.py)
+SHARED_MODEL_DIR = os.getenv("SHARED_MODEL_DIR")
+
+# Versions du modèle : rollback possible vers les MODEL_HISTORY_SIZE précédentes,
+# rechargement automatique si MODEL_WATCH_INTERVAL (s) > 0 et le fichier change
+MODEL_HISTORY_SIZE = int(os.getenv("MODEL_HISTORY_SIZE", "1"))
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))
+
+# Jeton des endpoints /admin/model/* (en-tête X-Admin-Token) ; sans jeton, ils sont désactivés
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN")
+
+# Patients synthétiques évalués avant la mise en service d'une version (0 : pas de préchauffage)
+MODEL_WARMUP_ROWS = int(os.getenv("MODEL_WARMUP_ROWS", "64"))
+
+MODEL_VERSION_HEADER = "X-Model-Version"
+
+# Durée de démarrage de ce worker (s)
+startup_seconds = None
+
+
+def build_model(path: str) -> ModelDiabetes:
+    """Charge une version du modèle avec la configuration du service (forêt partagée, table)"""
+    new_model = ModelDiabetes(path, cache_size=PREDICTION_CACHE_SIZE)
+    new_model.audit_log = audit_log
+    if SHARED_MODEL_DIR:
+        new_model.load_shared_model(SHARED_MODEL_DIR)
+    else:
+        new_model.load_model()
+    
+    # Service par table précalculée (optionnel, voir lookup_table.py)
+    table_path = os.getenv("LOOKUP_TABLE_PATH")
+    if table_path:
+        try:
+            new_model.load_lookup_table(table_path)
+        except Exception as e:
+            print(f"⚠️ Table de probabilités ignorée, évaluation par la forêt: {e}")
+    return new_model
+
+
+def set_active_model(version: ModelVersion):
+    """
+    Garde la variable globale model alignée sur la version active (scripts, benchmarks)
+    et y branche l'évaluation fantôme en cours
+    """
+    global model
+    model = version.model
+    model.shadow = shadow_scorer
+
+
+def start_shadow(path: str, sample_rate: float) -> ShadowScorer:
+    """Charge le candidat path et remplace l'évaluation fantôme en cours"""
+    global shadow_scorer
+    candidate = ModelDiabetes(path)
+    candidate.load_model()
+    scorer = ShadowScorer(candidate, sample_rate=sample_rate, workers=SHADOW_WORKERS,
+                          max_queue=SHADOW_MAX_QUEUE, cpu_share=SHADOW_CPU_SHARE)
+    scorer.start()
+    stop_shadow()
+    shadow_scorer = scorer
+    if registry.active is not None:
+        registry.active.model.shadow = scorer
+    print(f"✅ Évaluation fantôme de {path} (version {scorer.version}, "
+          f"{sample_rate:.0%} des appels, {SHADOW_CPU_SHARE:.0%} d'un cœur au plus)")
+    return scorer
+
+
+def stop_shadow():
+    """Arrête l'évaluation fantôme en cours"""
+    global shadow_scorer
+    scorer, shadow_scorer = shadow_scorer, None
+    if scorer is None:
+        return
+    if registry.active is not None:
+        registry.active.model.shadow = None
+    scorer.stop()
+
+
+registry = ModelRegistry(build_model, history_size=MODEL_HISTORY_SIZE, warmup_rows=MODEL_WARMUP_ROWS,
+                         on_swap=set_active_model)
+
+# Prêt à recevoir du trafic : modèle chargé et préchauffé, démarrage terminé (voir /ready)
+ready = False
+
+
+def active_version() -> ModelVersion:
+    """
+    Version servie, lue une seule fois par requête : une bascule pendant la requête
+    ne change pas le modèle qui la termine.
+    """
+    version = registry.active
+    if version is None or not version.model.is_loaded:
+        raise HTTPException(status_code=503, detail="Modèle non disponible")
+    return version
+
+
+def version_headers(version: Union[ModelVersion, None]) -> Union[Dict[str, str], None]:
+    return {MODEL_VERSION_HEADER: version.version} if version is not None else None
+
 @app.on_event("startup")
 async def startup_event():
     """Charge le modèle au démarrage de l'application"""
-    global model
+    global batcher, startup_seconds, ready, stats_writer, stats_reference, audit_log
+    start = time.perf_counter()
+    if AUDIT_DIR:
+        # Avant le chargement : chaque version construite par build_model y écrit
+        defaults = ModelDiabetes(MODEL_PATH)
+        audit_log = AuditLog(AUDIT_DIR, defaults.feature_columns, defaults.encodings, RISK_LEVELS,
+                             capacity=AUDIT_BUFFER_SIZE, policy=AUDIT_POLICY, flush_interval=AUDIT_FLUSH_INTERVAL,
+                             max_file_bytes=int(AUDIT_MAX_FILE_MB * (1 << 20)), max_files=AUDIT_MAX_FILES,
+                             block_timeout=AUDIT_BLOCK_TIMEOUT, fsync=AUDIT_FSYNC)
+        audit_log.start()
+        print(f"✅ Journal d'audit dans {AUDIT_DIR} (politique {AUDIT_POLICY}, tampon {AUDIT_BUFFER_SIZE} lignes)")
     try:
-        model = ModelDiabetes("Model_diabetes_RF.pkl")
-        model.load_model()
+        registry.load(MODEL_PATH)
         print("✅ Modèle chargé avec succès au démarrage")
     except Exception as e:
         print(f"❌ Erreur lors du chargement du modèle: {e}")
-        model = None
+        return
+    
+    if SHADOW_MODEL_PATH:
+        try:
+            start_shadow(SHADOW_MODEL_PATH, SHADOW_SAMPLE_RATE)
+        except Exception as e:
+            print(f"⚠️ Évaluation fantôme désactivée: {e}")
+    
+    if MODEL_WATCH_INTERVAL > 0:
+        registry.watch(MODEL_WATCH_INTERVAL)
+        print(f"✅ Surveillance de {MODEL_PATH} toutes les {MODEL_WATCH_INTERVAL} s")
+    
+    if MICROBATCH_ENABLED:
+        # Chaque lot est évalué par la version active au moment de l'évaluation
+        batcher = MicroBatcher(
+            lambda model, records: model.predict_batch_from_json(records),
+            max_batch_size=MICROBATCH_MAX_SIZE,
+            max_wait_us=MICROBATCH_MAX_WAIT_US,
+            max_queue_depth=MICROBATCH_QUEUE_DEPTH
+        )
+        batcher.start()
+        print(f"✅ Micro-batching actif (lots de {MICROBATCH_MAX_SIZE}, attente max {MICROBATCH_MAX_WAIT_US} µs)")
+    
+    if STATS_DIR:
+        stats_writer = SnapshotWriter(worker_stats_snapshot, STATS_DIR, STATS_FLUSH_INTERVAL)
+        stats_writer.start()
+    if STATS_REFERENCE_PATH:
+        try:
+            with open(STATS_REFERENCE_PATH, "r", encoding="utf-8") as f:
+                stats_reference = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Référence de statistiques ignorée: {e}")
+    
+    startup_seconds = time.perf_counter() - start
+    ready = True
+    memory = process_memory()
+    print(f"✅ Worker {os.getpid()} prêt en {startup_seconds * 1000:.0f} ms "
+          f"(mémoire: {memory})")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Arrête le micro-batcher et la surveillance du fichier modèle, vide le journal d'audit"""
+    global ready
+    ready = False
+    if batcher is not None:
+        await batcher.stop()
+    registry.stop()
+    if stats_writer is not None:
+        stats_writer.stop()
+    stop_shadow()
+    if audit_log is not None:
+        audit_log.stop()
 
 # Modèle Pydantic pour valider les données d'entrée
 class PatientData(BaseModel):
@@ -95,6 +392,14 @@ class PatientData(BaseModel):
         }
     
 
+class BatchPatientData(BaseModel):
+    """Modèle de données pour un lot de patients"""
+    # Les patients sont validés un par un par ModelDiabetes afin qu'une ligne
+    # invalide ne fasse pas échouer tout le lot
+    patients: List[Dict[str, Any]] = Field(
+        ..., description="Liste des patients à évaluer", min_length=1, max_length=MAX_BATCH_SIZE
+    )
+
 
 @app.get("/")
 def read_root():
@@ -105,27 +410,138 @@ def read_root():
         "status": "Modèle chargé" if model and model.is_loaded else "Modèle non disponible",
         "endpoints": {
             "prediction": "/predict",
+            "prediction_batch": "/predict/batch",
+            "prediction_stream": "/predict/stream",
+            "prediction_binary": "/predict/binary",
+            "what_if": "/predict/whatif",
+            "explain": "/explain",
+            "explain_batch": "/explain/batch",
             "health": "/health",
+            "live": "/live",
+            "ready": "/ready",
+            "metrics": "/metrics",
+            "stats": "/stats",
+            "model": "/model",
+            "shadow": "/shadow",
             "santé": "/santé",
             "status": "/status"
         }
     }
 
+# Réponse de /live, sérialisée une fois
+LIVE_BODY = b'{"status":"alive"}'
+
+@app.get("/live")
+def liveness_check():
+    """Sonde de vivacité : temps constant, sans accès au modèle"""
+    return Response(LIVE_BODY, media_type="application/json")
+
+@app.get("/ready")
+def readiness_check():
+    """Sonde de disponibilité : 200 une fois le modèle chargé et préchauffé, 503 sinon"""
+    version = registry.active
+    if not ready or version is None:
+        return FastJSONResponse({"status": "not_ready", "loading": registry.is_loading}, status_code=503)
+    return FastJSONResponse({"status": "ready", "model_version": version.version})
+
 @app.get("/health")
 def health_check():
-    """Vérification de l'état de l'API et du modèle"""
-    if not model:
+    """Vérification de l'état de l'API et du modèle (détaillée : préférer /live et /ready pour les sondes)"""
+    version = registry.active
+    if version is None:
         raise HTTPException(status_code=503, detail="Modèle non initialisé")
     
-    if not model.is_loaded:
+    if not version.model.is_loaded:
         raise HTTPException(status_code=503, detail="Modèle non chargé")
     
-    model_info = model.get_model_info()
-    return {
+    # Informations précalculées à la mise en service ; seules les statistiques du cache changent
+    model = version.model
+    model_info = {**version.info, "prediction_cache": model.cache.get_stats() if model.cache else None}
+    response = {
         "status": "healthy",
         "model_info": model_info,
         "message": "API et modèle opérationnels"
     }
+    response["model_version"] = registry.get_status()
+    if batcher is not None:
+        response["batcher"] = batcher.get_stats()
+    if audit_log is not None:
+        response["audit"] = audit_log.get_stats()
+    if shadow_scorer is not None:
+        response["shadow"] = {"candidate": shadow_scorer.get_stats()["candidate"], "rows": shadow_scorer.rows}
+    if predict_admission.enabled:
+        response["admission"] = {"predict": predict_admission.get_stats(), "batch": batch_admission.get_stats()}
+    response["worker"] = {
+        "pid": os.getpid(),
+        "startup_seconds": round(startup_seconds, 4) if startup_seconds is not None else None,
+        "model_load_seconds": round(model.load_seconds, 4) if model.load_seconds is not None else None,
+        "memory": process_memory()
+    }
+    return response
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Métriques au format Prometheus (latence par étape et par route, cache, micro-batcher)"""
+    metrics = stage_latency.collect() + instrumentation.collect() + [bucket_levels_total, bucket_rows_total]
+    metrics += registry.collect() + admission.collect()
+    
+    if model is not None and model.cache is not None:
+        stats = model.cache.get_stats()
+        for key in ("hits", "misses", "evictions", "invalidations"):
+            counter = Counter(f"diabete_cache_{key}_total", f"Cache des prédictions : {key}")
+            counter.value = stats[key]
+            metrics.append(counter)
+        size = Gauge("diabete_cache_size", "Entrées dans le cache des prédictions")
+        size.set(stats["size"])
+        metrics.append(size)
+    
+    if batcher is not None:
+        metrics += [batcher.batch_size, batcher.queue_wait, batcher.rejected]
+    if audit_log is not None:
+        metrics += audit_log.collect()
+    if shadow_scorer is not None:
+        metrics += shadow_scorer.collect()
+    
+    return PlainTextResponse(render_prometheus(metrics), media_type="text/plain; version=0.0.4")
+
+def worker_stats_snapshot() -> Union[Dict[str, Any], None]:
+    """Instantané des statistiques de ce worker pour la version active"""
+    version = registry.active
+    if version is None:
+        return None
+    snapshot = version.model.stats.snapshot()
+    snapshot["model_version"] = version.version
+    snapshot["pid"] = os.getpid()
+    return snapshot
+
+@app.get("/stats")
+def feature_statistics(scope: str = Query("worker", pattern="^(worker|all)$",
+                                          description="all : fusion des workers (STATS_DIR)"),
+                       raw: bool = Query(False, description="Inclure les sommes brutes (fusionnables)")):
+    """
+    Statistiques en flux depuis la mise en service de la version active : taux de 'Yes'
+    par colonne, âges, P(diabète), niveaux de risque et classes prédites.
+    Avec STATS_REFERENCE_PATH, ajoute la dérive par rapport à la référence.
+    """
+    active_version()
+    snapshot = worker_stats_snapshot()
+    snapshots = [snapshot]
+    if scope == "all":
+        if not STATS_DIR:
+            raise HTTPException(status_code=400, detail="scope=all nécessite STATS_DIR")
+        stats_writer.write()
+        # Seuls les workers qui servent la même version sont fusionnés
+        snapshots = [other for other in read_snapshots(STATS_DIR)
+                     if other.get("model_version") == snapshot["model_version"]]
+    merged = merge_snapshots(snapshots)
+    merged.pop("pid", None)
+    
+    response = {"model_version": snapshot["model_version"], "workers": len(snapshots), **summarize(merged)}
+    if stats_reference is not None:
+        response["drift"] = drift_report(merged, stats_reference)
+    if raw:
+        response["raw"] = merged
+    return response
 
 @app.get("/santé")
 def sante_check():
@@ -138,6 +554,102 @@ def status_check():
     return health_check()
 
 
+class ModelReloadRequest(BaseModel):
+    """Demande de chargement d'une nouvelle version du modèle"""
+    path: Union[str, None] = Field(None, description="Fichier modèle (.pkl ou .forest), par défaut celui de la version active")
+
+
+def check_admin_token(request: Request):
+    """Les endpoints d'administration exigent MODEL_ADMIN_TOKEN dans l'en-tête X-Admin-Token"""
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Administration du modèle désactivée (MODEL_ADMIN_TOKEN non défini)")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), MODEL_ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Jeton d'administration invalide")
+
+@app.get("/model")
+def model_versions():
+    """Version active du modèle, versions disponibles pour rollback et chargement en cours"""
+    return registry.get_status()
+
+@app.post("/admin/model/reload", status_code=202)
+async def reload_model(request: Request, reload_request: Union[ModelReloadRequest, None] = None,
+                       wait: bool = Query(False, description="Attendre la mise en service (ou l'échec)")):
+    """
+    Charge une nouvelle version du modèle en arrière-plan, la préchauffe puis la met
+    en service. Les requêtes en cours se terminent avec la version qu'elles utilisent.
+    En cas d'échec, la version active reste en service (voir last_error sur /model).
+    """
+    check_admin_token(request)
+    path = reload_request.path if reload_request and reload_request.path else None
+    if path is None:
+        active = registry.active
+        path = active.path if active is not None else MODEL_PATH
+    if not os.path.exists(path):
+        raise HTTPException(status_code=400, detail=f"Le fichier {path} n'existe pas")
+    
+    try:
+        if wait:
+            version = await run_in_threadpool(registry.load, path)
+            return FastJSONResponse({"status": "active", "model_version": version.describe()}, status_code=200)
+        registry.load_in_background(path)
+    except ReloadInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Version refusée: {str(e)}")
+    return {"status": "loading", "path": path}
+
+@app.post("/admin/model/rollback")
+def rollback_model(request: Request):
+    """Remet en service la version précédente du modèle"""
+    check_admin_token(request)
+    try:
+        version = registry.rollback()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "active", "model_version": version.describe()}
+
+
+class ShadowRequest(BaseModel):
+    """Démarrage de l'évaluation fantôme d'un modèle candidat"""
+    path: str = Field(..., description="Fichier du modèle candidat (.pkl ou .forest)")
+    sample_rate: float = Field(SHADOW_SAMPLE_RATE, description="Fraction des appels réévalués", gt=0, le=1)
+
+@app.get("/shadow")
+def shadow_statistics():
+    """
+    Comparaison du modèle candidat au modèle servi sur le trafic échantillonné de ce
+    worker : accord des classes et des niveaux de risque, écarts de P(diabète),
+    latence du candidat et charge de l'évaluation fantôme
+    """
+    scorer = shadow_scorer
+    if scorer is None:
+        raise HTTPException(status_code=404, detail="Aucune évaluation fantôme en cours")
+    active = registry.active
+    return {"served_version": active.version if active else None, **scorer.get_stats()}
+
+@app.post("/admin/shadow")
+async def start_shadow_endpoint(request: Request, shadow_request: ShadowRequest):
+    """Charge un modèle candidat et démarre son évaluation fantôme (remplace la précédente)"""
+    check_admin_token(request)
+    if not os.path.exists(shadow_request.path):
+        raise HTTPException(status_code=400, detail=f"Le fichier {shadow_request.path} n'existe pas")
+    try:
+        scorer = await run_in_threadpool(start_shadow, shadow_request.path, shadow_request.sample_rate)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Candidat refusé: {str(e)}")
+    return {"status": "shadowing", "candidate": scorer.get_stats()["candidate"]}
+
+@app.delete("/admin/shadow")
+async def stop_shadow_endpoint(request: Request):
+    """Arrête l'évaluation fantôme ; retourne ses derniers résultats"""
+    check_admin_token(request)
+    scorer = shadow_scorer
+    if scorer is None:
+        raise HTTPException(status_code=404, detail="Aucune évaluation fantôme en cours")
+    await run_in_threadpool(stop_shadow)
+    return {"status": "stopped", **scorer.get_stats()}
+
+
 @app.get("/test")
 def test_endpoint():
     """Endpoint de test simple"""
@@ -154,36 +666,298 @@ def predict_options():
     return {"message": "OPTIONS OK"}
 
 @app.post("/predict")
-def predict_diabetes(patient_data: PatientData):
+async def predict_diabetes(patient_data: PatientData, request: Request,
+                           response_format: Union[str, None] = ResponseFormat):
     """
     Prédiction du risque de diabète pour un patient
     
     Args:
         patient_data: Données du patient au format JSON
+        response_format: "compact" (ou Accept: application/vnd.diabete.compact+json)
+            pour ne recevoir que la classe, P(diabète) et le code de risque ;
+            "bucket" pour la classe et le niveau de risque sans probabilités
         
     Returns:
         Résultat de la prédiction avec probabilités et niveau de risque
     """
-    if not model:
-        raise HTTPException(status_code=503, detail="Modèle non disponible")
+    version = active_version()
+    model = version.model
     
-    if not model.is_loaded:
-        raise HTTPException(status_code=503, detail="Modèle non chargé")
+    observe_parse(request)
+    compact = wants_compact(request, response_format)
     
     try:
         # Convertir les données Pydantic en dictionnaire
-        patient_dict = patient_data.dict()
+        patient_dict = patient_data.model_dump()
         
-        # Faire la prédiction avec votre classe
-        result = model.predict_from_json(patient_dict)
+        # Faire la prédiction avec votre classe (regroupée avec les requêtes
+        # concurrentes si le micro-batching est actif, sinon dans le threadpool)
+        async with predict_admission.admit():
+            if batcher is not None:
+                # Évalué par le modèle de la version lue au début de la requête (en-tête X-Model-Version)
+                result = await batcher.submit(patient_dict, model)
+                if response_format == "bucket":
+                    # Un patient seul : chemin par défaut, plus rapide que l'arrêt anticipé
+                    result = model.to_bucket(result)
+                elif compact:
+                    result = model.to_compact(result)
+            elif response_format == "bucket":
+                result = (await run_in_threadpool(model.predict_buckets_from_json, [patient_dict]))[0]
+            else:
+                result = await run_in_threadpool(model.predict_from_json, patient_dict, compact)
         
-        if not result.get("success", False):
+        if "error" in result:
             raise HTTPException(
                 status_code=400, 
                 detail=f"Erreur de prédiction: {result.get('error', 'Erreur inconnue')}"
             )
         
-        return result
+        if not compact:
+            result["model_version"] = version.version
+        return timed_json_response(result, version)
+        
+    except HTTPException:
+        # Patient invalide (400) : ne pas le transformer en erreur interne
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=f"Service surchargé: {str(e)}")
+    except OverloadedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+
+@app.post("/predict/batch")
+async def predict_diabetes_batch(batch_data: BatchPatientData, request: Request,
+                           response_format: Union[str, None] = ResponseFormat):
+    """
+    Prédiction du risque de diabète pour un lot de patients
+    
+    Args:
+        batch_data: Liste des patients au format JSON
+        response_format: "compact" pour des résultats compacts (sans champ index :
+            l'ordre des résultats est celui des patients), "bucket" pour la classe
+            et le niveau de risque seulement
         
+    Returns:
+        Un résultat par patient (dans l'ordre d'entrée) et le décompte des erreurs
+    """
+    version = active_version()
+    model = version.model
+    
+    observe_parse(request)
+    bucket = response_format == "bucket"
+    compact = wants_compact(request, response_format)
+    
+    try:
+        async with batch_admission.admit():
+            if bucket:
+                results = await run_in_threadpool(model.predict_buckets_from_json, batch_data.patients)
+            else:
+                results = await run_in_threadpool(model.predict_batch_from_json, batch_data.patients, compact)
+    except OverloadedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+    
+    if not (compact or bucket):
+        for index, result in enumerate(results):
+            result["index"] = index
+    
+    n_success = sum(1 for result in results if "error" not in result)
+    return timed_json_response({
+        "success": True,
+        "count": len(results),
+        "n_success": n_success,
+        "n_errors": len(results) - n_success,
+        "model_version": version.version,
+        "results": results
+    }, version)
+
+@app.post("/predict/whatif")
+async def predict_what_if(patient_data: PatientData, request: Request):
+    """
+    Scénarios d'un patient en une requête et un seul appel au modèle
+
+    Returns:
+        Résultat de /predict, plus age_curve (P(diabète) et code de risque pour chaque âge
+        de 0 à 120, autres variables inchangées) et flips (effet de l'inversion de chaque
+        variable binaire : nouvelle valeur, P(diabète), écart, niveau de risque)
+    """
+    version = active_version()
+    model = version.model
+
+    observe_parse(request)
+    try:
+        async with predict_admission.admit():
+            result = await run_in_threadpool(model.what_if_from_json, patient_data.model_dump())
+    except OverloadedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=f"Erreur de prédiction: {result['error']}")
+
+    result["model_version"] = version.version
+    return timed_json_response(result, version)
+
+def require_explanations(model):
+    """Les explications demandent la forêt aplatie ; sinon 503 plutôt qu'une erreur interne"""
+    if model.flat_forest is None:
+        raise HTTPException(status_code=503,
+                            detail="Explications indisponibles : la forêt n'a pas pu être aplatie")
+
+@app.post("/explain")
+async def explain_diabetes(patient_data: PatientData, request: Request):
+    """
+    Prédiction d'un patient avec la contribution de chaque symptôme au score
+
+    Returns:
+        Résultat complet de /predict et explanation : base_value (P(diabète) moyenne
+        de la forêt) et contributions par feature, triées par importance ;
+        base_value + somme des contributions = P(diabète)
+    """
+    version = active_version()
+    model = version.model
+    require_explanations(model)
+
+    observe_parse(request)
+    try:
+        async with predict_admission.admit():
+            result = (await run_in_threadpool(model.explain_from_json, [patient_data.model_dump()]))[0]
+    except OverloadedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=f"Erreur de prédiction: {result['error']}")
+
+    result["model_version"] = version.version
+    return timed_json_response(result, version)
+
+@app.post("/explain/batch")
+async def explain_diabetes_batch(batch_data: BatchPatientData, request: Request):
+    """
+    Explications d'un lot de patients (voir /explain), un résultat par patient
+    dans l'ordre d'entrée ; une ligne invalide ne fait pas échouer le lot
+    """
+    version = active_version()
+    model = version.model
+    require_explanations(model)
+
+    observe_parse(request)
+    try:
+        async with batch_admission.admit():
+            results = await run_in_threadpool(model.explain_from_json, batch_data.patients)
+    except OverloadedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+
+    for index, result in enumerate(results):
+        result["index"] = index
+
+    n_success = sum(1 for result in results if "error" not in result)
+    return timed_json_response({
+        "success": True,
+        "count": len(results),
+        "n_success": n_success,
+        "n_errors": len(results) - n_success,
+        "model_version": version.version,
+        "results": results
+    }, version)
+
+async def read_limited_body(request: Request, max_bytes: int) -> bytes:
+    """
+    Lit le corps de la requête sans jamais dépasser max_bytes en mémoire : refus (413)
+    d'après Content-Length avant toute lecture, puis au fil des morceaux reçus (corps
+    chunked ou Content-Length absent).
+    """
+    detail = f"Corps trop volumineux (maximum {max_bytes} octets)"
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=detail)
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail=detail)
+    return bytes(body)
+
+@app.post("/predict/binary")
+async def predict_diabetes_binary(request: Request):
+    """
+    Prédiction à partir d'enregistrements binaires de 3 octets par patient
+    
+    Corps : âge (uint8) puis masque little-endian (uint16) des 15 colonnes binaires,
+    bit i pour la colonne feature_columns[1 + i] (voir wire_format.py). Les
+    enregistrements sont décodés directement en matrice, sans pydantic ni validation
+    champ par champ.
+    
+    Returns:
+        JSON en colonnes (prediction, p_diabetes, risk), ou 6 octets par patient si
+        Accept: application/octet-stream
+    """
+    version = active_version()
+    model = version.model
+    
+    body = await read_limited_body(request, RECORD_SIZE * MAX_BINARY_RECORDS)
+    try:
+        keys = decode_records(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(keys) == 0 or len(keys) > MAX_BINARY_RECORDS:
+        raise HTTPException(status_code=400,
+                            detail=f"Le corps doit contenir entre 1 et {MAX_BINARY_RECORDS} enregistrements")
+    observe_parse(request)
+    
+    try:
+        async with batch_admission.admit():
+            predictions, probabilities = await run_in_threadpool(model.predict_packed, keys)
+    except OverloadedError:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+    
+    if BINARY_MEDIA_TYPE in request.headers.get("accept", ""):
+        start = time.perf_counter()
+        response = Response(encode_results(predictions, probabilities), media_type=BINARY_MEDIA_TYPE,
+                            headers=version_headers(version))
+        SERIALIZE_LATENCY.observe(time.perf_counter() - start)
+        return response
+    
+    return timed_json_response({"count": len(keys), "model_version": version.version,
+                                **results_to_columns(predictions, probabilities)}, version)
+
+@app.post("/predict/stream")
+async def predict_diabetes_stream(request: Request, response_format: Union[str, None] = ResponseFormat):
+    """
+    Prédiction en flux pour de gros fichiers de patients
+    
+    Le corps (NDJSON, ou CSV avec en-tête si Content-Type: text/csv) est lu au fil de
+    l'eau et évalué par paquets de STREAM_CHUNK_SIZE patients. Les résultats sont
+    renvoyés en NDJSON (un par patient, champ `index`) suivis d'une ligne de synthèse.
+    Les formats compact et bucket s'appliquent à chaque ligne.
+    """
+    version = active_version()
+    model = version.model
+    
+    if "csv" in request.headers.get("content-type", ""):
+        records = iter_csv_records(request.stream(), STREAM_MAX_LINE_BYTES)
+    else:
+        records = iter_ndjson_records(request.stream(), STREAM_MAX_LINE_BYTES)
+    
+    bucket = response_format == "bucket"
+    compact = wants_compact(request, response_format)
+    
+    def predict_batch(chunk):
+        if bucket:
+            return model.predict_buckets_from_json(chunk)
+        return model.predict_batch_from_json(chunk, compact)
+    
+    return DuplexStreamingResponse(
+        stream_predictions(records, predict_batch, STREAM_CHUNK_SIZE, compact or bucket),
+        media_type="application/x-ndjson",
+        headers=version_headers(version)
+    )
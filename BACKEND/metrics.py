@@ -0,0 +1,204 @@
+
+import sys
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seuils des histogrammes de latence (s), de 10 µs à 1 s
+LATENCY_BUCKETS = [10e-6, 25e-6, 50e-6, 100e-6, 250e-6, 500e-6,
+                   1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3, 250e-3, 1.0]
+
+
+class Counter:
+    """
+    Compteur monotone, utilisable depuis plusieurs threads.
+    """
+
+    def __init__(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None):
+
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Histogram:
+    """
+    Histogramme à seuils fixes (bornes supérieures inclusives, comme Prometheus).
+    Mémoire constante quel que soit le nombre d'observations.
+    """
+
+    def __init__(self, name: str, buckets: Sequence[float], description: str = "",
+                 labels: Optional[Dict[str, str]] = None):
+
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.buckets: List[float] = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # dernière case : +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Comptes cumulés par seuil, total et moyenne"""
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+
+        # Les bornes sont des chaînes au format Prometheus ("+Inf" n'est pas du JSON valide en flottant)
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets + ["+Inf"], counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "buckets": cumulative,
+        }
+
+
+class Gauge:
+    """
+    Valeur instantanée (taille de cache, file d'attente...).
+    """
+
+    def __init__(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None):
+
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Family:
+    """
+    Métriques de même nom distinguées par leurs labels, créées à la première utilisation
+    (ex. latence par étape, par route). Les valeurs des labels doivent rester en nombre borné.
+    """
+
+    def __init__(self, metric_class, name: str, label_names: Sequence[str], description: str = "", **kwargs):
+
+        self.metric_class = metric_class
+        self.name = name
+        self.label_names = tuple(label_names)
+        self.description = description
+        self._kwargs = kwargs
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Métrique correspondant aux valeurs de labels données (dans l'ordre de label_names)"""
+        metric = self._children.get(values)
+        if metric is None:
+            with self._lock:
+                metric = self._children.get(values)
+                if metric is None:
+                    metric = self.metric_class(name=self.name, description=self.description,
+                                               labels=dict(zip(self.label_names, values)), **self._kwargs)
+                    self._children[values] = metric
+        return metric
+
+    def collect(self) -> List[Any]:
+        return list(self._children.values())
+
+
+# Latence de chaque étape d'une prédiction (voir ModelDiabetes et main.py)
+stage_latency = Family(
+    Histogram, "diabete_stage_seconds", ["stage"],
+    "Durée de chaque étape d'une prédiction (parse, validate, preprocess, forest, serialize)",
+    buckets=LATENCY_BUCKETS,
+)
+
+# Mode tranche (évaluation anticipée) : niveaux d'arbres descendus / patients, moyenne = rapport des deux
+bucket_levels_total = Counter("diabete_bucket_levels_total", "Niveaux d'arbres descendus en mode tranche")
+bucket_rows_total = Counter("diabete_bucket_rows_total", "Patients évalués en mode tranche")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_prometheus(metrics: Iterable[Any]) -> str:
+    """
+    Format texte d'exposition Prometheus (version 0.0.4) d'une liste de Counter,
+    Gauge et Histogram. Les métriques de même nom sont regroupées sous un seul HELP/TYPE.
+    """
+    by_name: Dict[str, List[Any]] = {}
+    for metric in metrics:
+        by_name.setdefault(metric.name, []).append(metric)
+
+    types = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}
+    lines = []
+    for name, group in by_name.items():
+        lines.append(f"# HELP {name} {group[0].description}")
+        lines.append(f"# TYPE {name} {types[type(group[0])]}")
+        for metric in group:
+            if isinstance(metric, Histogram):
+                snapshot = metric.snapshot()
+                for bound, count in snapshot["buckets"].items():
+                    lines.append(f"{name}_bucket{_format_labels({**metric.labels, 'le': bound})} {count}")
+                lines.append(f"{name}_sum{_format_labels(metric.labels)} {snapshot['sum']}")
+                lines.append(f"{name}_count{_format_labels(metric.labels)} {snapshot['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(metric.labels)} {metric.snapshot()}")
+    return "\n".join(lines) + "\n"
+
+
+def process_memory() -> Dict[str, int]:
+    """
+    Mémoire du processus courant en Ko. Sous Linux, /proc/self/smaps_rollup distingue
+    la mémoire partagée entre workers (Shared_*) de la mémoire propre (Private_*) ;
+    Pss répartit les pages partagées entre les processus qui les utilisent.
+    Ailleurs, seul le pic de RSS est disponible.
+    """
+    fields = {"Rss": "rss_kb", "Pss": "pss_kb", "Shared_Clean": "shared_kb",
+              "Shared_Dirty": "shared_kb", "Private_Clean": "private_kb", "Private_Dirty": "private_kb"}
+    try:
+        memory = {"rss_kb": 0, "pss_kb": 0, "shared_kb": 0, "private_kb": 0}
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    memory[fields[name]] += int(value.split()[0])
+        return memory
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import resource
+        # ru_maxrss est en Ko sous Linux, en octets sous macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"max_rss_kb": max_rss // 1024 if sys.platform == "darwin" else max_rss}
+    except ImportError:
+        return {}
@@ -1,9 +1,67 @@
 
-import joblib
-import pandas as pd
+import bisect
 import numpy as np
-from typing import Dict, Union, List, Any
+from typing import TYPE_CHECKING, Dict, Union, List, Any, Tuple
 import os
+import shutil
+import time
+import warnings
+from contextlib import contextmanager
+
+from artifact import is_artifact, load_artifact, read_header
+from cache import PredictionCache
+from encoder import FeatureEncoder
+from feature_stats import FeatureStatistics
+from forest import FlatForest
+from lookup_table import MAX_AGE, RISK_THRESHOLDS, ProbabilityTable, default_table_path, file_sha256, pack_keys, unpack_keys
+from metrics import bucket_levels_total, bucket_rows_total, stage_latency
+
+# pandas et joblib (qui charge scikit-learn) ne sont importés qu'à l'usage :
+# le service à partir d'un artefact (artifact.py) n'en a pas besoin.
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Le modèle a été entraîné sur un DataFrame : on lui passe désormais des tableaux NumPy
+# déjà ordonnés selon feature_columns, l'avertissement sur les noms de colonnes est donc inutile.
+warnings.filterwarnings("ignore", message="X does not have valid feature names", category=UserWarning)
+
+# Niveaux de risque ; le code compact d'un niveau est sa position dans ce tuple
+RISK_LEVELS = ("Faible", "Modéré", "Élevé", "Très élevé")
+# Seuils de P(diabète) où la classe (0.5) ou le niveau de risque changent (mode tranche)
+BUCKET_BOUNDARIES = tuple(sorted(RISK_THRESHOLDS + (0.5,)))
+
+# Histogrammes de latence des étapes exécutées par le modèle (exposés sur /metrics)
+_VALIDATE_LATENCY = stage_latency.labels("validate")
+_PREPROCESS_LATENCY = stage_latency.labels("preprocess")
+_FOREST_LATENCY = stage_latency.labels("forest")
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """
+    Verrou exclusif entre processus (fcntl.flock). Sans fcntl (Windows), pas de verrou :
+    l'export reste correct car il est écrit dans un dossier temporaire puis renommé.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def describe_model(model) -> Dict[str, Any]:
+    """Paramètres du modèle scikit-learn exposés par get_model_info"""
+    params = {"model_type": type(model).__name__}
+    for name in ("n_estimators", "max_depth", "random_state"):
+        if hasattr(model, name):
+            params[name] = getattr(model, name)
+    return params
 
 
 class ModelDiabetes:
@@ -12,11 +70,25 @@ class ModelDiabetes:
     Conçue pour être utilisée dans une API FastAPI.
     """
     
-    def __init__(self, model_path: str = "Model_diabetes_RF.pkl"):
+    def __init__(self, model_path: str = "Model_diabetes_RF.pkl", cache_size: int = 0):
 
         self.model_path = model_path
         self.model = None
         self.is_loaded = False
+        # Cache LRU des prédictions (désactivé si cache_size vaut 0)
+        self.cache = PredictionCache(cache_size) if cache_size > 0 else None
+        # Forêt aplatie évaluée sans scikit-learn (construite au chargement)
+        self.flat_forest = None
+        # Table de probabilités précalculée (mode de service optionnel)
+        self.lookup_table = None
+        # Paramètres du modèle (lus sur le modèle scikit-learn ou dans l'export partagé)
+        self.model_params = {}
+        # Durée du dernier chargement (s)
+        self.load_seconds = None
+        # Empreinte du modèle pickle d'origine, lue dans l'artefact (sinon calculée à la demande)
+        self._source_sha256 = None
+        # Forêt ouverte depuis l'export partagé entre workers (load_shared_model)
+        self.is_shared = False
         
 
         self.feature_columns = [
@@ -45,20 +117,179 @@ class ModelDiabetes:
             'obesity': {'No': 0, 'Yes': 1}
         }
         
+        # Encodeur précompilé utilisé sur le chemin des requêtes (sans pandas)
+        self.encoder = FeatureEncoder(self.feature_columns, self.encodings)
+        
+        # Statistiques en flux des patients évalués et des prédictions (voir feature_stats.py)
+        self.stats = FeatureStatistics(self.feature_columns, RISK_LEVELS)
+        # Journal d'audit des prédictions (AuditLog, voir audit.py), branché par le service
+        self.audit_log = None
+        # Évaluation fantôme d'un modèle candidat (ShadowScorer, voir shadow.py), branchée par le service
+        self.shadow = None
+        
     def load_model(self):
 
         try:
             if os.path.exists(self.model_path):
-                self.model = joblib.load(self.model_path)
+                start = time.perf_counter()
+                if is_artifact(self.model_path):
+                    self._load_artifact()
+                else:
+                    import joblib
+                    self.model = joblib.load(self.model_path)
+                    self.model_params = describe_model(self.model)
+                    self._source_sha256 = None
+                    self.load_flat_forest()
+                self.prepare_explanations()
                 self.is_loaded = True
+                self.is_shared = False
+                if self.cache is not None:
+                    self.cache.clear()
                 print(f"✅ Modèle chargé depuis: {self.model_path}")
+                self.load_seconds = time.perf_counter() - start
             else:
                 raise FileNotFoundError(f"Le fichier {self.model_path} n'existe pas")
         except Exception as e:
             print(f"❌ Erreur lors du chargement du modèle: {e}")
             raise e
     
-    def encode_categorical_features(self, data: pd.DataFrame) -> pd.DataFrame:
+    def _load_artifact(self):
+        """
+        Charge un artefact natif (artifact.py) : forêt en memory-map, sans scikit-learn.
+        Le schéma de l'artefact doit correspondre aux colonnes et encodages de la classe.
+        """
+        forest, header = load_artifact(self.model_path)
+        self._check_artifact_schema(header)
+        
+        self.model = None
+        self.flat_forest = forest
+        self.model_params = header.get("model_params", {})
+        self._source_sha256 = header["source_sha256"]
+    
+    def _check_artifact_schema(self, header: Dict[str, Any]):
+        """Le schéma d'un artefact doit correspondre aux colonnes et encodages de la classe"""
+        if header["feature_columns"] != self.feature_columns or header["categorical_encodings"] != self.encodings:
+            raise ValueError(f"Le schéma de {self.model_path} ne correspond pas aux colonnes attendues")
+    
+    def model_sha256(self) -> str:
+        """Empreinte SHA-256 du modèle pickle d'origine (table précalculée, artefact)"""
+        if self._source_sha256 is None:
+            self._source_sha256 = file_sha256(self.model_path)
+        return self._source_sha256
+    
+    def export_shared_model(self, shared_dir: str) -> bool:
+        """
+        Exporte la forêt aplatie dans shared_dir (un .npy par tableau) si l'export est
+        absent ou construit avec un autre modèle. Le fichier modèle peut être un pickle
+        scikit-learn ou un artefact natif (artifact.py). Un seul processus exporte à la
+        fois (verrou fichier) ; l'export est écrit à part puis renommé.
+        
+        Returns:
+            bool: True si un nouvel export a été écrit
+        """
+        # Artefact : empreinte du pickle d'origine lue dans l'en-tête, comme model_sha256()
+        artifact = is_artifact(self.model_path)
+        model_sha256 = read_header(self.model_path)["source_sha256"] if artifact else file_sha256(self.model_path)
+        
+        with _file_lock(shared_dir.rstrip(os.sep) + ".lock"):
+            metadata = FlatForest.read_metadata(shared_dir)
+            if metadata is not None and metadata.get("source_sha256") == model_sha256:
+                return False
+            
+            if artifact:
+                forest, header = load_artifact(self.model_path)
+                self._check_artifact_schema(header)
+                model_params = header.get("model_params", {})
+            else:
+                import joblib
+                model = joblib.load(self.model_path)
+                forest = FlatForest.from_sklearn(model)
+                model_params = describe_model(model)
+            
+            tmp_dir = f"{shared_dir.rstrip(os.sep)}.tmp-{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            forest.save(tmp_dir, metadata={
+                "source": os.path.basename(self.model_path),
+                "source_sha256": model_sha256,
+                "model_params": model_params,
+            })
+            
+            # Les workers qui ont déjà ouvert l'ancien export gardent leurs mappings valides
+            old_dir = None
+            if os.path.exists(shared_dir):
+                old_dir = f"{shared_dir.rstrip(os.sep)}.old-{os.getpid()}"
+                os.replace(shared_dir, old_dir)
+            os.replace(tmp_dir, shared_dir)
+            if old_dir:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        
+        print(f"✅ Forêt exportée pour les workers dans: {shared_dir}")
+        return True
+    
+    def load_shared_model(self, shared_dir: str):
+        """
+        Mode multi-workers : ouvre en memory-map la forêt exportée dans shared_dir
+        (de préférence sur /dev/shm). Les tableaux sont partagés par tous les workers
+        via le cache de pages, au lieu d'une copie du modèle scikit-learn par worker.
+        Le modèle scikit-learn n'est pas chargé (self.model reste None).
+        """
+        start = time.perf_counter()
+        try:
+            self.export_shared_model(shared_dir)
+            self.flat_forest = FlatForest.load(shared_dir, mmap_mode="r")
+            metadata = FlatForest.read_metadata(shared_dir)
+            self.model_params = metadata.get("model_params", {})
+            self._source_sha256 = metadata.get("source_sha256")
+            self.model = None
+            self.prepare_explanations()
+            self.is_loaded = True
+            self.is_shared = True
+            if self.cache is not None:
+                self.cache.clear()
+            self.load_seconds = time.perf_counter() - start
+            print(f"✅ Forêt partagée ouverte depuis: {shared_dir} ({self.load_seconds * 1000:.1f} ms)")
+        except Exception as e:
+            print(f"❌ Erreur lors du chargement du modèle partagé: {e}")
+            raise e
+    
+    def load_flat_forest(self):
+        """
+        Aplatit la forêt chargée en tableaux contigus (voir forest.py) pour l'évaluer
+        sans scikit-learn. Les modèles non supportés restent évalués par scikit-learn.
+        """
+        try:
+            self.flat_forest = FlatForest.from_sklearn(self.model)
+        except ValueError as e:
+            self.flat_forest = None
+            print(f"⚠️ Forêt non aplatie, évaluation par scikit-learn: {e}")
+    
+    def prepare_explanations(self):
+        """
+        Précalcule les contributions des features le long des chemins de la forêt
+        (voir FlatForest.predict_contributions) pour que explain_from_json coûte
+        à peu près une évaluation de la forêt.
+        """
+        if self.flat_forest is not None:
+            self.flat_forest.prepare_contributions(len(self.feature_columns))
+    
+    def load_lookup_table(self, table_path: str = None):
+        """
+        Active le service par table précalculée (voir lookup_table.py).
+        La table est ouverte en memory-map et doit avoir été construite avec ce modèle.
+        
+        Args:
+            table_path (str): Chemin de la table, par défaut à côté du modèle
+        """
+        table_path = table_path or default_table_path(self.model_path)
+        table = ProbabilityTable(table_path)
+        
+        if table.model_sha256 != self.model_sha256():
+            raise ValueError(f"La table {table_path} n'a pas été construite avec {self.model_path}")
+        
+        self.lookup_table = table
+        print(f"✅ Table de probabilités chargée depuis: {table_path}")
+    
+    def encode_categorical_features(self, data: 'pd.DataFrame') -> 'pd.DataFrame':
 
         data_encoded = data.copy()
         
@@ -71,32 +302,18 @@ class ModelDiabetes:
         
         return data_encoded
     
-    def preprocess_input(self, input_data: Union[Dict, List[Dict], pd.DataFrame]) -> pd.DataFrame:
- 
-        # Convertir en DataFrame 
-        if isinstance(input_data, dict):
-            df = pd.DataFrame([input_data])
-        elif isinstance(input_data, list):
-            df = pd.DataFrame(input_data)
-        elif isinstance(input_data, pd.DataFrame):
-            df = input_data.copy()
-        else:
-            raise ValueError("Les données doivent être un dict, une liste de dict ou un DataFrame")
-        
-        # Vérifier les colonnes requises
-        missing_columns = set(self.feature_columns) - set(df.columns)
-        if missing_columns:
-            raise ValueError(f"Colonnes manquantes: {missing_columns}")
-        
-        # Sélectionner uniquement les colonnes nécessaires dans le bon ordre
-        df = df[self.feature_columns]
-        
-        # Encoder les variables catégorielles
-        df_encoded = self.encode_categorical_features(df)
-        
-        return df_encoded
+    def preprocess_input(self, input_data: Union[Dict, List[Dict], 'pd.DataFrame']) -> np.ndarray:
+        """
+        Encode les données d'entrée en matrice float32 dans l'ordre de feature_columns.
+        Les dicts passent par l'encodeur précompilé, les DataFrame restent acceptés
+        pour l'usage hors ligne.
+        """
+        start = time.perf_counter()
+        features = self.encoder.encode(input_data)
+        _PREPROCESS_LATENCY.observe(time.perf_counter() - start)
+        return features
     
-    def predict(self, input_data: Union[Dict, List[Dict], pd.DataFrame]) -> List[int]:
+    def predict(self, input_data: Union[Dict, List[Dict], 'pd.DataFrame']) -> List[int]:
 
         if not self.is_loaded:
             raise ValueError("Le modèle n'est pas chargé. Utilisez load_model() d'abord.")
@@ -105,11 +322,11 @@ class ModelDiabetes:
         processed_data = self.preprocess_input(input_data)
         
         # Faire la prédiction
-        predictions = self.model.predict(processed_data)
+        predictions, _ = self._infer(processed_data)
         
         return predictions.tolist()
     
-    def predict_proba(self, input_data: Union[Dict, List[Dict], pd.DataFrame]) -> List[List[float]]:
+    def predict_proba(self, input_data: Union[Dict, List[Dict], 'pd.DataFrame']) -> List[List[float]]:
 
         if not self.is_loaded:
             raise ValueError("Le modèle n'est pas chargé. Utilisez load_model() d'abord.")
@@ -118,10 +335,73 @@ class ModelDiabetes:
         processed_data = self.preprocess_input(input_data)
         
         # Calculer les probabilités
-        probabilities = self.model.predict_proba(processed_data)
+        _, probabilities = self._infer(processed_data)
         
         return probabilities.tolist()
     
+    def predict_with_proba(self, input_data: Union[Dict, List[Dict], 'pd.DataFrame']) -> Tuple[List[int], List[List[float]]]:
+        """
+        Calcule les classes et les probabilités en un seul passage : les données sont
+        prétraitées une fois et la forêt n'est parcourue qu'une fois.
+        
+        Args:
+            input_data: Données du ou des patients
+            
+        Returns:
+            Tuple[List[int], List[List[float]]]: Classes prédites et probabilités
+        """
+        if not self.is_loaded:
+            raise ValueError("Le modèle n'est pas chargé. Utilisez load_model() d'abord.")
+        
+        predictions, probabilities = self._infer(self.preprocess_input(input_data))
+        
+        return predictions.tolist(), probabilities.tolist()
+    
+    def _infer(self, features) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Parcourt la forêt une seule fois (forêt aplatie si disponible, résultats
+        identiques à scikit-learn) et déduit la classe des probabilités,
+        exactement comme RandomForestClassifier.predict.
+        Si une table précalculée est chargée, une simple lecture la remplace.
+        """
+        predictions, probabilities = self._evaluate(features)
+        self._observe(features, predictions, probabilities[:, 1])
+        return predictions, probabilities
+    
+    def _evaluate(self, features) -> Tuple[np.ndarray, np.ndarray]:
+        """Évaluation seule (table, forêt aplatie ou scikit-learn), sans statistiques"""
+        start = time.perf_counter()
+        
+        if self.lookup_table is not None and self.lookup_table.covers(features):
+            predictions, probabilities = self.lookup_table.lookup(features)
+        else:
+            if self.flat_forest is not None:
+                probabilities = self.flat_forest.predict_proba(features)
+                classes = self.flat_forest.classes_
+            else:
+                probabilities = self.model.predict_proba(features)
+                classes = self.model.classes_
+            predictions = classes.take(np.argmax(probabilities, axis=1))
+        
+        _FOREST_LATENCY.observe(time.perf_counter() - start)
+        return predictions, probabilities
+    
+    def _observe(self, features: np.ndarray, predictions: np.ndarray, p_diabetes: np.ndarray = None,
+                 risk: np.ndarray = None, keys: np.ndarray = None):
+        """
+        Compte les patients évalués dans les statistiques et, s'ils sont branchés, les
+        transmet au journal d'audit et à l'évaluation fantôme (copies en mémoire,
+        traitement en arrière-plan).
+        """
+        if risk is None:
+            risk = np.searchsorted(RISK_THRESHOLDS, p_diabetes, side="right")
+        self.stats.observe(features, predictions, p_diabetes, risk)
+        if self.audit_log is not None:
+            self.audit_log.record(self.model_sha256(), pack_keys(features) if keys is None else keys,
+                                  predictions, p_diabetes, risk)
+        if self.shadow is not None:
+            self.shadow.submit(features, predictions, p_diabetes, risk)
+    
     def validate_json_input(self, json_data: Dict) -> Dict[str, Any]:
 
         validated_data = {}
@@ -171,13 +451,14 @@ class ModelDiabetes:
         
         return validated_data
     
-    def predict_from_json(self, json_data: Dict) -> Dict[str, Any]:
+    def predict_from_json(self, json_data: Dict, compact: bool = False) -> Dict[str, Any]:
         """
         Fait une prédiction à partir de données JSON du frontend.
         Méthode optimisée pour les APIs avec validation complète.
         
         Args:
             json_data (Dict): Données JSON du patient
+            compact (bool): Réponse compacte (classe, P(diabète), code de risque)
             
         Returns:
             Dict[str, Any]: Résultat de la prédiction avec probabilités et métadonnées
@@ -187,35 +468,402 @@ class ModelDiabetes:
         
         try:
             # Valider et nettoyer les données d'entrée
+            start = time.perf_counter()
             validated_data = self.validate_json_input(json_data)
+            _VALIDATE_LATENCY.observe(time.perf_counter() - start)
             
-            # Faire la prédiction
-            prediction = self.predict(validated_data)[0]
-            probabilities = self.predict_proba(validated_data)[0]
+            # Faire la prédiction (un seul prétraitement, un seul parcours de la forêt)
+            prediction, probabilities = self._predict_validated([validated_data])[0]
             
             # Préparer la réponse
-            result = {
-                "success": True,
-                "patient_id": validated_data.get('id', 'N/A'),
-                "prediction": int(prediction),
-                "prediction_label": "Diabète détecté" if prediction == 1 else "Pas de diabète détecté",
-                "probabilities": {
-                    "no_diabetes": round(probabilities[0], 4),
-                    "diabetes": round(probabilities[1], 4)
-                },
-                "confidence": round(max(probabilities), 4),
-                "risk_level": self._get_risk_level(probabilities[1]),
-                "input_data": validated_data
-            }
+            if compact:
+                return self._build_compact_result(prediction, probabilities)
+            return self._build_result(validated_data, prediction, probabilities)
             
+        except Exception as e:
+            return self._build_error(e, compact)
+    
+    def encode_batch(self, validated_rows: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Encode un lot de patients déjà validés en une matrice NumPy, colonne par colonne,
+        dans l'ordre de feature_columns.
+        
+        Args:
+            validated_rows (List[Dict]): Patients validés par validate_json_input
+            
+        Returns:
+            np.ndarray: Matrice (n_patients, n_features) prête pour le modèle
+        """
+        start = time.perf_counter()
+        features = self.encoder.encode_records(validated_rows)
+        _PREPROCESS_LATENCY.observe(time.perf_counter() - start)
+        return features
+    
+    def predict_batch_from_json(self, records: List[Dict], compact: bool = False) -> List[Dict[str, Any]]:
+        """
+        Fait les prédictions d'un lot de patients avec un seul appel au modèle.
+        Une ligne invalide produit un résultat en erreur sans faire échouer le lot.
+        
+        Args:
+            records (List[Dict]): Données JSON des patients
+            compact (bool): Résultats compacts (voir predict_from_json)
+            
+        Returns:
+            List[Dict[str, Any]]: Un résultat par patient, dans l'ordre d'entrée
+        """
+        if not self.is_loaded:
+            raise ValueError("Le modèle n'est pas chargé. Utilisez load_model() d'abord.")
+        
+        results: List[Dict[str, Any]] = [None] * len(records)
+        valid_rows = []
+        valid_indices = []
+        
+        # Valider chaque patient séparément pour isoler les erreurs
+        start = time.perf_counter()
+        for index, record in enumerate(records):
+            try:
+                valid_rows.append(self.validate_json_input(record))
+                valid_indices.append(index)
+            except Exception as e:
+                results[index] = self._build_error(e, compact)
+        _VALIDATE_LATENCY.observe(time.perf_counter() - start)
+        
+        if valid_rows:
+            # Un seul appel au modèle pour toutes les lignes valides
+            outputs = self._predict_validated(valid_rows)
+            
+            for index, validated_data, (prediction, row_probabilities) in zip(
+                valid_indices, valid_rows, outputs
+            ):
+                if compact:
+                    results[index] = self._build_compact_result(prediction, row_probabilities)
+                else:
+                    results[index] = self._build_result(validated_data, prediction, row_probabilities)
+        
+        return results
+    
+    def predict_packed(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Prédit des patients déjà encodés en clés compactes (age << 15 | masque, voir
+        wire_format.py) : les clés sont décodées directement en matrice, sans
+        validation champ par champ ni dict intermédiaire.
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Classes et probabilités
+        """
+        if not self.is_loaded:
+            raise ValueError("Le modèle n'est pas chargé. Utilisez load_model() d'abord.")
+        
+        start = time.perf_counter()
+        features = unpack_keys(keys)
+        _PREPROCESS_LATENCY.observe(time.perf_counter() - start)
+        
+        return self._infer(features)
+    
+    def predict_buckets(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Mode tranche : calcule seulement la classe et le code de risque, en arrêtant
+        la descente des arbres dès que la tranche ne peut plus changer (voir
+        FlatForest.predict_buckets). Résultats identiques à l'évaluation complète.
+        Si la table précalculée couvre le lot, une lecture remplace la descente.
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Classes, codes de risque et
+            nombre de niveaux d'arbres descendus par patient (lecture de table ou
+            évaluation complète par scikit-learn : voir _full_depth)
+        """
+        start = time.perf_counter()
+        
+        if self.lookup_table is not None and self.lookup_table.covers(features):
+            codes = self._bucketize(self.lookup_table.lookup(features)[1])
+            depth_used = np.full(len(features), self._full_depth())
+        elif self.flat_forest is not None:
+            codes, depth_used = self.flat_forest.predict_buckets(features, BUCKET_BOUNDARIES, self._bucketize)
+            # Profondeur moyenne exposée sur /metrics : seulement les descentes anticipées
+            bucket_rows_total.inc(len(features))
+            bucket_levels_total.inc(int(depth_used.sum()))
+        else:
+            codes = self._bucketize(self.model.predict_proba(features))
+            depth_used = np.full(len(features), self._full_depth())
+        
+        _FOREST_LATENCY.observe(time.perf_counter() - start)
+        predictions, risk = codes // len(RISK_LEVELS), codes % len(RISK_LEVELS)
+        self._observe(features, predictions, risk=risk)
+        return predictions, risk, depth_used
+    
+    def _full_depth(self) -> int:
+        """Profondeur d'une évaluation complète : max_depth de la forêt, 0 s'il n'est pas borné"""
+        if self.flat_forest is not None:
+            return self.flat_forest.max_depth
+        return self.model_params.get("max_depth") or 0
+    
+    def _bucketize(self, probabilities: np.ndarray) -> np.ndarray:
+        """Classe et code de risque réunis en un code : classe * 4 + risque"""
+        classes = self.flat_forest.classes_ if self.flat_forest is not None else self.model.classes_
+        predictions = classes.take(np.argmax(probabilities, axis=1))
+        risk = np.searchsorted(RISK_THRESHOLDS, probabilities[:, 1], side="right")
+        return predictions * len(RISK_LEVELS) + risk
+    
+    def predict_buckets_from_json(self, records: List[Dict]) -> List[Dict[str, Any]]:
+        """
+        Mode tranche pour des patients JSON : classe, niveau de risque et profondeur
+        descendue dans les arbres (sur max_depth), sans probabilités.
+        Un patient seul passe par le chemin par défaut (cache, table ou forêt complète,
+        plus rapide que l'encadrement sur une ligne) et indique la profondeur complète.
+        Une ligne invalide produit {"error": ...}.
+        """
+        if not self.is_loaded:
+            raise ValueError("Le modèle n'est pas chargé. Utilisez load_model() d'abord.")
+        
+        results: List[Dict[str, Any]] = [None] * len(records)
+        valid_rows = []
+        valid_indices = []
+        
+        start = time.perf_counter()
+        for index, record in enumerate(records):
+            try:
+                valid_rows.append(self.validate_json_input(record))
+                valid_indices.append(index)
+            except Exception as e:
+                results[index] = self._build_error(e, compact=True)
+        _VALIDATE_LATENCY.observe(time.perf_counter() - start)
+        
+        if len(valid_rows) == 1:
+            prediction, probabilities = self._predict_validated(valid_rows)[0]
+            results[valid_indices[0]] = self._build_bucket_result(
+                prediction, self._get_risk_code(probabilities[1]), self._full_depth())
+        elif valid_rows:
+            predictions, risks, depth_used = self.predict_buckets(self.encode_batch(valid_rows))
+            for index, prediction, risk, depth in zip(
+                valid_indices, predictions.tolist(), risks.tolist(), depth_used.tolist()
+            ):
+                results[index] = self._build_bucket_result(prediction, risk, depth)
+        
+        return results
+    
+    def to_bucket(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Convertit un résultat complet (_build_result ou _build_error) en résultat tranche"""
+        if not result.get("success", False):
+            return {"error": result.get("error", "Erreur inconnue")}
+        return self._build_bucket_result(result["prediction"], RISK_LEVELS.index(result["risk_level"]),
+                                         self._full_depth())
+    
+    @staticmethod
+    def _build_bucket_result(prediction: int, risk: int, depth_used: int) -> Dict[str, Any]:
+        """Réponse du mode tranche : classe, niveau de risque et profondeur descendue"""
+        return {
+            "prediction": int(prediction),
+            "prediction_label": "Diabète détecté" if prediction == 1 else "Pas de diabète détecté",
+            "risk": int(risk),
+            "risk_level": RISK_LEVELS[risk],
+            "depth_used": int(depth_used)
+        }
+    
+    def explain(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, np.ndarray]:
+        """
+        Prédit et décompose P(diabète) en contributions des features : pour chaque patient,
+        P(diabète) = biais + somme des contributions (biais : P(diabète) moyenne de la forêt
+        à la racine des arbres). Évalué par la forêt aplatie, sans table ni cache.
+        
+        Returns:
+            Tuple: Classes, probabilités, biais et contributions (n_patients, n_features)
+        """
+        if self.flat_forest is None:
+            raise ValueError("Explications indisponibles : la forêt n'a pas pu être aplatie")
+        
+        start = time.perf_counter()
+        probabilities, bias, contributions = self.flat_forest.predict_contributions(features)
+        predictions = self.flat_forest.classes_.take(np.argmax(probabilities, axis=1))
+        _FOREST_LATENCY.observe(time.perf_counter() - start)
+        self._observe(features, predictions, probabilities[:, 1])
+        return predictions, probabilities, bias, contributions
+    
+    def explain_from_json(self, records: List[Dict]) -> List[Dict[str, Any]]:
+        """
+        Prédictions complètes de patients JSON avec, pour chacun, la contribution de
+        chaque feature à P(diabète), de la plus forte à la plus faible en valeur absolue.
+        Une ligne invalide produit un résultat en erreur sans faire échouer le lot.
+        """
+        if not self.is_loaded:
+            raise ValueError("Le modèle n'est pas chargé. Utilisez load_model() d'abord.")
+        
+        results: List[Dict[str, Any]] = [None] * len(records)
+        valid_rows = []
+        valid_indices = []
+        
+        start = time.perf_counter()
+        for index, record in enumerate(records):
+            try:
+                valid_rows.append(self.validate_json_input(record))
+                valid_indices.append(index)
+            except Exception as e:
+                results[index] = self._build_error(e)
+        _VALIDATE_LATENCY.observe(time.perf_counter() - start)
+        
+        if valid_rows:
+            predictions, probabilities, bias, contributions = self.explain(self.encode_batch(valid_rows))
+            for index, validated_data, prediction, row_probabilities, row_contributions in zip(
+                valid_indices, valid_rows, predictions.tolist(), probabilities.tolist(), contributions.tolist()
+            ):
+                result = self._build_result(validated_data, prediction, row_probabilities)
+                ranked = sorted(zip(self.feature_columns, row_contributions), key=lambda item: -abs(item[1]))
+                result["explanation"] = {
+                    "base_value": round(bias, 4),
+                    "contributions": {column: round(value, 4) for column, value in ranked}
+                }
+                results[index] = result
+        
+        return results
+    
+    def what_if_from_json(self, json_data: Dict) -> Dict[str, Any]:
+        """
+        Scénarios d'un patient évalués en un seul appel au modèle : P(diabète) pour
+        chaque âge de 0 à MAX_AGE (autres variables inchangées) et pour l'inversion de
+        chacune des variables binaires (Yes/No, Female/Male). Seul le patient lui-même
+        compte dans les statistiques.
+        
+        Returns:
+            Dict[str, Any]: Résultat de /predict, courbe par âge et effet de chaque inversion,
+            du plus fort au plus faible
+        """
+        if not self.is_loaded:
+            raise ValueError("Le modèle n'est pas chargé. Utilisez load_model() d'abord.")
+        
+        try:
+            start = time.perf_counter()
+            validated_data = self.validate_json_input(json_data)
+            _VALIDATE_LATENCY.observe(time.perf_counter() - start)
+            
+            # Lignes 0 à MAX_AGE : courbe par âge ; lignes suivantes : une variable inversée chacune
+            patient = self.encode_batch([validated_data])[0]
+            binary_columns = self.feature_columns[1:]
+            ages = np.arange(MAX_AGE + 1)
+            features = np.tile(patient, (len(ages) + len(binary_columns), 1))
+            features[ages, 0] = ages
+            flip_rows = np.arange(len(binary_columns)) + len(ages)
+            features[flip_rows, np.arange(1, len(self.feature_columns))] = 1 - patient[1:]
+            
+            predictions, probabilities = self._evaluate(features)
+            age = validated_data['age']
+            self._observe(features[age:age + 1], predictions[age:age + 1], probabilities[age:age + 1, 1])
+            
+            p_diabetes = probabilities[:, 1]
+            risk = np.searchsorted(RISK_THRESHOLDS, p_diabetes, side="right")
+            base = float(p_diabetes[age])
+            flips = []
+            for index, column in enumerate(binary_columns):
+                row = len(ages) + index
+                labels = {code: label for label, code in self.encodings[column].items()}
+                flips.append((column, {
+                    "value": labels[1 - int(patient[index + 1])],
+                    "p_diabetes": round(float(p_diabetes[row]), 4),
+                    "delta": round(float(p_diabetes[row]) - base, 4),
+                    "risk_level": RISK_LEVELS[int(risk[row])]
+                }))
+            flips.sort(key=lambda item: -abs(item[1]["delta"]))
+            
+            result = self._build_result(validated_data, int(predictions[age]), probabilities[age].tolist())
+            result["age_curve"] = {
+                "ages": ages.tolist(),
+                "p_diabetes": np.round(p_diabetes[:len(ages)], 4).tolist(),
+                "risk": risk[:len(ages)].tolist()
+            }
+            result["flips"] = dict(flips)
             return result
             
         except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "message": "Erreur lors de la prédiction"
-            }
+            return self._build_error(e)
+    
+    def _predict_validated(self, validated_rows: List[Dict[str, Any]]) -> List[Tuple[int, List[float]]]:
+        """
+        Prédit des patients validés en passant par le cache : seules les lignes absentes
+        du cache sont encodées et évaluées, en un seul appel au modèle.
+        
+        Returns:
+            List[Tuple[int, List[float]]]: (classe, probabilités) par patient
+        """
+        outputs: List[Tuple[int, List[float]]] = [None] * len(validated_rows)
+        
+        if self.cache is not None:
+            keys = [self.encoder.pack_record(row) for row in validated_rows]
+            missing = []
+            hits = []
+            for index, key in enumerate(keys):
+                cached = self.cache.get(key)
+                if cached is None:
+                    missing.append(index)
+                else:
+                    outputs[index] = cached
+                    hits.append(index)
+            if hits:
+                # Les patients servis par le cache comptent aussi dans les statistiques et l'audit
+                hit_keys = np.array([keys[i] for i in hits], dtype=np.int64)
+                self._observe(unpack_keys(hit_keys), np.array([outputs[i][0] for i in hits]),
+                              np.array([outputs[i][1][1] for i in hits]), keys=hit_keys)
+        else:
+            missing = range(len(validated_rows))
+        
+        if missing:
+            predictions, probabilities = self._infer(self.encode_batch([validated_rows[i] for i in missing]))
+            for index, prediction, row_probabilities in zip(missing, predictions.tolist(), probabilities.tolist()):
+                outputs[index] = (prediction, row_probabilities)
+                if self.cache is not None:
+                    self.cache.put(keys[index], outputs[index])
+        
+        return outputs
+    
+    def _build_result(self, validated_data: Dict[str, Any], prediction: int,
+                      probabilities: List[float]) -> Dict[str, Any]:
+        """
+        Construit la réponse de prédiction d'un patient.
+        """
+        return {
+            "success": True,
+            "patient_id": validated_data.get('id', 'N/A'),
+            "prediction": int(prediction),
+            "prediction_label": "Diabète détecté" if prediction == 1 else "Pas de diabète détecté",
+            "probabilities": {
+                "no_diabetes": round(probabilities[0], 4),
+                "diabetes": round(probabilities[1], 4)
+            },
+            "confidence": round(max(probabilities), 4),
+            "risk_level": self._get_risk_level(probabilities[1]),
+            "input_data": validated_data
+        }
+    
+    def _build_compact_result(self, prediction: int, probabilities: List[float]) -> Dict[str, Any]:
+        """
+        Réponse compacte : classe, P(diabète) et code de risque (indice dans RISK_LEVELS),
+        sans écho des données d'entrée.
+        """
+        return {
+            "prediction": int(prediction),
+            "p_diabetes": round(probabilities[1], 4),
+            "risk": self._get_risk_code(probabilities[1])
+        }
+    
+    @staticmethod
+    def to_compact(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Convertit un résultat complet (_build_result ou _build_error) en résultat compact"""
+        if not result.get("success", False):
+            return {"error": result.get("error", "Erreur inconnue")}
+        return {
+            "prediction": result["prediction"],
+            "p_diabetes": result["probabilities"]["diabetes"],
+            "risk": RISK_LEVELS.index(result["risk_level"])
+        }
+    
+    def _build_error(self, error: Exception, compact: bool = False) -> Dict[str, Any]:
+        """
+        Construit la réponse d'erreur d'un patient.
+        """
+        if compact:
+            return {"error": str(error)}
+        return {
+            "success": False,
+            "error": str(error),
+            "message": "Erreur lors de la prédiction"
+        }
     
     def _get_risk_level(self, diabetes_probability: float) -> str:
         """
@@ -227,14 +875,14 @@ class ModelDiabetes:
         Returns:
             str: Niveau de risque
         """
-        if diabetes_probability < 0.3:
-            return "Faible"
-        elif diabetes_probability < 0.6:
-            return "Modéré"
-        elif diabetes_probability < 0.8:
-            return "Élevé"
-        else:
-            return "Très élevé"
+        return RISK_LEVELS[self._get_risk_code(diabetes_probability)]
+    
+    def _get_risk_code(self, diabetes_probability: float) -> int:
+        """
+        Code du niveau de risque : 0 (Faible) à 3 (Très élevé), nombre de seuils
+        RISK_THRESHOLDS atteints (comme le calcul vectorisé de _bucketize).
+        """
+        return bisect.bisect_right(RISK_THRESHOLDS, diabetes_probability)
     
     def predict_single(self, patient_data: Dict) -> Dict[str, Any]:
         """
@@ -246,8 +894,8 @@ class ModelDiabetes:
         Returns:
             Dict[str, Any]: Résultat de la prédiction avec probabilités
         """
-        prediction = self.predict(patient_data)[0]
-        probabilities = self.predict_proba(patient_data)[0]
+        predictions, probabilities = self.predict_with_proba(patient_data)
+        prediction, probabilities = predictions[0], probabilities[0]
         
         result = {
             "prediction": int(prediction),
@@ -268,17 +916,18 @@ class ModelDiabetes:
         """
         info = {
             "model_loaded": self.is_loaded,
-            "model_type": type(self.model).__name__ if self.model else None,
+            "model_type": self.model_params.get("model_type"),
             "feature_columns": self.feature_columns,
             "num_features": len(self.feature_columns),
-            "categorical_encodings": self.encodings
+            "categorical_encodings": self.encodings,
+            "flat_forest": self.flat_forest.get_info() if self.flat_forest else None,
+            "lookup_table": self.lookup_table.table_path if self.lookup_table else None,
+            "prediction_cache": self.cache.get_stats() if self.cache else None
         }
         
-        if self.model and hasattr(self.model, 'n_estimators'):
-            info["n_estimators"] = self.model.n_estimators
-        if self.model and hasattr(self.model, 'max_depth'):
-            info["max_depth"] = self.model.max_depth
-        if self.model and hasattr(self.model, 'random_state'):
-            info["random_state"] = self.model.random_state
+        for name in ("n_estimators", "max_depth", "random_state"):
+            if name in self.model_params:
+                info[name] = self.model_params[name]
+        info["shared_model"] = self.is_shared
             
         return info
@@ -0,0 +1,300 @@
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from metrics import Counter
+from model import ModelDiabetes
+
+# Nombre de patients évalués pour préchauffer une nouvelle version avant sa mise en service
+DEFAULT_WARMUP_ROWS = 64
+
+
+class ReloadInProgressError(RuntimeError):
+    """Un chargement de modèle est déjà en cours"""
+
+
+class ModelVersion:
+    """
+    Une version de modèle chargée et préchauffée, prête à servir.
+    """
+
+    def __init__(self, model: ModelDiabetes, path: str, sequence: int, load_seconds: float,
+                 warmup_seconds: float, fingerprint):
+
+        self.model = model
+        self.path = path
+        self.sequence = sequence
+        # Identifiant de version : début de l'empreinte SHA-256 du modèle d'origine
+        self.version = model.model_sha256()[:12]
+        self.load_seconds = load_seconds
+        self.warmup_seconds = warmup_seconds
+        self.loaded_at = time.time()
+        # Empreinte du fichier au chargement (surveillance du fichier modèle)
+        self.fingerprint = fingerprint
+        # Informations du modèle calculées une fois pour /health (le cache est lu à part)
+        self.info = model.get_model_info()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "sequence": self.sequence,
+            "path": self.path,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.loaded_at)),
+            "load_seconds": round(self.load_seconds, 4),
+            "warmup_seconds": round(self.warmup_seconds, 4),
+        }
+
+
+def _file_fingerprint(path: str):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def warmup_records(model: ModelDiabetes, n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Patients valides pseudo-aléatoires (reproductibles) pour préchauffer un modèle"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n):
+        record = {"age": rng.randint(0, 120)}
+        for column, mapping in model.encodings.items():
+            record[column] = rng.choice(list(mapping.keys()))
+        records.append(record)
+    return records
+
+
+class ModelRegistry:
+    """
+    Versions du modèle servi : chargement en arrière-plan, préchauffage, bascule
+    atomique et retour à la version précédente.
+
+    Une nouvelle version est chargée et préchauffée à côté de la version active, qui
+    continue de servir. La bascule remplace une seule référence : une requête en cours
+    garde la version qu'elle a lue au début (voir active) et se termine avec elle.
+    Les history_size versions précédentes restent en mémoire pour rollback().
+    """
+
+    def __init__(self, build_model: Callable[[str], ModelDiabetes], history_size: int = 1,
+                 warmup_rows: int = DEFAULT_WARMUP_ROWS,
+                 on_swap: Optional[Callable[[ModelVersion], None]] = None):
+
+        self.build_model = build_model
+        self.warmup_rows = warmup_rows
+        self.on_swap = on_swap
+
+        self._active: Optional[ModelVersion] = None
+        self._history: deque = deque(maxlen=history_size)
+        self._sequence = 0
+        self._swap_lock = threading.Lock()
+        # Un seul chargement à la fois
+        self._load_lock = threading.Lock()
+        self._loading_path: Optional[str] = None
+        self._last_error: Optional[str] = None
+
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+        # Empreinte refusée par fichier : la surveillance ne la recharge pas (chargement
+        # en erreur, ou version sur le disque abandonnée par rollback)
+        self._refused: Dict[str, Any] = {}
+
+        # Métriques
+        self.swaps = Counter("diabete_model_swaps_total", "Versions du modèle mises en service")
+        self.failures = Counter("diabete_model_load_failures_total", "Chargements de modèle échoués")
+        self.rollbacks = Counter("diabete_model_rollbacks_total", "Retours à la version précédente")
+
+    @property
+    def active(self) -> Optional[ModelVersion]:
+        """Version servie. À lire une fois par requête puis à utiliser jusqu'à la fin."""
+        return self._active
+
+    @property
+    def is_loading(self) -> bool:
+        return self._loading_path is not None
+
+    def load(self, path: str) -> ModelVersion:
+        """
+        Charge, préchauffe puis met en service le modèle path (appel bloquant).
+        En cas d'échec, la version active reste en service.
+
+        Raises:
+            ReloadInProgressError: si un autre chargement est en cours
+        """
+        if not self._load_lock.acquire(blocking=False):
+            raise ReloadInProgressError(f"Chargement déjà en cours: {self._loading_path}")
+        try:
+            self._loading_path = path
+            version = self._prepare(path)
+            self._swap(version)
+            return version
+        except Exception as e:
+            self.failures.inc()
+            self._last_error = f"{path}: {e}"
+            print(f"❌ Nouvelle version de {path} refusée, version active conservée: {e}")
+            raise
+        finally:
+            self._loading_path = None
+            self._load_lock.release()
+
+    def load_in_background(self, path: str):
+        """
+        Lance load(path) dans un thread et rend la main immédiatement.
+
+        Raises:
+            ReloadInProgressError: si un autre chargement est en cours
+        """
+        if self.is_loading or self._load_lock.locked():
+            raise ReloadInProgressError(f"Chargement déjà en cours: {self._loading_path}")
+
+        def run():
+            try:
+                self.load(path)
+            except Exception:
+                pass  # déjà journalisé et conservé dans last_error
+
+        threading.Thread(target=run, name="model-reload", daemon=True).start()
+
+    def _prepare(self, path: str) -> ModelVersion:
+        """Construit et préchauffe une version sans toucher à la version active"""
+        start = time.perf_counter()
+        fingerprint = _file_fingerprint(path)
+        model = self.build_model(path)
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.warm_up(model)
+        warmup_seconds = time.perf_counter() - start
+
+        with self._swap_lock:
+            self._sequence += 1
+            sequence = self._sequence
+        return ModelVersion(model, path, sequence, load_seconds, warmup_seconds, fingerprint)
+
+    def warm_up(self, model: ModelDiabetes):
+        """
+        Évalue des patients synthétiques par chaque chemin de prédiction (patient seul,
+        lots, mode tranche, explications si la forêt est aplatie, clés compactes) pour payer les initialisations paresseuses
+        (pages du modèle, scikit-learn, encodeur, bornes du mode tranche) avant la mise
+        en service. Une erreur refuse la version. warmup_rows = 0 désactive le préchauffage.
+        """
+        if self.warmup_rows <= 0:
+            return
+        # Les patients de préchauffage ne sont pas des prédictions : pas de journal d'audit
+        audit_log, model.audit_log = model.audit_log, None
+        try:
+            self._warm_up_paths(model)
+        finally:
+            model.audit_log = audit_log
+        # Ni d'entrées dans le cache, ni de lignes dans les statistiques
+        if model.cache is not None:
+            model.cache.clear()
+        model.stats.reset()
+
+    def _warm_up_paths(self, model: ModelDiabetes):
+        records = warmup_records(model, self.warmup_rows)
+        results = [model.predict_from_json(records[0]), model.predict_from_json(records[0], compact=True)]
+        for size in sorted({1, min(8, len(records)), len(records)}):
+            results += model.predict_batch_from_json(records[:size])
+            results += model.predict_buckets_from_json(records[:size])
+            # Sans forêt aplatie, /explain répond 503 mais le modèle reste servable
+            if model.flat_forest is not None:
+                results += model.explain_from_json(records[:size])
+        errors = [result["error"] for result in results if "error" in result]
+        if errors:
+            raise ValueError(f"Préchauffage en erreur ({len(errors)} patient(s)): {errors[0]}")
+        keys = np.array([model.encoder.pack_record(model.validate_json_input(record)) for record in records])
+        model.predict_packed(keys)
+
+    def _swap(self, version: ModelVersion):
+        with self._swap_lock:
+            if self._active is not None:
+                self._history.append(self._active)
+            self._active = version
+            self._last_error = None
+        self.swaps.inc()
+        if self.on_swap is not None:
+            self.on_swap(version)
+        print(f"✅ Version {version.version} (#{version.sequence}) en service "
+              f"(chargement {version.load_seconds * 1000:.0f} ms, préchauffage {version.warmup_seconds * 1000:.0f} ms)")
+
+    def rollback(self) -> ModelVersion:
+        """
+        Remet en service la version précédente ; la version active est abandonnée.
+
+        Raises:
+            ValueError: s'il n'y a pas de version précédente
+        """
+        with self._swap_lock:
+            if not self._history:
+                raise ValueError("Aucune version précédente disponible")
+            version = self._history.pop()
+            self._active = version
+            # Le fichier sur le disque est celui de la version abandonnée : la surveillance
+            # ne doit pas la remettre en service tant qu'il ne change pas à nouveau
+            try:
+                fingerprint = _file_fingerprint(version.path)
+            except OSError:
+                fingerprint = None
+            if fingerprint is not None and fingerprint != version.fingerprint:
+                self._refused[version.path] = fingerprint
+        self.rollbacks.inc()
+        if self.on_swap is not None:
+            self.on_swap(version)
+        print(f"⚠️ Retour à la version {version.version} (#{version.sequence})")
+        return version
+
+    def watch(self, interval: float):
+        """
+        Surveille le fichier de la version active toutes les interval secondes et
+        charge la nouvelle version en arrière-plan quand il change. Un fichier refusé
+        (chargement en erreur) ou abandonné par rollback() n'est pas rechargé tant
+        qu'il ne change pas à nouveau.
+        """
+        if self._watch_thread is not None:
+            return
+        self._watch_stop.clear()
+
+        def run():
+            while not self._watch_stop.wait(interval):
+                version = self._active
+                if version is None or self.is_loading:
+                    continue
+                try:
+                    fingerprint = _file_fingerprint(version.path)
+                except OSError:
+                    continue
+                if fingerprint in (version.fingerprint, self._refused.get(version.path)):
+                    continue
+                print(f"⏳ {version.path} a changé sur le disque : chargement de la nouvelle version")
+                try:
+                    self.load(version.path)
+                except Exception:
+                    self._refused[version.path] = fingerprint
+
+        self._watch_thread = threading.Thread(target=run, name="model-watch", daemon=True)
+        self._watch_thread.start()
+
+    def stop(self):
+        """Arrête la surveillance du fichier modèle"""
+        if self._watch_thread is not None:
+            self._watch_stop.set()
+            self._watch_thread.join()
+            self._watch_thread = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Version active, versions disponibles pour rollback et chargement en cours"""
+        active = self._active
+        return {
+            "active": active.describe() if active else None,
+            "previous": [version.describe() for version in reversed(self._history)],
+            "loading": self._loading_path,
+            "last_error": self._last_error,
+        }
+
+    def collect(self) -> List[Counter]:
+        """Métriques exposées sur /metrics"""
+        return [self.swaps, self.failures, self.rollbacks]
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Scoring hors ligne de gros fichiers de patients avec ModelDiabetes.
+
+Le fichier (CSV, ou Parquet si pyarrow est installé) est lu par paquets, encodé dans
+le processus principal puis évalué par un pool de processus : chaque worker charge
+le modèle une seule fois (ou ouvre la table précalculée en memory-map). L'ordre des
+lignes est conservé et la sortie reprend le format du notebook (ID, class) avec les
+probabilités.
+
+Usage :
+    python score_file.py data/test_without_class_cleaned.csv --output predictions_test_diabetes.csv
+    python score_file.py cohorte.parquet --workers 16 --chunk-size 50000 --table Model_diabetes_RF.table.npy
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from model import ModelDiabetes
+from streaming import normalize_column
+
+# Modèle chargé une fois par worker (voir _init_worker)
+_worker_model: Optional[ModelDiabetes] = None
+
+
+def _init_worker(model_path: str, table_path: Optional[str]):
+    """Charge le modèle dans le worker au démarrage du pool"""
+    global _worker_model
+    _worker_model = ModelDiabetes(model_path)
+    _worker_model.load_model()
+    if table_path:
+        _worker_model.load_lookup_table(table_path)
+
+
+def _score_chunk(features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Évalue un paquet de lignes déjà encodées dans le worker"""
+    predictions, probabilities = _worker_model._infer(features)
+    return predictions, probabilities
+
+
+def iter_chunks(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Lit le fichier d'entrée par paquets de chunk_size lignes"""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ La lecture Parquet nécessite pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def score_file(input_path: str, output_path: str, model_path: str = "Model_diabetes_RF.pkl",
+               table_path: Optional[str] = None, workers: Optional[int] = None,
+               chunk_size: int = 50_000, id_column: str = "id") -> dict:
+    """
+    Évalue toutes les lignes de input_path et écrit ID, class et probabilités dans output_path.
+
+    Returns:
+        dict: Nombre de lignes, durée et débit (lignes/s)
+    """
+    workers = workers or os.cpu_count() or 1
+    # Le processus principal n'encode que les colonnes (encodeur vectorisé, sans modèle)
+    encoder = ModelDiabetes(model_path).encoder
+    in_flight = deque()
+    n_rows = 0
+    start = time.perf_counter()
+
+    with open(output_path, "w", newline="") as output, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(model_path, table_path)) as executor:
+        writer = csv.writer(output)
+        writer.writerow(["ID", "class", "probability_no_diabetes", "probability_diabetes"])
+
+        def write_oldest():
+            ids, future = in_flight.popleft()
+            predictions, probabilities = future.result()
+            writer.writerows(zip(ids, predictions.tolist(), probabilities[:, 0].round(4).tolist(),
+                                 probabilities[:, 1].round(4).tolist()))
+
+        for chunk in iter_chunks(input_path, chunk_size):
+            chunk.columns = [normalize_column(name) for name in chunk.columns]
+            if id_column in chunk.columns:
+                ids = chunk[id_column].tolist()
+            else:
+                ids = list(range(n_rows, n_rows + len(chunk)))
+
+            in_flight.append((ids, executor.submit(_score_chunk, encoder.encode_frame(chunk))))
+            n_rows += len(chunk)
+
+            # Au plus deux paquets en attente par worker : mémoire bornée, ordre conservé
+            while len(in_flight) > 2 * workers:
+                write_oldest()
+
+        while in_flight:
+            write_oldest()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": n_rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(n_rows / elapsed, 1) if elapsed > 0 else 0.0,
+        "workers": workers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring hors ligne d'un fichier CSV ou Parquet")
+    parser.add_argument("input", help="Fichier CSV ou .parquet")
+    parser.add_argument("--output", default=None, help="Fichier CSV de sortie")
+    parser.add_argument("--model", default="Model_diabetes_RF.pkl")
+    parser.add_argument("--table", default=None, help="Table précalculée (lookup_table.py) à utiliser")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (défaut : tous les cœurs)")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--id-column", default="id")
+    args = parser.parse_args()
+
+    output_path = args.output or f"predictions_{os.path.splitext(os.path.basename(args.input))[0]}.csv"
+    report = score_file(args.input, output_path, args.model, args.table, args.workers,
+                        args.chunk_size, args.id_column)
+
+    print(f"✅ {report['rows']} lignes évaluées en {report['seconds']} s "
+          f"({report['rows_per_second']:.0f} lignes/s, {report['workers']} workers) -> {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
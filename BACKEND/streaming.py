@@ -0,0 +1,158 @@
+
+import csv
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Union
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from fast_json import dumps
+
+# Nombre de patients évalués par appel au modèle
+DEFAULT_CHUNK_SIZE = 1000
+# Longueur maximale d'une ligne d'entrée (octets) ; un patient en JSON en fait ~400
+DEFAULT_MAX_LINE_BYTES = 64 * 1024
+
+
+class InvalidLine:
+    """Ligne d'entrée illisible, rapportée comme erreur dans le flux de sortie"""
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Réponse en flux produite pendant la lecture du corps de la requête.
+
+    StreamingResponse écoute la déconnexion du client via receive() (ASGI < 2.4), ce qui
+    consommerait les morceaux du corps encore attendus par le générateur. Ici, seul
+    le générateur lit receive() ; une déconnexion remonte par request.stream().
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def normalize_column(name: str) -> str:
+    """Même normalisation des en-têtes CSV que le notebook ('Sudden Weight Loss' -> 'sudden_weight_loss')"""
+    return name.strip().replace(' ', '_').lower()
+
+
+async def iter_lines(byte_stream: AsyncIterator[bytes],
+                     max_line_bytes: int = DEFAULT_MAX_LINE_BYTES) -> AsyncIterator[Union[str, InvalidLine]]:
+    """
+    Découpe un corps de requête reçu par morceaux en lignes non vides.
+    Seule la ligne en cours est gardée en mémoire, et au plus max_line_bytes : une
+    ligne plus longue est rapportée comme InvalidLine et ignorée jusqu'au saut de
+    ligne suivant (la mémoire reste bornée même sans aucun saut de ligne).
+    """
+    too_long = InvalidLine(f"Ligne trop longue (plus de {max_line_bytes} octets)")
+    pending = b""
+    # Reste d'une ligne trop longue déjà rapportée, ignoré jusqu'au prochain saut de ligne
+    skipping = False
+    async for chunk in byte_stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+                continue
+            if len(line) > max_line_bytes:
+                yield too_long
+                continue
+            line = line.strip()
+            if line:
+                yield line.decode("utf-8")
+        if len(pending) > max_line_bytes:
+            if not skipping:
+                yield too_long
+            skipping = True
+            pending = b""
+    pending = pending.strip()
+    if pending and not skipping:
+        yield pending.decode("utf-8")
+
+
+async def iter_ndjson_records(byte_stream: AsyncIterator[bytes],
+                              max_line_bytes: int = DEFAULT_MAX_LINE_BYTES) -> AsyncIterator[Any]:
+    """Un objet JSON par ligne"""
+    async for line in iter_lines(byte_stream, max_line_bytes):
+        if isinstance(line, InvalidLine):
+            yield line
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield InvalidLine(f"JSON invalide: {e}")
+
+
+async def iter_csv_records(byte_stream: AsyncIterator[bytes],
+                           max_line_bytes: int = DEFAULT_MAX_LINE_BYTES) -> AsyncIterator[Any]:
+    """CSV avec une ligne d'en-tête ; les colonnes supplémentaires (id...) sont conservées"""
+    header = None
+    async for line in iter_lines(byte_stream, max_line_bytes):
+        if isinstance(line, InvalidLine):
+            yield line
+            continue
+        row = next(csv.reader([line]))
+        if header is None:
+            header = [normalize_column(name) for name in row]
+            continue
+        if len(row) != len(header):
+            yield InvalidLine(f"Ligne CSV invalide: {len(row)} colonnes au lieu de {len(header)}")
+            continue
+        yield dict(zip(header, row))
+
+
+async def stream_predictions(records: AsyncIterator[Any],
+                             predict_batch: Callable[[List[Dict]], List[Dict[str, Any]]],
+                             chunk_size: int = DEFAULT_CHUNK_SIZE,
+                             compact: bool = False) -> AsyncIterator[bytes]:
+    """
+    Évalue les patients par paquets de chunk_size et produit une ligne NDJSON par patient,
+    puis une ligne de synthèse. La mémoire utilisée ne dépend que de chunk_size.
+    Avec compact, les erreurs de lecture sont rapportées sous la forme {"error": ...}.
+    """
+    counts = {"count": 0, "n_success": 0, "n_errors": 0}
+    chunk: List[Any] = []
+
+    async def flush() -> bytes:
+        # Les lignes illisibles sont remplacées par un objet vide puis rapportées avec leur propre erreur
+        records_to_score = [record if isinstance(record, dict) else {} for record in chunk]
+        results = await run_in_threadpool(predict_batch, records_to_score)
+
+        lines = []
+        for offset, (record, result) in enumerate(zip(chunk, results)):
+            if isinstance(record, InvalidLine):
+                result = _line_error(record.message, compact)
+            elif not isinstance(record, dict):
+                result = _line_error("Chaque ligne doit être un objet JSON", compact)
+            result["index"] = counts["count"] + offset
+            if isinstance(record, dict) and "id" in record:
+                result["id"] = record["id"]
+            counts["n_errors" if "error" in result else "n_success"] += 1
+            lines.append(dumps(result))
+
+        counts["count"] += len(chunk)
+        chunk.clear()
+        return b"\n".join(lines) + b"\n"
+
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield await flush()
+
+    if chunk:
+        yield await flush()
+
+    yield dumps({"done": True, **counts}) + b"\n"
+
+
+def _line_error(message: str, compact: bool) -> Dict[str, Any]:
+    """Résultat d'une ligne d'entrée illisible"""
+    if compact:
+        return {"error": message}
+    return {"success": False, "error": message, "message": "Erreur lors de la prédiction"}
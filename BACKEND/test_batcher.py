@@ -0,0 +1,33 @@
+"""
+Tests du micro-batcher : chaque requête est évaluée par le modèle qu'elle a indiqué,
+même si le lot mélange deux versions (bascule pendant l'attente).
+
+    python -m pytest -q
+"""
+
+import asyncio
+
+from batcher import MicroBatcher
+
+
+def test_each_request_uses_its_model():
+    calls = []
+
+    def predict_batch(model, records):
+        calls.append((model, len(records)))
+        return [{"model": model, "record": record} for record in records]
+
+    async def run():
+        batcher = MicroBatcher(predict_batch, max_batch_size=64, max_wait_us=50_000)
+        batcher.start()
+        try:
+            models = ["ancien" if i % 3 else "nouveau" for i in range(30)]
+            return models, await asyncio.gather(*[batcher.submit(i, model) for i, model in enumerate(models)])
+        finally:
+            await batcher.stop()
+
+    models, results = asyncio.run(run())
+    assert [result["model"] for result in results] == models
+    assert [result["record"] for result in results] == list(range(30))
+    # Un seul lot de 30 requêtes, évalué en un appel par modèle
+    assert sorted(calls) == [("ancien", 20), ("nouveau", 10)]
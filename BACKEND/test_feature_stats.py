@@ -0,0 +1,62 @@
+"""
+Tests des statistiques en flux : mémoire fixe quel que soit le nombre de threads,
+comptes exacts sous concurrence et remise à zéro.
+
+    python -m pytest -q
+"""
+
+import threading
+
+import numpy as np
+
+from feature_stats import DEFAULT_SHARDS, FeatureStatistics
+
+COLUMNS = ["age"] + [f"b{i}" for i in range(15)]
+RISK_LEVELS = ["Faible", "Modéré", "Élevé", "Très élevé"]
+FEATURES = np.zeros((3, 16), dtype=np.float32)
+PREDICTIONS = np.array([0, 1, 1])
+P_DIABETES = np.array([0.1, 0.7, 0.9])
+
+
+def run_threads(target, n_threads: int):
+    threads = [threading.Thread(target=target) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_short_lived_threads_keep_shard_count_bounded():
+    stats = FeatureStatistics(COLUMNS, RISK_LEVELS)
+    # Threads remplacés au fil du trafic (workers du threadpool arrêtés après inactivité)
+    for _ in range(200):
+        run_threads(lambda: stats.observe(FEATURES, PREDICTIONS, P_DIABETES), 10)
+    assert len(stats._shards) == DEFAULT_SHARDS
+    snapshot = stats.snapshot()
+    assert snapshot["rows"] == 2000 * 3
+    assert snapshot["predictions"] == [2000, 4000]
+
+
+def test_concurrent_observe_and_reset():
+    stats = FeatureStatistics(COLUMNS, RISK_LEVELS, n_shards=2)
+    stop = threading.Event()
+
+    def observe_until_stopped():
+        while not stop.is_set():
+            stats.observe(FEATURES, PREDICTIONS, P_DIABETES)
+
+    threads = [threading.Thread(target=observe_until_stopped) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for _ in range(200):
+        stats.reset()
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    stats.reset()
+    assert stats.snapshot()["rows"] == 0
+    run_threads(lambda: [stats.observe(FEATURES, PREDICTIONS, P_DIABETES) for _ in range(500)], 8)
+    snapshot = stats.snapshot()
+    assert snapshot["rows"] == snapshot["rows_with_probability"] == 8 * 500 * 3
+    assert sum(snapshot["risk"]) == 8 * 500 * 3
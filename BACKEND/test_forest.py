@@ -0,0 +1,74 @@
+"""
+Tests de la forêt aplatie : résultats identiques à scikit-learn sur tous les chemins
+d'évaluation (ligne seule, petits et grands lots) et après l'aller-retour par l'artefact.
+
+    python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from artifact import load_artifact, write_artifact
+from forest import SMALL_BATCH_SIZE, FlatForest
+
+# Le modèle a été entraîné sur un DataFrame ; les tests lui passent des tableaux NumPy
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+@pytest.fixture(scope="module")
+def flat_forest(sklearn_model):
+    return FlatForest.from_sklearn(sklearn_model)
+
+
+@pytest.mark.parametrize("n_rows", [1, 7, SMALL_BATCH_SIZE, SMALL_BATCH_SIZE + 1, 20_000])
+def test_predict_proba_matches_sklearn(flat_forest, sklearn_model, encoded_rows, n_rows):
+    X = encoded_rows[:n_rows]
+    np.testing.assert_array_equal(flat_forest.predict_proba(X), sklearn_model.predict_proba(X))
+    np.testing.assert_array_equal(flat_forest.predict(X), sklearn_model.predict(X))
+
+
+@pytest.mark.parametrize("age", [0, 120])
+def test_single_row_age_edges(flat_forest, sklearn_model, encoded_rows, age):
+    for x in encoded_rows[:64]:
+        x = x.copy()
+        x[0] = age
+        np.testing.assert_array_equal(flat_forest.predict_proba(x[np.newaxis]),
+                                      sklearn_model.predict_proba(x[np.newaxis]))
+
+
+def test_artifact_matches_sklearn(sklearn_model, encoded_rows, artifact_path):
+    forest, header = load_artifact(artifact_path)
+    np.testing.assert_array_equal(forest.predict_proba(encoded_rows), sklearn_model.predict_proba(encoded_rows))
+    np.testing.assert_array_equal(forest.predict_proba(encoded_rows[:1]), sklearn_model.predict_proba(encoded_rows[:1]))
+
+
+def test_artifact_round_trip(flat_forest, encoded_rows, tmp_path):
+    path = str(tmp_path / "model.forest")
+    write_artifact(flat_forest, path, {"source_sha256": "0" * 64})
+    forest, header = load_artifact(path)
+    assert header["source_sha256"] == "0" * 64
+    np.testing.assert_array_equal(forest.predict_proba(encoded_rows), flat_forest.predict_proba(encoded_rows))
+
+
+def test_predict_buckets_matches_full_evaluation(artifact_path):
+    from conftest import random_rows
+    from model import BUCKET_BOUNDARIES, ModelDiabetes
+
+    model = ModelDiabetes(artifact_path)
+    model.load_model()
+    forest = model.flat_forest
+
+    X = random_rows(50_000, seed=1)
+    p_diabetes = forest.predict_proba(X)[:, 1]
+    # Lignes dont P(diabète) est au plus à 0.02 d'un seuil, où l'encadrement reste large le plus longtemps
+    near = [X[np.abs(p_diabetes - boundary) <= 0.02] for boundary in BUCKET_BOUNDARIES]
+    assert all(len(rows) >= 100 for rows in near)
+    X = np.concatenate([X] + near)
+
+    codes, depth_used = forest.predict_buckets(X, BUCKET_BOUNDARIES, model._bucketize)
+    # predict_proba : évaluation complète, identique à scikit-learn (tests ci-dessus)
+    expected = model._bucketize(forest.predict_proba(X))
+    np.testing.assert_array_equal(codes, expected)
+    assert depth_used.max() <= forest.max_depth
+    # L'arrêt anticipé a bien lieu (sinon le test ne vérifie que l'évaluation complète)
+    assert depth_used.mean() < forest.max_depth
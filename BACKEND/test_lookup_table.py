@@ -0,0 +1,72 @@
+"""
+Tests de la table de probabilités : la quantification sur 16 bits conserve la classe
+et le niveau de risque, y compris aux seuils (0.3, 0.5, 0.6, 0.8) et en cas d'égalité
+des deux classes.
+
+    python -m pytest -q
+"""
+
+import json
+
+import numpy as np
+
+from conftest import PICKLE_PATH, random_rows
+from lookup_table import (KEYS_PER_AGE, MAX_AGE, TABLE_FORMAT_VERSION, ProbabilityTable, _quantize,
+                          pack_keys, unpack_keys)
+from model import ModelDiabetes
+
+
+def write_table(directory, keys: np.ndarray, probabilities: np.ndarray) -> ProbabilityTable:
+    """Table dont seules les clés keys sont renseignées (quantification de probabilities)"""
+    path = str(directory / "model.table.npy")
+    values = np.zeros((MAX_AGE + 1) * KEYS_PER_AGE, dtype=np.uint16)
+    values[keys] = _quantize(probabilities)
+    np.save(path, values)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"format_version": TABLE_FORMAT_VERSION, "model_sha256": "0" * 64}, f)
+    return ProbabilityTable(path)
+
+
+def assert_same_label_and_risk(table: ProbabilityTable, keys: np.ndarray, probabilities: np.ndarray):
+    predictions, table_probabilities = table.lookup(unpack_keys(keys))
+    model = ModelDiabetes(PICKLE_PATH)  # non chargé : seuils de risque seulement
+    np.testing.assert_array_equal(predictions, np.argmax(probabilities, axis=1))
+    assert [model._get_risk_code(p) for p in table_probabilities[:, 1]] == \
+        [model._get_risk_code(p) for p in probabilities[:, 1]]
+    # Écart de quantification borné (deux quanta)
+    assert np.abs(table_probabilities[:, 1] - probabilities[:, 1]).max() <= 2 / 65535 + 1e-12
+
+
+def boundary_probabilities() -> np.ndarray:
+    """P(diabète) aux seuils et tout autour : flottants voisins, fractions de quantum, 1e-6, 1e-3"""
+    values = []
+    for threshold in (0.3, 0.5, 0.6, 0.8):
+        values += [threshold, np.nextafter(threshold, 0.0), np.nextafter(threshold, 1.0)]
+        for offset in (0.25 / 65535, 0.5 / 65535, 1 / 65535, 1.5 / 65535, 1e-6, 1e-3):
+            values += [threshold - offset, threshold + offset]
+    values += [0.0, 1.0]
+    return np.array(values, dtype=np.float64)
+
+
+def test_quantize_preserves_label_and_risk_at_boundaries(tmp_path):
+    p_diabetes = boundary_probabilities()
+    probabilities = np.stack([1.0 - p_diabetes, p_diabetes], axis=1)
+    # Égalités de l'argmax : [0.5, 0.5] donne la classe 0, comme RandomForestClassifier.predict
+    ties = np.array([[0.5, 0.5], [np.nextafter(0.5, 1.0), 0.5], [0.5, np.nextafter(0.5, 1.0)],
+                     [np.nextafter(0.5, 0.0), 0.5], [0.5, np.nextafter(0.5, 0.0)]])
+    probabilities = np.concatenate([probabilities, ties])
+    keys = np.arange(len(probabilities), dtype=np.int64) * 7919
+
+    table = write_table(tmp_path, keys, probabilities)
+    assert_same_label_and_risk(table, keys, probabilities)
+    assert table.lookup(unpack_keys(keys[-5:]))[0].tolist() == [0, 0, 1, 1, 0]
+
+
+def test_lookup_matches_forest(tmp_path, artifact_path):
+    model = ModelDiabetes(artifact_path)
+    model.load_model()
+    keys = np.unique(pack_keys(random_rows(50_000, seed=2)))
+    probabilities = model.flat_forest.predict_proba(unpack_keys(keys))
+
+    table = write_table(tmp_path, keys, probabilities)
+    assert_same_label_and_risk(table, keys, probabilities)
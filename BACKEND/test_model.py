@@ -0,0 +1,85 @@
+"""
+Tests du chargement du modèle : export partagé (SHARED_MODEL_DIR) à partir du pickle
+scikit-learn ou de l'artefact natif.
+
+    python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from conftest import PICKLE_PATH
+from model import ModelDiabetes
+
+
+@pytest.mark.parametrize("model_format", ["pickle", "artifact"])
+def test_export_shared_model(model_format, tmp_path, encoded_rows, artifact_path):
+    model_path = PICKLE_PATH if model_format == "pickle" else artifact_path
+    shared_dir = str(tmp_path / "shared")
+    reference = ModelDiabetes(artifact_path)
+    reference.load_model()
+    # Artefact chargé directement : pas de modèle scikit-learn, mais pas d'export partagé non plus
+    assert not reference.get_model_info()["shared_model"]
+
+    assert ModelDiabetes(model_path).export_shared_model(shared_dir)
+    # Export déjà à jour : rien à réécrire
+    assert not ModelDiabetes(model_path).export_shared_model(shared_dir)
+
+    shared = ModelDiabetes(model_path)
+    shared.load_shared_model(shared_dir)
+    assert shared.get_model_info()["shared_model"]
+    np.testing.assert_array_equal(shared.flat_forest.predict_proba(encoded_rows),
+                                  reference.flat_forest.predict_proba(encoded_rows))
+    # Même version (empreinte du pickle d'origine) quel que soit le format chargé
+    assert shared.model_sha256() == reference.model_sha256()
+
+
+def test_cache_hit_matches_miss(artifact_path):
+    from registry import warmup_records
+
+    cached = ModelDiabetes(artifact_path, cache_size=4096)
+    cached.load_model()
+    uncached = ModelDiabetes(artifact_path)
+    uncached.load_model()
+    records = warmup_records(uncached, 500)
+    # Doublons dans un même lot : servis par le cache au lot suivant
+    records += records[:50]
+    records[0]["age"], records[1]["age"] = 0, 120
+
+    expected = uncached.predict_batch_from_json(records)
+    miss = cached.predict_batch_from_json(records)
+    hit = cached.predict_batch_from_json(records)
+    assert cached.cache.get_stats()["hits"] >= len(records)
+    assert miss == expected
+    assert hit == expected
+    assert [cached.predict_from_json(record) for record in records[:20]] == expected[:20]
+
+
+def test_single_row_bucket_matches_batch(artifact_path):
+    from registry import warmup_records
+
+    model = ModelDiabetes(artifact_path, cache_size=4096)
+    model.load_model()
+    records = warmup_records(model, 200)
+
+    batch = model.predict_buckets_from_json(records)
+    strip = lambda results: [{k: v for k, v in r.items() if k != "depth_used"} for r in results]
+    # Patient seul : chemin par défaut (cache, table ou forêt complète), profondeur complète
+    for _ in range(2):
+        single = [model.predict_buckets_from_json([record])[0] for record in records]
+        assert all(result["depth_used"] == model.flat_forest.max_depth for result in single)
+        assert strip(single) == strip(batch)
+    assert model.cache.get_stats()["hits"] >= len(records)
+    assert model.to_bucket(model.predict_from_json(records[0])) == single[0]
+
+
+def test_warm_up_without_flat_forest():
+    from registry import ModelRegistry, warmup_records
+
+    # Modèle évalué par scikit-learn (forêt non aplatie) : servable, sans explications
+    model = ModelDiabetes(PICKLE_PATH)
+    model.load_model()
+    model.flat_forest = None
+    ModelRegistry(ModelDiabetes, warmup_rows=16).warm_up(model)
+    with pytest.raises(ValueError):
+        model.explain_from_json(warmup_records(model, 1))
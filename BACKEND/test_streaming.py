@@ -0,0 +1,63 @@
+"""
+Tests de la lecture en flux de /predict/stream : morceaux coupés au milieu d'un
+enregistrement, lignes trop longues (mémoire bornée).
+
+    python -m pytest -q
+"""
+
+import asyncio
+import json
+import tracemalloc
+
+from streaming import InvalidLine, iter_csv_records, iter_lines, iter_ndjson_records
+
+PATIENT = {"age": 45, "gender": "Female", "polyuria": "No", "polydipsia": "Yes"}
+
+
+def collect(iterator):
+    async def run():
+        return [item async for item in iterator]
+    return asyncio.run(run())
+
+
+async def chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_record_split_across_chunks():
+    body = b"".join(json.dumps({**PATIENT, "id": i}).encode() + b"\n" for i in range(5))
+    # Toutes les tailles de morceau : coupures au milieu d'une clé, d'une valeur, d'un nombre
+    for size in range(1, 40):
+        records = collect(iter_ndjson_records(chunks(body, size)))
+        assert records == [{**PATIENT, "id": i} for i in range(5)]
+
+    body = "id,Age,Gender\n1,45,Female\n2,é,Male".encode()
+    # Dont une coupure au milieu du caractère UTF-8 "é"
+    for size in range(1, len(body) + 1):
+        assert collect(iter_csv_records(chunks(body, size))) == [
+            {"id": "1", "age": "45", "gender": "Female"}, {"id": "2", "age": "é", "gender": "Male"}]
+
+
+def test_line_too_long_is_reported_and_skipped():
+    good = json.dumps(PATIENT).encode()
+    body = good + b"\n" + b"x" * 10_000 + b"\n" + good + b"\n"
+    for size in (1, 100, 4096, len(body)):
+        items = collect(iter_ndjson_records(chunks(body, size), max_line_bytes=1000))
+        assert len(items) == 3
+        assert items[0] == PATIENT and items[2] == PATIENT
+        assert isinstance(items[1], InvalidLine) and "trop longue" in items[1].message
+
+
+def test_memory_bounded_without_newline():
+    async def endless():
+        for _ in range(1000):
+            yield b"y" * 1000
+
+    tracemalloc.start()
+    lines = collect(iter_lines(endless(), max_line_bytes=4096))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # 1 Mo sans saut de ligne : une seule erreur, et jamais plus de quelques Kio en mémoire
+    assert len(lines) == 1 and isinstance(lines[0], InvalidLine)
+    assert peak < 64 * 1024
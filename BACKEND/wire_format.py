@@ -0,0 +1,93 @@
+
+"""
+Format binaire compact des patients pour POST /predict/binary.
+
+Chaque patient occupe 3 octets :
+    octet 0     âge (uint8, 0 à MAX_AGE)
+    octets 1-2  masque little-endian (uint16) : le bit i vaut 1 si la colonne
+                feature_columns[1 + i] est 'Male' / 'Yes' (gender, puis les 14 symptômes) ;
+                le bit 15 doit être nul.
+
+Le masque et l'âge forment la même clé compacte que le cache et la table précalculée
+(age << 15 | masque). Les résultats binaires (Accept: application/octet-stream)
+occupent 6 octets par patient : classe (uint8), code de risque (uint8),
+P(diabète) (float32 little-endian).
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from lookup_table import MAX_AGE, N_BINARY_FEATURES, RISK_THRESHOLDS
+
+RECORD_DTYPE = np.dtype([("age", "u1"), ("mask", "<u2")])
+RECORD_SIZE = RECORD_DTYPE.itemsize
+RESULT_DTYPE = np.dtype([("prediction", "u1"), ("risk", "u1"), ("p_diabetes", "<f4")])
+
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+
+def decode_records(body: bytes) -> np.ndarray:
+    """
+    Décode et valide un corps binaire en clés compactes (age << 15 | masque).
+
+    Raises:
+        ValueError: Taille incorrecte, âge hors limites ou bit 15 utilisé
+    """
+    if len(body) % RECORD_SIZE:
+        raise ValueError(f"La taille du corps ({len(body)} octets) n'est pas un multiple de {RECORD_SIZE}")
+
+    records = np.frombuffer(body, dtype=RECORD_DTYPE)
+    ages = records["age"].astype(np.int64)
+    masks = records["mask"].astype(np.int64)
+
+    invalid = np.flatnonzero((ages > MAX_AGE) | (masks >> N_BINARY_FEATURES != 0))
+    if len(invalid):
+        index = int(invalid[0])
+        raise ValueError(f"Enregistrement {index} invalide: âge {int(ages[index])}, masque {int(masks[index])} "
+                         f"({len(invalid)} enregistrement(s) invalide(s))")
+
+    return (ages << N_BINARY_FEATURES) | masks
+
+
+def pack_records(model, records: List[Dict]) -> bytes:
+    """
+    Construit un corps binaire à partir de patients JSON (côté client ou tests).
+    Les patients sont validés par model.validate_json_input.
+    """
+    keys = [model.encoder.pack_record(model.validate_json_input(record)) for record in records]
+    packed = np.empty(len(keys), dtype=RECORD_DTYPE)
+    keys = np.asarray(keys, dtype=np.int64)
+    packed["age"] = keys >> N_BINARY_FEATURES
+    packed["mask"] = keys & ((1 << N_BINARY_FEATURES) - 1)
+    return packed.tobytes()
+
+
+def risk_codes(p_diabetes: np.ndarray) -> np.ndarray:
+    """Codes de risque (0 à 3) vectorisés, mêmes seuils que ModelDiabetes._get_risk_code"""
+    return np.searchsorted(RISK_THRESHOLDS, p_diabetes, side="right").astype(np.uint8)
+
+
+def encode_results(predictions: np.ndarray, probabilities: np.ndarray) -> bytes:
+    """Résultats binaires : 6 octets par patient (voir RESULT_DTYPE)"""
+    results = np.empty(len(predictions), dtype=RESULT_DTYPE)
+    results["prediction"] = predictions
+    results["risk"] = risk_codes(probabilities[:, 1])
+    results["p_diabetes"] = probabilities[:, 1]
+    return results.tobytes()
+
+
+def results_to_columns(predictions: np.ndarray, probabilities: np.ndarray) -> Dict[str, list]:
+    """Résultats JSON en colonnes (compacts : une liste par champ)"""
+    p_diabetes = probabilities[:, 1]
+    return {
+        "prediction": predictions.tolist(),
+        "p_diabetes": np.round(p_diabetes, 4).tolist(),
+        "risk": risk_codes(p_diabetes).tolist(),
+    }
+
+
+def decode_results(body: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Décode une réponse binaire en (classes, codes de risque, P(diabète))"""
+    results = np.frombuffer(body, dtype=RESULT_DTYPE)
+    return results["prediction"], results["risk"], results["p_diabetes"]